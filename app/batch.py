@@ -0,0 +1,389 @@
+"""Report in batch, senza Streamlit, con le stesse analisi della dashboard.
+
+Uso: python -m app.batch INPUT [INPUT ...] --output reports/
+                         [--workers 4] [--backend pandas] [--theme plotly]
+                         [--filter Region=North,South]
+                         [--dates 2024-01-01 2024-12-31] [--method zscore]
+                         [--threshold 2.0] [--segments 3] [--png] [--force]
+
+INPUT e' un file, una directory o un glob (es. "data/**/*.csv"). Ogni file
+viene analizzato in un processo del pool: KPI, metriche avanzate, anomalie
+(totali e per Product/Region), segmentazione clienti e grafici. Per ogni
+file scrive in --output, in una cartella con lo stesso percorso relativo
+del file (es. reports/2024/jan.csv/), metrics.json e un HTML per grafico
+(PNG con --png, richiede kaleido); i file gia' dentro --output non sono
+letti come dati. I file si leggono dalle copie in cache della dashboard
+(Arrow o Parquet, vedi SALES_DASHBOARD_CACHE_DIR); un file non modificato dall'ultimo report con
+le stesse opzioni viene saltato, salvo --force. In --output viene scritto
+anche summary.json; se un file non si puo' analizzare il comando esce con
+codice 1 dopo aver completato gli altri.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from app.utils.anomaly import (
+    DEFAULT_METHOD,
+    DEFAULT_THRESHOLD,
+    METHODS,
+    detect_anomalies,
+    detect_group_anomalies,
+)
+from app.utils.correlation import product_correlation, select_products
+from app.utils.data_cache import files_id
+from app.utils.datasets import BACKENDS, DEFAULT_BACKEND, available_backends
+from app.utils.downsampling import build_line_pyramid, view_positions
+from app.utils.figures import (
+    CHART_THEMES,
+    FULL_WIDTH_PX,
+    OVERVIEW_CELL_WIDTH_PX,
+    anomaly_figure,
+    correlation_figure,
+    day_hour_heatmap,
+    monthly_figure,
+    overview_figure,
+    period_trend_figure,
+    product_scatter,
+    quarterly_figure,
+    segments_figure,
+)
+from app.utils.jobs import MAX_WORKERS
+from app.utils.kpi import calculate_advanced_metrics, calculate_kpi
+from app.utils.partitions import open_path, partition_files
+from app.utils.rollups import seasonal_table
+from app.utils.segmentation import FEATURE_COLUMNS, perform_customer_segmentation
+
+# Avvisi di NumPy/pandas su selezioni vuote, ignorati come nella dashboard
+warnings.filterwarnings("ignore")
+
+try:
+    import kaleido
+except ImportError:  # kaleido e' opzionale, serve solo per i grafici PNG
+    kaleido = None
+
+
+REPORT_FILE = "metrics.json"
+SUMMARY_FILE = "summary.json"
+
+DEFAULT_SEGMENTS = 3
+
+# Anomalie per gruppo riportate in metrics.json, le piu' forti
+MAX_GROUP_ANOMALIES = 100
+
+
+# Valori degli aggregati (NumPy, Timestamp, NaN) in tipi JSON
+def _to_json(value):
+    if isinstance(value, dict):
+        return {str(key): _to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray, pd.Index)):
+        return [_to_json(item) for item in value]
+    if isinstance(value, (pd.Timestamp, np.datetime64)) or value is pd.NaT:
+        return None if pd.isna(value) else pd.Timestamp(value).isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _records(data):
+    return _to_json(data.to_dict(orient="records"))
+
+
+def _segment_summary(segments):
+    grouped = segments.groupby("Segment")
+    summary = grouped[FEATURE_COLUMNS].mean()
+    summary.insert(0, "Customers", grouped.size())
+    return _records(summary.reset_index())
+
+
+# Anomalie (totali e per gruppo) e segmentazione clienti, con le stesse
+# funzioni della tab Advanced Analytics
+def _analyses(dataset, aggregates, filters, options):
+    sections = {}
+    anomalies = None
+    if "by_date" in aggregates:
+        anomalies = detect_anomalies(
+            aggregates["by_date"]["sales_sum"], options["method"], options["threshold"]
+        )
+        sections["anomalies"] = [
+            {"date": date, "sales": sales} for date, sales in anomalies.items()
+        ]
+        sections["group_anomalies"] = {}
+        for group in ["Product", "Region"]:
+            if group in dataset.columns and "Sales" in dataset.columns:
+                group_anomalies = detect_group_anomalies(
+                    dataset.daily_sales_by(group, filters=filters),
+                    group,
+                    options["method"],
+                    options["threshold"],
+                )
+                sections["group_anomalies"][group] = _records(
+                    group_anomalies.head(MAX_GROUP_ANOMALIES)
+                )
+
+    segments = None
+    by_customer = aggregates.get("by_customer")
+    if by_customer is not None and len(by_customer) >= options["segments"]:
+        segments = perform_customer_segmentation(aggregates, options["segments"])
+    if segments is not None:
+        sections["segments"] = _segment_summary(segments)
+    return sections, anomalies, segments
+
+
+# Grafici del report: nome del file e funzione che costruisce la figura, solo
+# per quelli di cui ci sono i dati (colonne mancanti nel file)
+def _figures(dataset, aggregates, filters, anomalies, segments):
+    figures = {}
+    by_date = aggregates.get("by_date")
+    if by_date is not None and "sales_sum" in by_date.columns:
+        daily_sales = by_date["sales_sum"]
+        pyramid = build_line_pyramid(daily_sales)
+        if "by_region" in aggregates and "by_product" in aggregates:
+            figures["overview"] = lambda: overview_figure(
+                aggregates,
+                view_positions(pyramid, OVERVIEW_CELL_WIDTH_PX),
+                aggregates["sales_histogram"],
+            )
+        figures["anomalies"] = lambda: anomaly_figure(
+            daily_sales, view_positions(pyramid, FULL_WIDTH_PX), anomalies
+        )
+    if "day_hour" in aggregates:
+        figures["day_hour_heatmap"] = lambda: day_hour_heatmap(aggregates["day_hour"])
+    by_product = aggregates.get("by_product")
+    if by_product is not None:
+        figures["product_scatter"] = lambda: product_scatter(by_product)
+        if "Date" in dataset.columns and len(by_product) > 1:
+            products = select_products(by_product)
+            figures["product_correlation"] = lambda: correlation_figure(
+                product_correlation(
+                    dataset.daily_sales_by("Product", products, filters), products
+                )
+            )
+    if segments is not None:
+        figures["customer_segments"] = lambda: segments_figure(segments)
+    if "rollups" in aggregates:
+        rollups = aggregates["rollups"]
+        figures["monthly_trend"] = lambda: period_trend_figure(
+            rollups["month"], "month"
+        )
+        figures["monthly"] = lambda: monthly_figure(seasonal_table(rollups, "month"))
+        figures["quarterly"] = lambda: quarterly_figure(
+            seasonal_table(rollups, "quarter")
+        )
+    return figures
+
+
+def _write_figures(figures, directory, theme, png):
+    written = []
+    for name, build in figures.items():
+        fig = build()
+        fig.update_layout(template=theme)
+        # plotly.js dal CDN: centinaia di report non ne copiano 3 MB ciascuno
+        fig.write_html(os.path.join(directory, name + ".html"), include_plotlyjs="cdn")
+        written.append(name + ".html")
+        if png:
+            fig.write_image(os.path.join(directory, name + ".png"))
+            written.append(name + ".png")
+    return written
+
+
+def _read_report(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Report di un file, eseguito in un processo del pool. Gli errori tornano
+# nel risultato, cosi' un file non valido non ferma gli altri.
+def report_file(path, directory, options, force=False):
+    start = time.perf_counter()
+    result = {"path": path, "output": directory, "status": "ok"}
+    try:
+        source_id = files_id([path])
+        report_path = os.path.join(directory, REPORT_FILE)
+        previous = _read_report(report_path)
+        if (
+            not force
+            and previous is not None
+            and previous["source"]["dataset_id"] == source_id
+            and previous["options"] == options
+        ):
+            result.update(status="skipped", rows=previous["source"]["rows"])
+            return result
+
+        filters = options["filters"] or None
+        dataset = open_path(path, options["backend"])
+        aggregates = dataset.aggregates(filters)
+
+        report = {
+            "source": {
+                "path": path,
+                "dataset_id": source_id,
+                "rows": aggregates["rows"],
+            },
+            "options": options,
+            "kpi": calculate_kpi(aggregates),
+            "metrics": calculate_advanced_metrics(aggregates),
+        }
+
+        os.makedirs(directory, exist_ok=True)
+        report["figures"] = []
+        # Nessuna riga selezionata (es. filtri fuori dal periodo del file):
+        # il report contiene solo i KPI
+        if aggregates["rows"]:
+            sections, anomalies, segments = _analyses(
+                dataset, aggregates, filters, options
+            )
+            report.update(sections)
+            figures = _figures(dataset, aggregates, filters, anomalies, segments)
+            report["figures"] = _write_figures(
+                figures, directory, options["theme"], options["png"]
+            )
+        report["seconds"] = time.perf_counter() - start
+
+        # Scrittura atomica: un report interrotto non viene scambiato per
+        # uno completo al giro successivo
+        tmp_path = f"{report_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_to_json(report), f, indent=2)
+        os.replace(tmp_path, report_path)
+        result["rows"] = aggregates["rows"]
+    except Exception as e:
+        result.update(status="failed", error=f"{type(e).__name__}: {e}")
+    finally:
+        result["seconds"] = time.perf_counter() - start
+    return result
+
+
+# File da analizzare e cartella del report di ciascuno: stesso percorso
+# relativo rispetto alla directory comune ai file, estensione compresa
+# (a/jan.csv e a/jan.json hanno report distinti). I file dentro --output
+# (report di un'esecuzione precedente) non sono dati da analizzare.
+def report_targets(inputs, output):
+    output = os.path.abspath(output)
+    paths = sorted(
+        {
+            path
+            for pattern in inputs
+            for path in partition_files(pattern)
+            if os.path.commonpath([os.path.abspath(path), output]) != output
+        }
+    )
+    if not paths:
+        return []
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+    return [
+        (path, os.path.join(output, os.path.relpath(os.path.abspath(path), root)))
+        for path in paths
+    ]
+
+
+def run(targets, options, workers=MAX_WORKERS, force=False):
+    if workers <= 1:
+        for path, directory in targets:
+            yield report_file(path, directory, options, force)
+        return
+    # "spawn" come nel JobExecutor: i worker importano solo questo modulo
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        futures = [
+            pool.submit(report_file, path, directory, options, force)
+            for path, directory in targets
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+# --filter Region=North,South -> {"Region": ["North", "South"]}; le date
+# sono un intervallo con estremi inclusi, come nella sidebar
+def parse_filters(values, dates=None):
+    filters = {}
+    for value in values or []:
+        column, sep, items = value.partition("=")
+        if not sep or not column:
+            raise ValueError(f"Invalid filter {value!r}, expected COLUMN=VALUE[,...]")
+        filters[column] = [item for item in items.split(",") if item]
+    if dates:
+        filters["Date"] = list(dates)
+    return filters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", metavar="INPUT")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND)
+    parser.add_argument("--theme", choices=CHART_THEMES, default=CHART_THEMES[0])
+    parser.add_argument("--filter", action="append", dest="filters", default=[])
+    parser.add_argument("--dates", nargs=2, metavar=("START", "END"))
+    parser.add_argument("--method", choices=list(METHODS), default=DEFAULT_METHOD)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--segments", type=int, default=DEFAULT_SEGMENTS)
+    parser.add_argument("--png", action="store_true")
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    if args.backend not in available_backends():
+        parser.error(f"The {args.backend} backend is not installed")
+    if args.png and kaleido is None:
+        parser.error("PNG figures require the kaleido package")
+    try:
+        filters = parse_filters(args.filters, args.dates)
+    except ValueError as e:
+        parser.error(str(e))
+    targets = report_targets(args.inputs, args.output)
+    if not targets:
+        parser.error("No data files match the inputs")
+
+    options = {
+        "backend": args.backend,
+        "filters": filters,
+        "method": args.method,
+        "threshold": args.threshold,
+        "segments": args.segments,
+        "theme": args.theme,
+        "png": args.png,
+    }
+    start = time.perf_counter()
+    results = []
+    for result in run(targets, options, args.workers, args.force):
+        results.append(result)
+        if result["status"] == "failed":
+            print(f"FAILED  {result['path']}: {result['error']}", flush=True)
+        else:
+            print(
+                f"{result['status']:<7} {result['path']} "
+                f"({result['rows']:,} rows, {result['seconds']:.2f}s)",
+                flush=True,
+            )
+    elapsed = time.perf_counter() - start
+
+    failed = sum(result["status"] == "failed" for result in results)
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, SUMMARY_FILE), "w", encoding="utf-8") as f:
+        json.dump(
+            {"seconds": elapsed, "options": options, "files": results}, f, indent=2
+        )
+    print(
+        f"{len(results):,} files in {elapsed:.1f}s "
+        f"({len(results) / elapsed * 3600:,.0f} files/hour), {failed:,} failed"
+    )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
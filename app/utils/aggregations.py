@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+from app.utils.derived import TimeFields
+from app.utils.rollups import build_rollups
+
+
+DIMENSIONS = {
+    "Date": "by_date",
+    "Product": "by_product",
+    "Region": "by_region",
+    "Customer": "by_customer",
+}
+
+VALUE_COLUMNS = ["Sales", "Profit"]
+
+MA_WINDOW = 30
+
+HISTOGRAM_BINS = 30
+
+DAY_NAMES = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
+
+# Una sola groupby per dimensione con somme e conteggi; le medie si ricavano
+# da quelle invece di rifare un'altra aggregazione.
+def _aggregate(data, key, values):
+    spec = {col: ["sum", "count"] for col in values}
+    if key == "Customer" and "Date" in data.columns:
+        # Primo e ultimo acquisto per la segmentazione clienti
+        spec["Date"] = ["min", "max"]
+    grouped = data.groupby(key, observed=True).agg(spec)
+
+    result = pd.DataFrame(index=grouped.index)
+    for col in values:
+        name = col.lower()
+        result[f"{name}_sum"] = grouped[(col, "sum")]
+        result[f"{name}_count"] = grouped[(col, "count")]
+        result[f"{name}_mean"] = result[f"{name}_sum"] / result[f"{name}_count"]
+    if "Date" in spec:
+        result["first_date"] = grouped[("Date", "min")]
+        result["last_date"] = grouped[("Date", "max")]
+    return result
+
+
+# Statistiche sufficienti della regressione lineare delle vendite giornaliere
+# sulla loro posizione (come stats.linregress(range(n), y)), in forma centrata
+# per restare stabili e aggiornabili punto per punto.
+def trend_stats(daily_sales):
+    y = daily_sales.to_numpy(dtype="float64")
+    n = len(y)
+    mean_x = (n - 1) / 2 if n else 0.0
+    mean_y = y.mean() if n else 0.0
+    dx = np.arange(n, dtype="float64") - mean_x
+    dy = y - mean_y
+    return {
+        "n": n,
+        "mean_x": mean_x,
+        "mean_y": mean_y,
+        "cxx": float(dx @ dx),
+        "cxy": float(dx @ dy),
+        "cyy": float(dy @ dy),
+    }
+
+
+def trend_from_stats(stats):
+    if stats["n"] < 2 or stats["cxx"] == 0:
+        return None
+    slope = stats["cxy"] / stats["cxx"]
+    if stats["cyy"] > 0:
+        r_value = stats["cxy"] / np.sqrt(stats["cxx"] * stats["cyy"])
+    else:
+        r_value = 0.0
+    return slope, r_value
+
+
+# Somme e conteggi di Sales per giorno della settimana e ora (7x24), dai
+# campi derivati di Date e con un solo bincount invece di pivot_table.
+# Si possono sommare tra batch diversi.
+def day_hour_stats(data, fields=None):
+    if fields is None:
+        fields = TimeFields(data["Date"].to_numpy(dtype="datetime64[ns]"))
+    weekday = fields["weekday"]
+    sales = data["Sales"].to_numpy(dtype="float64")
+    valid = (weekday >= 0) & ~np.isnan(sales)
+    cell = weekday[valid].astype("int64") * 24 + fields["hour"][valid]
+    sums = np.bincount(cell, weights=sales[valid], minlength=7 * 24)
+    counts = np.bincount(cell, minlength=7 * 24)
+    return {"sales_sum": sums.reshape(7, 24), "count": counts.reshape(7, 24)}
+
+
+# Istogramma calcolato lato server: al grafico arrivano solo bordi e conteggi
+def sales_histogram(sales, bins=HISTOGRAM_BINS):
+    values = np.asarray(sales, dtype="float64")
+    values = values[~np.isnan(values)]
+    counts, edges = np.histogram(values, bins=bins)
+    return {"counts": counts, "edges": edges}
+
+
+# fields: campi temporali gia' calcolati per le righe di data (TimeFields)
+def build_aggregates(data, fields=None):
+    values = [col for col in VALUE_COLUMNS if col in data.columns]
+    # Importi in formato compatto (float32): somme e medie in float64, con
+    # una copia temporanea delle sole colonne dei valori
+    narrow = {col: "float64" for col in values if data[col].dtype == "float32"}
+    if narrow:
+        data = data.astype(narrow)
+    aggregates = {"rows": len(data), "totals": {}}
+
+    for col in values:
+        name = col.lower()
+        column = data[col]
+        aggregates["totals"][f"{name}_sum"] = column.sum()
+        aggregates["totals"][f"{name}_count"] = column.count()
+        aggregates["totals"][f"{name}_mean"] = column.mean()
+        aggregates["totals"][f"{name}_std"] = column.std()
+
+    for key, name in DIMENSIONS.items():
+        if key in data.columns and values:
+            aggregates[name] = _aggregate(data, key, values)
+
+    if "Date" in data.columns and "Sales" in values:
+        aggregates["day_hour"] = day_hour_stats(data, fields)
+    return finish_aggregates(aggregates)
+
+
+# Trend, media mobile e rollup del calendario dalla serie giornaliera: comuni
+# a build_aggregates e agli aggregati calcolati da DuckDB
+def finish_aggregates(aggregates):
+    by_date = aggregates.get("by_date")
+    if by_date is not None and "sales_sum" in by_date.columns:
+        daily_sales = by_date["sales_sum"]
+        aggregates["trend"] = trend_stats(daily_sales)
+        aggregates["ma_30"] = daily_sales.rolling(window=MA_WINDOW).mean()
+        aggregates["rollups"] = build_rollups(by_date)
+    return aggregates
@@ -0,0 +1,305 @@
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+METHODS = {
+    "zscore": "Global z-score",
+    "rolling_zscore": "Rolling z-score",
+    "mad": "Rolling median/MAD",
+    "seasonal": "Seasonal residual",
+}
+
+DEFAULT_METHOD = "zscore"
+DEFAULT_THRESHOLD = 2.0
+WINDOW = 30
+# Stagionalita' settimanale sui dati giornalieri, confrontata con le ultime
+# SEASONS settimane
+PERIOD = 7
+SEASONS = 4
+
+# 1 / Phi^-1(0.75): rende la MAD confrontabile con una deviazione standard
+MAD_SCALE = 0.6745
+
+# Righe (serie) elaborate per blocco nel percorso vettoriale della MAD, per
+# limitare la memoria della finestra mobile (serie x giorni x WINDOW)
+MAD_CHUNK_SERIES = 256
+
+
+def _ratio(deviation, scale):
+    # Scala nulla: ogni scostamento e' anomalo, l'assenza di scostamento no
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = deviation / scale
+    score = np.where(scale > 0, score, np.where(deviation == 0, 0.0, np.inf))
+    return np.where(np.isnan(scale), np.nan, score)
+
+
+def _trailing_sums(values, window):
+    # Somme e somme dei quadrati dei `window` valori precedenti a ogni punto
+    # (t escluso) via cumsum, su serie centrate per stabilita' numerica
+    centered = values - np.nanmean(values, axis=-1, keepdims=True)
+    pad = np.zeros(values.shape[:-1] + (1,))
+    c1 = np.concatenate([pad, np.cumsum(centered, axis=-1)], axis=-1)
+    c2 = np.concatenate([pad, np.cumsum(centered**2, axis=-1)], axis=-1)
+    sums = np.full(values.shape, np.nan)
+    squares = np.full(values.shape, np.nan)
+    sums[..., window:] = c1[..., window:-1] - c1[..., : -window - 1]
+    squares[..., window:] = c2[..., window:-1] - c2[..., : -window - 1]
+    offset = values - centered
+    return sums, squares, centered, offset
+
+
+def _trailing_mean_std(values, window):
+    sums, squares, centered, offset = _trailing_sums(values, window)
+    mean = sums / window
+    var = (squares - sums * mean) / (window - 1)
+    return mean + offset, np.sqrt(np.maximum(var, 0))
+
+
+def _zscore(values):
+    mean = np.nanmean(values, axis=-1, keepdims=True)
+    std = np.nanstd(values, axis=-1, ddof=1, keepdims=True)
+    return _ratio(values - mean, np.broadcast_to(std, values.shape))
+
+
+def _rolling_zscore(values, window):
+    mean, std = _trailing_mean_std(values, window)
+    return _ratio(values - mean, std)
+
+
+def _mad(values, window):
+    scores = np.full(values.shape, np.nan)
+    flat = values.reshape(-1, values.shape[-1])
+    out = scores.reshape(-1, values.shape[-1])
+    if flat.shape[-1] <= window:
+        return scores
+    for start in range(0, len(flat), MAD_CHUNK_SERIES):
+        block = flat[start : start + MAD_CHUNK_SERIES]
+        # Finestre dei `window` valori precedenti a ogni punto da window in poi
+        windows = np.lib.stride_tricks.sliding_window_view(block, window, axis=-1)
+        windows = windows[:, :-1]
+        median = np.median(windows, axis=-1)
+        mad = np.median(np.abs(windows - median[..., None]), axis=-1)
+        deviation = MAD_SCALE * (block[:, window:] - median)
+        out[start : start + MAD_CHUNK_SERIES, window:] = _ratio(deviation, mad)
+    return scores
+
+
+def _seasonal(values, window, period, seasons):
+    # Valore atteso = media dello stesso giorno nelle `seasons` settimane
+    # precedenti; il residuo viene poi valutato con uno z-score mobile
+    lag = period * seasons
+    residuals = np.full(values.shape, np.nan)
+    if values.shape[-1] > lag:
+        expected = sum(
+            values[..., lag - k * period : values.shape[-1] - k * period]
+            for k in range(1, seasons + 1)
+        )
+        residuals[..., lag:] = values[..., lag:] - expected / seasons
+    scores = np.full(values.shape, np.nan)
+    if values.shape[-1] > lag + window:
+        tail = residuals[..., lag:]
+        mean, std = _trailing_mean_std(tail, window)
+        scores[..., lag:] = _ratio(tail - mean, std)
+    return scores
+
+
+# Punteggi di anomalia per una serie (1-D) o per molte serie allineate (2-D,
+# una per riga), calcolati in un unico passaggio NumPy. NaN dove la storia
+# non basta per il metodo scelto.
+def anomaly_scores(
+    values, method=DEFAULT_METHOD, window=WINDOW, period=PERIOD, seasons=SEASONS
+):
+    values = np.asarray(values, dtype="float64")
+    if method == "zscore":
+        return _zscore(values)
+    if method == "rolling_zscore":
+        return _rolling_zscore(values, window)
+    if method == "mad":
+        return _mad(values, window)
+    if method == "seasonal":
+        return _seasonal(values, window, period, seasons)
+    raise ValueError(f"Unknown anomaly detection method: {method}")
+
+
+def detect_anomalies(
+    daily_sales, method=DEFAULT_METHOD, threshold=DEFAULT_THRESHOLD, **options
+):
+    scores = anomaly_scores(daily_sales.to_numpy(), method, **options)
+    return daily_sales[np.abs(np.nan_to_num(scores)) > threshold]
+
+
+# Matrice serie x giorni delle vendite per ogni valore di `group`
+# (Product/Region), costruita con un solo bincount; i giorni senza vendite
+# valgono 0.
+def group_daily_matrix(data, group):
+    valid = data["Date"].notna() & data[group].notna()
+    subset = data.loc[valid, ["Date", group, "Sales"]]
+    day_codes, days = pd.factorize(subset["Date"].dt.normalize(), sort=True)
+    group_codes, groups = pd.factorize(subset[group], sort=True)
+    cells = group_codes * len(days) + day_codes
+    sales = np.nan_to_num(subset["Sales"].to_numpy(dtype="float64"))
+    matrix = np.bincount(cells, weights=sales, minlength=len(groups) * len(days))
+    return matrix.reshape(len(groups), len(days)), pd.Index(groups), pd.Index(days)
+
+
+def detect_group_anomalies(
+    data, group, method=DEFAULT_METHOD, threshold=DEFAULT_THRESHOLD, **options
+):
+    matrix, groups, days = group_daily_matrix(data, group)
+    scores = anomaly_scores(matrix, method, **options)
+    rows, cols = np.nonzero(np.abs(np.nan_to_num(scores)) > threshold)
+    anomalies = pd.DataFrame(
+        {
+            group: groups[rows],
+            "Date": days[cols],
+            "Sales": matrix[rows, cols],
+            "Score": scores[rows, cols],
+        }
+    )
+    return anomalies.sort_values(
+        "Score", key=np.abs, ascending=False, ignore_index=True
+    )
+
+
+# Rilevatore incrementale per i dati che arrivano dall'API: ogni update
+# valuta il nuovo punto rispetto allo stato corrente e poi lo aggiorna, con
+# costo costante per punto (finestre di dimensione fissa). Per i metodi a
+# finestra i punteggi coincidono con anomaly_scores sulla stessa serie; per
+# "zscore" la media e la deviazione sono quelle dei punti gia' visti.
+class StreamingDetector:
+    def __init__(
+        self,
+        method=DEFAULT_METHOD,
+        threshold=DEFAULT_THRESHOLD,
+        window=WINDOW,
+        period=PERIOD,
+        seasons=SEASONS,
+    ):
+        if method not in METHODS:
+            raise ValueError(f"Unknown anomaly detection method: {method}")
+        self.method = method
+        self.threshold = threshold
+        self.window = window
+        self.period = period
+        self.seasons = seasons
+        self.count = 0
+        # Media e M2 di Welford per "zscore"
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._values = deque(maxlen=max(window, period * seasons))
+        self._residuals = _RollingWindow(window)
+        self._recent = _RollingWindow(window)
+
+    def update(self, value):
+        value = float(value)
+        score = self._score(value)
+        self._observe(value)
+        anomalous = score is not None and abs(score) > self.threshold
+        return score, anomalous
+
+    def update_many(self, values):
+        return [self.update(value) for value in values]
+
+    def _score(self, value):
+        if self.method == "zscore":
+            if self.count < 2:
+                return None
+            std = math.sqrt(self._m2 / (self.count - 1))
+            return _scalar_ratio(value - self._mean, std)
+        if self.method == "rolling_zscore":
+            if not self._recent.full():
+                return None
+            mean, std = self._recent.mean_std()
+            return _scalar_ratio(value - mean, std)
+        if self.method == "mad":
+            if not self._recent.full():
+                return None
+            median = _median(self._recent.values)
+            mad = _median([abs(v - median) for v in self._recent.values])
+            return _scalar_ratio(MAD_SCALE * (value - median), mad)
+
+        residual = self._seasonal_residual(value)
+        if residual is None or not self._residuals.full():
+            return None
+        mean, std = self._residuals.mean_std()
+        return _scalar_ratio(residual - mean, std)
+
+    def _seasonal_residual(self, value):
+        lag = self.period * self.seasons
+        if len(self._values) < lag:
+            return None
+        history = self._values
+        expected = sum(history[-k * self.period] for k in range(1, self.seasons + 1))
+        return value - expected / self.seasons
+
+    def _observe(self, value):
+        self.count += 1
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+
+        if self.method == "seasonal":
+            residual = self._seasonal_residual(value)
+            if residual is not None:
+                self._residuals.push(residual)
+        self._values.append(value)
+        self._recent.push(value)
+
+
+def _median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def _scalar_ratio(deviation, scale):
+    if scale > 0:
+        return deviation / scale
+    return 0.0 if deviation == 0 else math.inf
+
+
+# Media e varianza della finestra aggiornate con Welford (aggiunta e
+# rimozione): le somme dei quadrati grezze perdono precisione per
+# cancellazione con importi grandi su flussi lunghi. Ogni size valori si
+# ricalcolano dalla finestra, cosi' gli errori di arrotondamento non si
+# accumulano.
+class _RollingWindow:
+    def __init__(self, size):
+        self.values = deque(maxlen=size)
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._pushes = 0
+
+    def full(self):
+        return len(self.values) == self.values.maxlen
+
+    def push(self, value):
+        if self.full():
+            old = self.values.popleft()
+            n = len(self.values)
+            if n == 0:
+                self._mean = self._m2 = 0.0
+            else:
+                delta = old - self._mean
+                self._mean -= delta / n
+                self._m2 -= delta * (old - self._mean)
+        self.values.append(value)
+        delta = value - self._mean
+        self._mean += delta / len(self.values)
+        self._m2 += delta * (value - self._mean)
+
+        self._pushes += 1
+        if self._pushes >= self.values.maxlen:
+            self._pushes = 0
+            self._mean = math.fsum(self.values) / len(self.values)
+            self._m2 = math.fsum((v - self._mean) ** 2 for v in self.values)
+
+    def mean_std(self):
+        n = len(self.values)
+        var = self._m2 / (n - 1) if n > 1 else 0.0
+        return self._mean, math.sqrt(max(var, 0.0))
@@ -0,0 +1,236 @@
+import json
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import pandas as pd
+
+from app.utils.data_loader import apply_schema, concat_chunks
+
+
+API_DATE_FORMAT = "%Y-%m-%d"
+
+# Record per richiesta: num_records piu' grandi vengono divisi in pagine
+# scaricate in parallelo sulla stessa sessione
+PAGE_SIZE = 10_000
+MAX_CONCURRENT_PAGES = 4
+
+# (connessione, lettura) in secondi
+REQUEST_TIMEOUT = (5, 60)
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+STREAM_CHUNK_BYTES = 64 << 10
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# Sessione condivisa con pool di connessioni e retry con backoff esponenziale
+# sugli errori di rete e sugli status temporanei. requests viene importato
+# qui, alla prima richiesta, e non all'avvio della dashboard.
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            retry = Retry(
+                total=RETRIES,
+                backoff_factor=BACKOFF_FACTOR,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=["GET"],
+                respect_retry_after_header=True,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=MAX_CONCURRENT_PAGES,
+                pool_maxsize=MAX_CONCURRENT_PAGES,
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+# Blocchi di record di un array JSON, decodificati man mano che arriva il
+# testo: ogni blocco ricevuto viene tagliato all'ultimo "}" e decodificato con
+# un solo json.loads; se il taglio cade dentro un record si aspetta il
+# blocco successivo.
+def iter_record_batches(chunks):
+    buffer = ""
+    started = False
+    for chunk in chunks:
+        buffer += chunk
+        if not started:
+            buffer = buffer.lstrip()
+            if not buffer:
+                continue
+            if buffer[0] != "[":
+                raise ValueError("Expected a JSON array of records")
+            buffer = buffer[1:]
+            started = True
+        end = buffer.rfind("}")
+        if end < 0:
+            continue
+        try:
+            batch = json.loads("[" + buffer[: end + 1].lstrip(" \t\r\n,") + "]")
+        except json.JSONDecodeError:
+            continue
+        buffer = buffer[end + 1 :]
+        if batch:
+            yield batch
+
+    rest = buffer.strip().lstrip(",")
+    if not started or not rest.endswith("]"):
+        raise ValueError("Truncated JSON response")
+    try:
+        batch = json.loads("[" + rest)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON response: {e}") from e
+    if batch:
+        yield batch
+
+
+# I record vengono convertiti in colonne tipizzate (schema di load_data) ogni
+# FRAME_RECORDS: in memoria non resta mai la lista completa dei dizionari
+FRAME_RECORDS = 50_000
+
+
+def records_to_frame(batches, date_format=API_DATE_FORMAT):
+    frames = []
+    pending = []
+    for batch in batches:
+        pending.extend(batch)
+        if len(pending) >= FRAME_RECORDS:
+            frames.append(apply_schema(pd.DataFrame(pending), date_format))
+            pending = []
+    if pending or not frames:
+        frames.append(apply_schema(pd.DataFrame(pending), date_format))
+    return concat_chunks(frames)
+
+
+# Status HTTP di un errore di fetch_sales (requests.HTTPError), None per gli
+# errori di rete o di parsing
+def error_status(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _page_url(url, params):
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query.update({key: str(value) for key, value in params.items()})
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+# Validatori per le richieste condizionali successive: ETag, Last-Modified
+# e il cursore X-Cursor (passato poi come parametro since) se il server lo
+# fornisce
+def response_validators(headers):
+    validators = {
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "cursor": headers.get("X-Cursor"),
+    }
+    return {key: value for key, value in validators.items() if value}
+
+
+def _request_frame(url, session, timeout, date_format, headers=None):
+    with session.get(url, stream=True, timeout=timeout, headers=headers) as response:
+        if response.status_code == 304:
+            return None, response.headers
+        response.raise_for_status()
+        response.encoding = response.encoding or "utf-8"
+        chunks = response.iter_content(STREAM_CHUNK_BYTES, decode_unicode=True)
+        frame = records_to_frame(iter_record_batches(chunks), date_format)
+        return frame, response.headers
+
+
+def fetch_page(
+    url,
+    session=None,
+    timeout=REQUEST_TIMEOUT,
+    date_format=API_DATE_FORMAT,
+    validators=None,
+):
+    session = session or get_session()
+    frame, headers = _request_frame(url, session, timeout, date_format)
+    if validators is not None:
+        validators.update(response_validators(headers))
+    return frame
+
+
+# Solo i record nuovi rispetto ai validatori di una risposta precedente:
+# None se il server risponde 304 Not Modified. Restituisce anche i
+# validatori aggiornati.
+def fetch_updates(
+    url,
+    validators,
+    session=None,
+    timeout=REQUEST_TIMEOUT,
+    date_format=API_DATE_FORMAT,
+):
+    session = session or get_session()
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    if validators.get("cursor"):
+        url = _page_url(url, {"since": validators["cursor"]})
+    frame, response_headers = _request_frame(
+        url, session, timeout, date_format, headers
+    )
+    return frame, {**validators, **response_validators(response_headers)}
+
+
+# Scarica num_records record dall'endpoint (default: il num_records dell'URL)
+# dividendoli in pagine di page_size richieste in parallelo. Ogni pagina
+# riceve i parametri num_records e page; le pagine sono concatenate in ordine.
+# Se validators e' un dizionario vi si salvano quelli della prima pagina, per
+# i successivi fetch_updates.
+def fetch_sales(
+    url,
+    num_records=None,
+    page_size=PAGE_SIZE,
+    max_workers=MAX_CONCURRENT_PAGES,
+    session=None,
+    timeout=REQUEST_TIMEOUT,
+    validators=None,
+):
+    session = session or get_session()
+    if num_records is None:
+        query = dict(parse_qsl(urlsplit(url).query))
+        if "num_records" not in query:
+            return fetch_page(url, session, timeout, validators=validators)
+        num_records = int(query["num_records"])
+
+    pages = max(1, math.ceil(num_records / page_size))
+    urls = [
+        _page_url(
+            url,
+            {
+                "num_records": min(page_size, num_records - page * page_size),
+                "page": page + 1,
+            },
+        )
+        for page in range(pages)
+    ]
+    if pages == 1:
+        return fetch_page(urls[0], session, timeout, validators=validators)
+
+    def fetch(page):
+        first = page == urls[0]
+        return fetch_page(
+            page, session, timeout, validators=validators if first else None
+        )
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, pages)) as pool:
+        frames = list(pool.map(fetch, urls))
+    return concat_chunks(frames).reset_index(drop=True)
@@ -0,0 +1,178 @@
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from app.utils.aggregations import sales_histogram
+from app.utils.api_client import fetch_updates
+from app.utils.data_loader import concat_chunks
+from app.utils.metrics_store import MetricsStore
+
+
+# Una sessione che non legge il feed per questo tempo (oltre all'intervallo)
+# viene considerata chiusa e il polling si ferma
+IDLE_STOP_SECONDS = 120
+
+
+# Hash di ogni riga, per riconoscere le righe gia' ricevute
+def _row_hashes(data):
+    return pd.util.hash_pandas_object(data, index=False).to_numpy()
+
+
+# Dati dell'API per una sessione, aggiornati in background: ogni refresh fa
+# una richiesta condizionale (ETag / If-Modified-Since / since) e fonde solo
+# i record nuovi nel MetricsStore, quindi il costo dipende dalle righe nuove.
+# I giorni completati vengono valutati dal rilevatore incrementale. Solo il
+# cursore (since) limita la risposta ai record nuovi: senza, ogni risposta 200
+# contiene tutti i record (anche con ETag/Last-Modified, che evitano solo le
+# risposte invariate) e si tengono le righe non ancora ricevute.
+# L'istogramma delle vendite si aggiorna con le sole righe nuove; version
+# cambia a ogni refresh con righe nuove e, con feed_id, identifica i grafici
+# nella cache delle figure.
+#
+# lock protegge lo stato tra il thread di refresh e lo script che lo legge.
+class ApiFeed:
+    def __init__(self, url, data, validators=None, detector=None):
+        self.url = url
+        self.feed_id = uuid.uuid4().hex
+        self.validators = dict(validators or {})
+        self.store = MetricsStore(data)
+        self.detector = detector
+        self.anomalies = []
+        self.version = 0
+        self.last_refresh = None
+        self.last_status = "loaded"
+        self.lock = threading.RLock()
+        self._batches = [data]
+        self.histogram = None
+        self._update_histogram(data)
+        self._scored_through = None  # ultimo giorno valutato
+        self._seen = None  # hash delle righe ricevute, solo senza cursore
+        self._thread = None
+        self._stop = threading.Event()
+        self._interval = None
+        self._last_seen = time.monotonic()
+        self._score_new_days()
+
+    @property
+    def rows(self):
+        return self.store.rows
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def data(self):
+        # Le righe arrivate con i refresh si concatenano solo quando servono
+        with self.lock:
+            if len(self._batches) > 1:
+                self._batches = [concat_chunks(self._batches)]
+            return self._batches[0]
+
+    def poll(self):
+        data, validators = fetch_updates(self.url, self.validators)
+        with self.lock:
+            self.validators = validators
+            self.last_refresh = time.time()
+            if data is not None and not validators.get("cursor"):
+                data = self._unseen(data)
+            if data is None or len(data) == 0:
+                self.last_status = "not modified"
+                return 0
+            self.store.append(data)
+            self._batches.append(data)
+            self._update_histogram(data)
+            self._score_new_days()
+            self.version += 1
+            self.last_status = f"{len(data):,} new rows"
+            return len(data)
+
+    # Come sales_histogram su tutte le righe: le righe nuove dentro i bordi
+    # attuali si aggiungono ai conteggi; un nuovo minimo o massimo cambia i
+    # bordi e l'istogramma si ricalcola (raro su un flusso lungo)
+    def _update_histogram(self, data):
+        if "Sales" not in data.columns:
+            return
+        values = data["Sales"].to_numpy(dtype="float64", na_value=np.nan)
+        values = values[~np.isnan(values)]
+        histogram = self.histogram
+        if (
+            histogram is not None
+            and histogram["counts"].sum() > 0
+            and (
+                len(values) == 0
+                or (
+                    values.min() >= histogram["edges"][0]
+                    and values.max() <= histogram["edges"][-1]
+                )
+            )
+        ):
+            counts, _ = np.histogram(values, bins=histogram["edges"])
+            self.histogram = {
+                "counts": histogram["counts"] + counts,
+                "edges": histogram["edges"],
+            }
+        else:
+            self.histogram = sales_histogram(self.data()["Sales"])
+
+    # Righe della risposta non ricevute prima: le righe gia' viste vengono
+    # scartate, i duplicati nella stessa risposta restano (vendite uguali)
+    def _unseen(self, data):
+        if self._seen is None:
+            self._seen = np.unique(_row_hashes(self.data()))
+        hashes = _row_hashes(data)
+        new = ~np.isin(hashes, self._seen)
+        self._seen = np.union1d(self._seen, hashes[new])
+        return data[new] if not new.all() else data
+
+    # L'ultimo giorno puo' ancora ricevere record: si valutano solo quelli
+    # precedenti, una volta sola. Si ricorda la data e non la posizione, che
+    # cambia quando un refresh inserisce giorni in mezzo alla serie; i giorni
+    # arrivati dopo che un giorno successivo e' stato valutato non si valutano.
+    def _score_new_days(self):
+        by_date = (self.store.aggregates() or {}).get("by_date")
+        if self.detector is None or by_date is None or len(by_date) < 2:
+            return
+        daily_sales = by_date["sales_sum"].iloc[:-1]
+        if self._scored_through is not None:
+            daily_sales = daily_sales.loc[daily_sales.index > self._scored_through]
+        for day, value in daily_sales.items():
+            score, anomalous = self.detector.update(value)
+            if anomalous:
+                self.anomalies.append((day, value, score))
+        if len(daily_sales):
+            self._scored_through = daily_sales.index[-1]
+
+    def touch(self):
+        self._last_seen = time.monotonic()
+
+    def start(self, interval_seconds):
+        if self.running and self._interval == interval_seconds:
+            return
+        self.stop()
+        self._interval = interval_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stop, interval_seconds), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _run(self, stop, interval_seconds):
+        while not stop.wait(interval_seconds):
+            if (
+                time.monotonic() - self._last_seen
+                > interval_seconds + IDLE_STOP_SECONDS
+            ):
+                break
+            try:
+                self.poll()
+            except Exception as e:
+                with self.lock:
+                    self.last_refresh = time.time()
+                    self.last_status = f"error: {e}"
@@ -0,0 +1,71 @@
+import pandas as pd
+
+from app.utils.aggregations import VALUE_COLUMNS
+from app.utils.data_loader import CATEGORICAL_COLUMNS
+
+
+# Formato in memoria degli importi (Sales, Profit). float32 dimezza la
+# memoria ma conserva circa 7 cifre significative (centesimi esatti fino a
+# circa 100.000); somme e medie vengono comunque calcolate in float64.
+AMOUNT_FORMATS = {
+    "float64": "Exact (float64)",
+    "float32": "Compact (float32)",
+}
+DEFAULT_AMOUNT_FORMAT = "float64"
+
+# Le colonne di testo con al massimo questa frazione di valori distinti
+# diventano categoriche: codici interi (int8/int16/int32 secondo il numero di
+# categorie) e un dizionario dei valori
+CATEGORY_MAX_RATIO = 0.5
+
+
+def _is_text(values):
+    return pd.api.types.is_string_dtype(values) and not isinstance(
+        values.dtype, pd.CategoricalDtype
+    )
+
+
+# Rappresentazione compatta di un dataset: testo a bassa cardinalita' come
+# categoriche e importi eventualmente in float32. Le colonne non toccate non
+# vengono copiate; le righe selezionate dai filtri (take) condividono il
+# dizionario delle categorie con il dataset di origine.
+def compact_frame(data, amounts=DEFAULT_AMOUNT_FORMAT):
+    if amounts not in AMOUNT_FORMATS:
+        raise ValueError(f"Unknown amount format: {amounts}")
+    columns = {}
+    for column in data.columns:
+        values = data[column]
+        if column in VALUE_COLUMNS and pd.api.types.is_float_dtype(values):
+            if values.dtype != amounts:
+                columns[column] = values.astype(amounts)
+        elif _is_text(values) and (
+            column in CATEGORICAL_COLUMNS
+            or values.nunique() <= CATEGORY_MAX_RATIO * len(values)
+        ):
+            columns[column] = values.astype("category")
+    return data.assign(**columns) if columns else data
+
+
+# ID di un dataset in formato compatto: gli aggregati in cache non si
+# mescolano tra formati degli importi diversi
+def compact_id(dataset_id, amounts=DEFAULT_AMOUNT_FORMAT):
+    if amounts == DEFAULT_AMOUNT_FORMAT:
+        return dataset_id
+    return f"{dataset_id}-{amounts}"
+
+
+# Memoria per colonna (valori e dizionari delle categorie inclusi), con gli
+# eventuali array derivati (es. i campi temporali) come righe aggiuntive
+def memory_report(data, derived=None):
+    rows = max(len(data), 1)
+    names = list(data.columns)
+    types = [str(dtype) for dtype in data.dtypes]
+    sizes = list(data.memory_usage(index=False, deep=True).to_numpy())
+    for name, values in (derived or {}).items():
+        names.append(f"{name} (derived)")
+        types.append(str(values.dtype))
+        sizes.append(values.nbytes)
+    report = pd.DataFrame({"Column": names, "Type": types})
+    report["MB"] = [size / (1 << 20) for size in sizes]
+    report["Bytes/row"] = [size / rows for size in sizes]
+    return report
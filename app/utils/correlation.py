@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from app.utils.anomaly import group_daily_matrix
+
+
+DEFAULT_TOP_N = 25
+# Oltre questo numero di prodotti la matrice PxP non e' leggibile: si
+# mostrano solo i vicini piu' correlati di ogni prodotto
+MAX_DENSE_PRODUCTS = 200
+DEFAULT_NEIGHBORS = 5
+# Righe della matrice calcolate per blocco: la memoria resta
+# BLOCK_ROWS x P invece di P x P
+BLOCK_ROWS = 1024
+
+
+# Prodotti su cui calcolare la correlazione: quelli scelti dall'utente o i
+# top_n per vendite totali
+def select_products(by_product, top_n=DEFAULT_TOP_N, products=None):
+    if products:
+        return [p for p in products if p in by_product.index]
+    return by_product["sales_sum"].nlargest(top_n).index.tolist()
+
+
+# Vendite giornaliere dei prodotti scelti (prodotti x giorni) in float32
+def product_daily_matrix(data, products):
+    subset = data[data["Product"].isin(products)]
+    matrix, groups, _ = group_daily_matrix(subset, "Product")
+    return matrix.astype("float32"), groups
+
+
+# Righe centrate e normalizzate: la correlazione diventa un prodotto
+# scalare. Le serie costanti restano a zero (correlazione NaN).
+def _standardize(matrix):
+    centered = matrix - matrix.mean(axis=1, keepdims=True)
+    norms = np.sqrt((centered * centered).sum(axis=1, keepdims=True))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(norms > 0, centered / norms, 0).astype("float32")
+    return z, norms[:, 0] > 0
+
+
+def correlation_matrix(matrix, block_rows=BLOCK_ROWS):
+    z, valid = _standardize(matrix)
+    corr = np.empty((len(z), len(z)), dtype="float32")
+    for start in range(0, len(z), block_rows):
+        corr[start : start + block_rows] = z[start : start + block_rows] @ z.T
+    np.clip(corr, -1, 1, out=corr)
+    corr[~valid] = np.nan
+    corr[:, ~valid] = np.nan
+    return corr
+
+
+# Per ogni riga i k prodotti piu' correlati (escluso se stesso), senza mai
+# materializzare la matrice completa
+def nearest_neighbors(matrix, k=DEFAULT_NEIGHBORS, block_rows=BLOCK_ROWS):
+    z, valid = _standardize(matrix)
+    k = max(0, min(k, len(z) - 1))
+    indices = np.empty((len(z), k), dtype="int64")
+    values = np.empty((len(z), k), dtype="float32")
+    if k == 0:
+        return indices, values
+    for start in range(0, len(z), block_rows):
+        block = z[start : start + block_rows] @ z.T
+        rows = np.arange(len(block))
+        block[rows, start + rows] = -np.inf
+        block[:, ~valid] = -np.inf
+        top = np.argpartition(block, -k, axis=1)[:, -k:]
+        top_values = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_values, axis=1)
+        indices[start : start + block_rows] = np.take_along_axis(top, order, axis=1)
+        values[start : start + block_rows] = np.take_along_axis(
+            top_values, order, axis=1
+        )
+    values[~valid] = np.nan
+    values[np.isinf(values)] = np.nan
+    return indices, values
+
+
+# Matrice di correlazione tra le vendite giornaliere dei prodotti scelti
+def product_correlation(data, products):
+    matrix, names = product_daily_matrix(data, products)
+    corr = correlation_matrix(matrix)
+    return pd.DataFrame(corr, index=names, columns=names)
+
+
+# Tabella Product / Neighbor / Correlation con i k vicini di ogni prodotto
+def product_neighbors(data, products, k=DEFAULT_NEIGHBORS):
+    matrix, names = product_daily_matrix(data, products)
+    indices, values = nearest_neighbors(matrix, k)
+    neighbors = pd.DataFrame(
+        {
+            "Product": np.repeat(np.asarray(names), indices.shape[1]),
+            "Neighbor": np.asarray(names)[indices.ravel()],
+            "Correlation": values.ravel(),
+        }
+    )
+    return neighbors.dropna(subset=["Correlation"]).reset_index(drop=True)
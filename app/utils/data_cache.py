@@ -0,0 +1,141 @@
+import hashlib
+import os
+import time
+
+from app.utils.data_loader import DATE_FORMAT, apply_schema, load_data, make_load_stats
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # senza pyarrow la cache su disco e' disattivata
+    pa = None
+    feather = None
+
+
+# Cache su disco dei dataset gia' parsati, in formato Arrow IPC (Feather v2)
+# non compresso cosi' che il file possa essere mappato in memoria: le colonne
+# numeriche e le date del DataFrame letto restano viste in sola lettura sulle
+# pagine del file, condivise con gli altri processi che lo leggono.
+CACHE_DIR = os.environ.get(
+    "SALES_DASHBOARD_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "sales-dashboard"),
+)
+CACHE_MAX_BYTES = int(os.environ.get("SALES_DASHBOARD_CACHE_MB", "2048")) << 20
+
+CACHE_SUFFIX = ".arrow"
+# Anche le copie Parquet del backend DuckDB rientrano nel limite della cache
+CACHE_SUFFIXES = (CACHE_SUFFIX, ".parquet")
+HASH_CHUNK_BYTES = 8 << 20
+
+
+def content_hash(source, date_format=DATE_FORMAT):
+    digest = hashlib.blake2b(digest_size=16)
+    # Il formato della data cambia il risultato del parsing, quindi fa parte
+    # della chiave insieme al contenuto del file
+    digest.update(date_format.encode("utf-8"))
+    if isinstance(source, bytes):
+        digest.update(source)
+        return digest.hexdigest()
+
+    source.seek(0)
+    for block in iter(lambda: source.read(HASH_CHUNK_BYTES), b""):
+        digest.update(block)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+# ID di un insieme di file su disco: percorsi, dimensioni e date di modifica,
+# senza leggerne il contenuto
+def files_id(paths):
+    digest = hashlib.blake2b(digest_size=16)
+    for path in sorted(paths):
+        stat = os.stat(path)
+        digest.update(
+            f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+        )
+    return digest.hexdigest()
+
+
+def cache_path(dataset_id):
+    return os.path.join(CACHE_DIR, dataset_id + CACHE_SUFFIX)
+
+
+def read_cached(dataset_id):
+    if feather is None:
+        return None
+    path = cache_path(dataset_id)
+    if not os.path.exists(path):
+        return None
+
+    # Aggiorna mtime: l'eviction LRU usa l'ultimo accesso
+    os.utime(path)
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    # split_blocks evita di consolidare le colonne in blocchi 2D, che
+    # richiederebbe una copia. Copie scritte con uno schema precedente (es.
+    # Customer come stringa) vengono portate ai tipi attuali; le colonne gia'
+    # conformi non cambiano.
+    return apply_schema(table.to_pandas(split_blocks=True))
+
+
+def write_cached(dataset_id, data):
+    if feather is None:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(dataset_id)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(data, tmp_path, compression="uncompressed")
+    # Scrittura atomica: sessioni concorrenti non leggono mai file parziali
+    os.replace(tmp_path, path)
+    evict_cache(keep=path)
+
+
+def evict_cache(
+    max_bytes=CACHE_MAX_BYTES, keep=None, directory=CACHE_DIR, suffixes=CACHE_SUFFIXES
+):
+    if not os.path.isdir(directory):
+        return []
+
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(suffixes):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = []
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except PermissionError:
+            # Su Windows un file mappato da un dataset aperto non si cancella
+            continue
+        total -= size
+        removed.append(path)
+    return removed
+
+
+def load_with_cache(source, name=None, dataset_id=None, date_format=DATE_FORMAT):
+    # dataset_id gia' noto (es. stesso upload in un rerun) evita di
+    # ricalcolare l'hash del file
+    if dataset_id is None:
+        dataset_id = content_hash(source, date_format)
+
+    start = time.perf_counter()
+    data = read_cached(dataset_id)
+    if data is not None:
+        stats = make_load_stats(len(data), time.perf_counter() - start, "cache")
+        return data, dataset_id, stats
+
+    data, stats = load_data(source, name=name, date_format=date_format)
+    write_cached(dataset_id, data)
+    # Il DataFrame appena letto viene sostituito dalla copia mappata: le
+    # sessioni e i processi che aprono lo stesso file condividono le pagine
+    cached = read_cached(dataset_id)
+    return (data if cached is None else cached), dataset_id, stats
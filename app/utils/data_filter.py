@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+
+# Indici costruiti una sola volta per dataset: le righe ordinate per Date
+# (per risolvere un intervallo con due ricerche binarie) e i codici interi
+# di ogni colonna categorica (per filtrare per valore senza confrontare stringhe).
+def build_filter_index(data, columns=None):
+    index = {
+        "n_rows": len(data),
+        "date_order": None,
+        "sorted_dates": None,
+        "codes": {},
+    }
+
+    if "Date" in data.columns:
+        dates = data["Date"].to_numpy(dtype="datetime64[ns]")
+        # NaT finisce in coda, oltre qualsiasi intervallo valido
+        order = np.argsort(dates, kind="stable")
+        index["date_order"] = order
+        index["sorted_dates"] = dates[order]
+
+    if columns is None:
+        # Solo le colonne filtrabili per valore, non quelle numeriche
+        columns = [
+            col
+            for col in data.columns
+            if col != "Date"
+            and not pd.api.types.is_numeric_dtype(data[col])
+            and not pd.api.types.is_datetime64_any_dtype(data[col])
+        ]
+    for column in columns:
+        values = data[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()
+            categories = values.cat.categories
+        else:
+            codes, categories = pd.factorize(values)
+        index["codes"][column] = (codes, pd.Index(categories))
+    return index
+
+
+def _date_positions(index, filter_value):
+    start_date, end_date = filter_value
+    sorted_dates = index["sorted_dates"]
+    start = np.datetime64(pd.to_datetime(start_date), "ns")
+    end = np.datetime64(pd.to_datetime(end_date), "ns")
+    lo = np.searchsorted(sorted_dates, start, "left")
+    hi = np.searchsorted(sorted_dates, end, "right")
+    return index["date_order"][lo:hi]
+
+
+def select_rows(index, filters):
+    rows = None
+    date_filter = filters.get("Date")
+    if date_filter is not None and len(date_filter) == 2:
+        if index["date_order"] is not None:
+            rows = _date_positions(index, date_filter)
+
+    for column, filter_value in filters.items():
+        if column == "Date" or not filter_value or column not in index["codes"]:
+            continue
+        codes, categories = index["codes"][column]
+        # Un elemento in piu' in coda per il codice -1 (valori mancanti)
+        allowed = np.append(categories.isin(list(filter_value)), False)
+        if rows is None:
+            rows = np.flatnonzero(allowed[codes])
+        else:
+            rows = rows[allowed[codes[rows]]]
+
+    if rows is None:
+        return np.arange(index["n_rows"])
+    # Ripristina l'ordine originale delle righe
+    return np.sort(rows)
+
+
+def filter_data(data, filters, index=None):
+    if index is None:
+        columns = [col for col in filters if col != "Date"]
+        index = build_filter_index(data, columns=columns)
+    return data.take(select_rows(index, filters))
@@ -0,0 +1,202 @@
+import io
+import time
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from app.utils.perf import peak_memory_mb, stage
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow e' opzionale, si ripiega sul parser di pandas
+    pa = None
+    pa_csv = None
+
+
+# Schema dichiarato delle colonne note. Le colonne assenti dal file vengono
+# ignorate, quelle non dichiarate sono lasciate all'inferenza del parser.
+SCHEMA = {
+    "Date": "datetime64[ns]",
+    "Sales": "float64",
+    "Profit": "float64",
+    "Product": "category",
+    "Region": "category",
+    "Customer": "category",
+}
+
+CATEGORICAL_COLUMNS = [col for col, dtype in SCHEMA.items() if dtype == "category"]
+
+# "ISO8601" copre sia "YYYY-MM-DD" che "YYYY-MM-DD HH:MM:SS" senza inferenza
+# riga per riga; qualsiasi formato strptime esplicito e' accettato.
+DATE_FORMAT = "ISO8601"
+
+CHUNK_ROWS = 500_000
+CHUNK_BYTES = 64 << 20
+
+SUPPORTED_TYPES = ["csv", "json", "xlsx", "xls", "parquet"]
+
+
+def _arrow_types():
+    types = {
+        "Sales": pa.float64(),
+        "Profit": pa.float64(),
+    }
+    for col in CATEGORICAL_COLUMNS:
+        types[col] = pa.dictionary(pa.int32(), pa.string())
+    types["Date"] = pa.timestamp("ns")
+    return types
+
+
+def _pandas_dtypes():
+    # Date viene convertita a parte con un formato esplicito
+    return {col: dtype for col, dtype in SCHEMA.items() if col != "Date"}
+
+
+# Date con il formato dichiarato; se il file usa un altro formato (es.
+# 01/17/2023) si ripiega sull'inferenza di pandas invece di perdere le date
+# come NaT
+def _to_datetime(values, date_format):
+    dates = pd.to_datetime(values, format=date_format, errors="coerce")
+    if dates.isna().sum() > values.isna().sum():
+        dates = pd.to_datetime(values, errors="coerce")
+    return dates
+
+
+def apply_schema(data, date_format=DATE_FORMAT):
+    for column, dtype in SCHEMA.items():
+        if column not in data.columns:
+            continue
+        if column == "Date":
+            if not pd.api.types.is_datetime64_any_dtype(data[column]):
+                with stage("to_datetime", rows=len(data)):
+                    data[column] = _to_datetime(data[column], date_format)
+            data[column] = data[column].astype(dtype)
+        elif dtype == "float64" and data[column].dtype != dtype:
+            data[column] = pd.to_numeric(data[column], errors="coerce").astype(dtype)
+        elif str(data[column].dtype) != dtype:
+            data[column] = data[column].astype(dtype)
+    return data
+
+
+def concat_chunks(chunks):
+    if len(chunks) == 1:
+        return chunks[0]
+
+    # pd.concat su categoriche con categorie diverse ricade su object:
+    # le categorie vengono unificate prima di concatenare
+    categoricals = {}
+    for col in CATEGORICAL_COLUMNS:
+        if col in chunks[0].columns:
+            categoricals[col] = union_categoricals(
+                [chunk[col] for chunk in chunks], ignore_order=True
+            )
+    data = pd.concat(
+        [chunk.drop(columns=list(categoricals)) for chunk in chunks],
+        ignore_index=True,
+    )
+    for col, values in categoricals.items():
+        data[col] = pd.Categorical(values)
+    return data[chunks[0].columns]
+
+
+def _read_csv_arrow(source, date_format):
+    timestamp_parsers = [pa_csv.ISO8601 if date_format == "ISO8601" else date_format]
+    reader = pa_csv.open_csv(
+        source,
+        read_options=pa_csv.ReadOptions(block_size=CHUNK_BYTES),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=_arrow_types(),
+            timestamp_parsers=timestamp_parsers,
+        ),
+    )
+    batches = [batch for batch in reader]
+    table = pa.Table.from_batches(batches, schema=reader.schema)
+    return table.unify_dictionaries().to_pandas()
+
+
+def _read_csv_pandas(source, date_format):
+    chunks = [
+        apply_schema(chunk, date_format)
+        for chunk in pd.read_csv(source, dtype=_pandas_dtypes(), chunksize=CHUNK_ROWS)
+    ]
+    if not chunks:
+        return pd.DataFrame()
+    return concat_chunks(chunks)
+
+
+def _read_csv(source, date_format):
+    if pa_csv is not None:
+        try:
+            return _read_csv_arrow(source, date_format), "pyarrow"
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            # Date o numeri non conformi allo schema: il parser di pandas
+            # li converte a NaT/NaN invece di fallire
+            source.seek(0)
+    return _read_csv_pandas(source, date_format), "pandas"
+
+
+def _read_json(source, date_format):
+    head = source.read(64).lstrip()[:1]
+    source.seek(0)
+    if head in (b"{", "{"):
+        # JSON lines: un record per riga, leggibile a blocchi
+        reader = pd.read_json(source, lines=True, chunksize=CHUNK_ROWS, dtype=False)
+        chunks = [apply_schema(chunk, date_format) for chunk in reader]
+        if not chunks:
+            return pd.DataFrame()
+        return concat_chunks(chunks)
+    return apply_schema(pd.read_json(source, dtype=False), date_format)
+
+
+def _read_excel(source, date_format):
+    # openpyxl non supporta la lettura a blocchi
+    data = pd.read_excel(source, dtype=_pandas_dtypes())
+    return apply_schema(data, date_format)
+
+
+def _read_parquet(source, date_format):
+    if pa is None:
+        raise ValueError("Reading Parquet files requires pyarrow")
+    return apply_schema(pd.read_parquet(source), date_format)
+
+
+def make_load_stats(rows, seconds, engine):
+    return {
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds > 0 else float("inf"),
+        "peak_memory_mb": peak_memory_mb(),
+        "engine": engine,
+    }
+
+
+def load_data(source, name=None, date_format=DATE_FORMAT):
+    name = name or getattr(source, "name", "")
+    file_type = name.split(".")[-1].lower()
+    if file_type not in SUPPORTED_TYPES:
+        raise ValueError(f"Unsupported file format: {file_type}")
+
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    start = time.perf_counter()
+    if file_type == "csv":
+        data, engine = _read_csv(source, date_format)
+    elif file_type == "json":
+        data, engine = _read_json(source, date_format), "pandas"
+    elif file_type == "parquet":
+        data, engine = _read_parquet(source, date_format), "pyarrow"
+    else:
+        data, engine = _read_excel(source, date_format), "pandas"
+    return data, make_load_stats(len(data), time.perf_counter() - start, engine)
+
+
+def format_load_stats(stats):
+    text = (
+        f"Loaded {stats['rows']:,} rows in {stats['seconds']:.2f}s "
+        f"({stats['rows_per_second']:,.0f} rows/s, {stats['engine']})"
+    )
+    if stats.get("peak_memory_mb") is not None:
+        text += f" | peak memory {stats['peak_memory_mb']:,.0f} MB"
+    return text
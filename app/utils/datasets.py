@@ -0,0 +1,116 @@
+from app.utils.aggregations import build_aggregates, sales_histogram
+from app.utils.compact import memory_report
+from app.utils.data_filter import build_filter_index, select_rows
+from app.utils.derived import TimeFields
+from app.utils.duckdb_backend import duckdb
+from app.utils.exports import export_data
+from app.utils.perf import stage
+
+
+# Backend di query: pandas tiene il dataset in memoria, DuckDB lo lascia su
+# disco in Parquet/CSV e calcola filtri e aggregati nel motore
+BACKENDS = {
+    "pandas": "In memory (pandas)",
+    "duckdb": "Out of core (DuckDB)",
+}
+DEFAULT_BACKEND = "pandas"
+
+
+def available_backends():
+    return [name for name in BACKENDS if name != "duckdb" or duckdb is not None]
+
+
+# Dataset in memoria con la stessa interfaccia di DuckDBDataset. Il
+# DataFrame di origine non viene mai modificato: data ne restituisce una
+# copia superficiale (copy-on-write) e i campi temporali derivati (giorno,
+# ora, mese...) stanno in fields, calcolati alla prima richiesta. Indice per
+# i filtri e campi restano con il dataset, condiviso tra rerun e sessioni.
+class PandasDataset:
+    in_memory = True
+    backend = "pandas"
+
+    def __init__(self, data, dataset_id, load_stats=None):
+        self._data = data
+        self.dataset_id = dataset_id
+        self.load_stats = load_stats
+        self._index = None
+        self._fields = None
+
+    @property
+    def data(self):
+        return self._data.copy(deep=False)
+
+    @property
+    def columns(self):
+        return list(self._data.columns)
+
+    @property
+    def fields(self):
+        if self._fields is None:
+            self._fields = TimeFields(self._data["Date"].to_numpy("datetime64[ns]"))
+        return self._fields
+
+    def head(self, n=5):
+        return self._data.head(n)
+
+    def count(self, filters=None):
+        return len(self._rows(filters)) if filters is not None else len(self._data)
+
+    def date_range(self):
+        if "Date" not in self._data.columns:
+            return None
+        return self._data["Date"].min(), self._data["Date"].max()
+
+    # Ordinati come in DuckDBDataset, cosi' i filtri non cambiano con il backend
+    def values(self, column):
+        return sorted(self._data[column].dropna().unique())
+
+    def _rows(self, filters):
+        if self._index is None:
+            self._index = build_filter_index(self._data)
+        return select_rows(self._index, filters)
+
+    # Righe selezionate dai filtri: fase "filter_data" del pannello
+    # Performance, separata da quella degli aggregati
+    def _select(self, filters, fields=None):
+        with stage("filter_data", rows=len(self._data)):
+            rows = self._rows(filters)
+            data = self._data.take(rows)
+            fields = fields.take(rows) if fields is not None else None
+        return data, fields
+
+    def filter(self, filters=None):
+        if filters is None:
+            return self.data
+        return self._select(filters)[0]
+
+    def aggregates(self, filters=None):
+        fields = None
+        if "Date" in self._data.columns:
+            fields = self.fields
+        if filters is None:
+            data = self._data
+        else:
+            data, fields = self._select(filters, fields)
+        aggregates = build_aggregates(data, fields)
+        if "Sales" in data.columns:
+            aggregates["sales_histogram"] = sales_histogram(data["Sales"])
+        return aggregates
+
+    # Righe (Date, gruppo, Sales) per group_daily_matrix, eventualmente solo
+    # per alcuni valori del gruppo
+    def daily_sales_by(self, group, values=None, filters=None):
+        data = self.filter(filters)
+        if values is not None:
+            data = data.loc[data[group].isin(values)]
+        return data[["Date", group, "Sales"]]
+
+    def fetch(self, filters=None):
+        return self.filter(filters)
+
+    def export(self, filters, fmt):
+        return export_data(self.filter(filters), fmt)
+
+    def memory_report(self):
+        derived = self._fields.computed() if self._fields is not None else None
+        return memory_report(self._data, derived)
@@ -0,0 +1,80 @@
+import threading
+
+import numpy as np
+
+
+NS_PER_DAY = 86_400 * 10**9
+NS_PER_HOUR = 3_600 * 10**9
+
+# Campi temporali derivati da Date, come codici interi compatti. Le date
+# mancanti valgono -1 in tutti i campi.
+TIME_FIELDS = {
+    "day": "int32",  # giorni dal 1970-01-01
+    "hour": "int8",
+    "weekday": "int8",  # lunedi' = 0
+    "month": "int8",  # 1-12
+    "quarter": "int8",  # 1-4
+    "year": "int16",
+    "month_index": "int32",  # mesi dal 1970-01
+}
+
+
+def time_field(dates, name):
+    if name not in TIME_FIELDS:
+        raise ValueError(f"Unknown time field: {name}")
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    missing = np.isnat(dates)
+    ns = dates.astype("int64")
+    if name == "day":
+        values = ns // NS_PER_DAY
+    elif name == "hour":
+        values = (ns % NS_PER_DAY) // NS_PER_HOUR
+    elif name == "weekday":
+        # 1970-01-01 era un giovedi' (3 con lunedi' = 0)
+        values = (ns // NS_PER_DAY + 3) % 7
+    else:
+        months = dates.astype("datetime64[M]").astype("int64")
+        if name == "month_index":
+            values = months
+        elif name == "month":
+            values = months % 12 + 1
+        elif name == "quarter":
+            values = months % 12 // 3 + 1
+        else:
+            values = months // 12 + 1970
+    values = values.astype(TIME_FIELDS[name])
+    values[missing] = -1
+    return values
+
+
+# Campi temporali di un dataset, calcolati alla prima richiesta e poi
+# riusati: il DataFrame di origine non riceve colonne nuove. Gli array sono
+# in sola lettura perche' condivisi tra rerun e sessioni. take() restituisce
+# i campi di un sottoinsieme di righe, ricavati da quelli gia' calcolati.
+class TimeFields:
+    def __init__(self, dates=None, parent=None, rows=None):
+        self._dates = dates
+        self._parent = parent
+        self._rows = rows
+        self._fields = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        with self._lock:
+            values = self._fields.get(name)
+            if values is None:
+                if self._parent is not None:
+                    values = self._parent[name][self._rows]
+                else:
+                    values = time_field(self._dates, name)
+                values.setflags(write=False)
+                self._fields[name] = values
+            return values
+
+    # Campi gia' calcolati, senza calcolarne altri (per i report di memoria)
+    def computed(self):
+        with self._lock:
+            return dict(self._fields)
+
+    def take(self, rows):
+        return TimeFields(parent=self, rows=rows)
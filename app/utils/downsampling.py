@@ -0,0 +1,109 @@
+import numpy as np
+
+
+# Livello piu' grossolano della piramide: sotto questa soglia non conviene
+# dimezzare ancora la serie.
+MIN_LEVEL_POINTS = 256
+
+
+def _as_numeric(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype("int64").astype("float64")
+    return x.astype("float64")
+
+
+# Largest-Triangle-Three-Buckets: sceglie in ogni bucket il punto che forma
+# il triangolo piu' grande con il punto scelto prima e la media del bucket
+# successivo. Restituisce le posizioni dei punti da tenere.
+def lttb(x, y, n_out):
+    x = _as_numeric(x)
+    y = np.asarray(y, dtype="float64")
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Bucket interni sui punti 1..n-2, il primo e l'ultimo restano fissi
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype("int64") + 1
+    edges[-1] = n - 1
+    starts = edges[:-1]
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x, starts) / counts
+    avg_y = np.add.reduceat(y, starts) / counts
+    # Il "bucket successivo" dell'ultimo bucket interno e' l'ultimo punto
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype="int64")
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (next_y[i] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+# Inviluppo min/max per bucket, per le bande: a differenza di LTTB conserva
+# tutti i picchi della serie.
+def minmax_envelope(x, y, n_buckets):
+    x = np.asarray(x)
+    y = np.asarray(y, dtype="float64")
+    n = len(y)
+    if n == 0:
+        return x, y, y
+    n_buckets = max(1, min(n_buckets, n))
+    starts = np.unique(np.linspace(0, n, n_buckets, endpoint=False).astype("int64"))
+    return x[starts], np.fmin.reduceat(y, starts), np.fmax.reduceat(y, starts)
+
+
+# Dimezza una serie tenendo, per ogni gruppo di 4 punti consecutivi, il
+# minimo e il massimo: vettoriale e conserva i picchi.
+def _minmax_decimate(positions, y):
+    full = len(positions) // 4 * 4
+    groups = positions[:full].reshape(-1, 4)
+    values = y[groups]
+    rows = np.arange(len(groups))
+    lows = groups[rows, np.argmin(values, axis=1)]
+    highs = groups[rows, np.argmax(values, axis=1)]
+    # Primo e ultimo punto restano sempre, come in LTTB
+    ends = [positions[:1], positions[-1:]]
+    return np.unique(np.concatenate([lows, highs, positions[full:]] + ends))
+
+
+# Piramide multi-risoluzione di una serie: il livello 0 e' la serie completa,
+# ogni livello successivo ha circa meta' dei punti del precedente (min/max a
+# gruppi di 4). I livelli sono posizioni nella serie originale.
+def build_line_pyramid(series, min_points=MIN_LEVEL_POINTS):
+    x = series.index.to_numpy()
+    y = series.to_numpy(dtype="float64")
+    levels = [np.arange(len(y))]
+    while len(levels[-1]) // 2 >= min_points:
+        levels.append(_minmax_decimate(levels[-1], y))
+    return {"x": x, "y": y, "levels": levels}
+
+
+# Posizioni da disegnare per l'intervallo [start, end] su un grafico largo
+# width_px: si parte dal livello piu' grossolano che ha ancora almeno un punto
+# per pixel nell'intervallo, poi LTTB porta i punti esattamente alla larghezza
+# (al massimo ~2 punti per pixel da scorrere, indipendente dalla serie).
+def view_positions(pyramid, width_px, start=None, end=None):
+    x = pyramid["x"]
+    lo = 0 if start is None else np.searchsorted(x, start, "left")
+    hi = len(x) if end is None else np.searchsorted(x, end, "right")
+    if hi - lo <= width_px:
+        return np.arange(lo, hi)
+
+    for level in reversed(pyramid["levels"]):
+        level_lo = np.searchsorted(level, lo, "left")
+        level_hi = np.searchsorted(level, hi, "left")
+        if level_hi - level_lo >= width_px:
+            positions = level[level_lo:level_hi]
+            break
+    keep = lttb(x[positions], pyramid["y"][positions], width_px)
+    return positions[keep]
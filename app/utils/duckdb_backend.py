@@ -0,0 +1,441 @@
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from app.utils.aggregations import (
+    DIMENSIONS,
+    HISTOGRAM_BINS,
+    VALUE_COLUMNS,
+    finish_aggregates,
+)
+from app.utils.data_cache import CACHE_DIR, evict_cache, files_id
+from app.utils.data_loader import DATE_FORMAT, SCHEMA, load_data, make_load_stats
+from app.utils.exports import EXPORT_DIR, EXPORT_FORMATS, export_data, prune_exports
+from app.utils.perf import stage
+
+try:
+    import duckdb
+except ImportError:  # duckdb e' opzionale: senza resta solo il backend pandas
+    duckdb = None
+
+
+# Memoria massima di DuckDB: oltre questo limite join e groupby scrivono su
+# disco in DUCKDB_TEMP_DIR invece di fallire
+DUCKDB_MEMORY_LIMIT = os.environ.get("SALES_DASHBOARD_DUCKDB_MEMORY", "2GB")
+DUCKDB_TEMP_DIR = os.path.join(CACHE_DIR, "duckdb-tmp")
+
+PARQUET_SUFFIX = ".parquet"
+SQL_TYPES = {"datetime64[ns]": "TIMESTAMP", "float64": "DOUBLE"}
+
+# Formati scritti direttamente da COPY, senza passare da pandas
+COPY_FORMATS = {
+    "CSV": "(FORMAT csv, HEADER true)",
+    "CSV (gzip)": "(FORMAT csv, HEADER true, COMPRESSION gzip)",
+    "JSON": "(FORMAT json)",
+    "Parquet": "(FORMAT parquet)",
+}
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _connect():
+    os.makedirs(DUCKDB_TEMP_DIR, exist_ok=True)
+    return duckdb.connect(
+        config={
+            "memory_limit": DUCKDB_MEMORY_LIMIT,
+            "temp_directory": DUCKDB_TEMP_DIR,
+        }
+    )
+
+
+# Le directory nel percorso (es. region=North) non diventano colonne: lo
+# schema e' solo quello dei file
+def _reader(paths):
+    files = "[" + ", ".join("'" + path.replace("'", "''") + "'" for path in paths) + "]"
+    options = "union_by_name = true, hive_partitioning = false"
+    if all(path.endswith(PARQUET_SUFFIX) for path in paths):
+        return f"read_parquet({files}, {options})"
+    if all(path.endswith((".json", ".jsonl")) for path in paths):
+        return f"read_json_auto({files}, {options})"
+    return f"read_csv({files}, header = true, {options})"
+
+
+# Colonne dello schema convertite come in apply_schema: valori non validi
+# diventano NULL invece di interrompere la query
+def _schema_select(columns, date_format):
+    replaced = []
+    for column, dtype in SCHEMA.items():
+        if column not in columns:
+            continue
+        name = _quote(column)
+        if column == "Date" and date_format != "ISO8601":
+            fmt = date_format.replace("'", "''")
+            expr = f"try_strptime(CAST({name} AS VARCHAR), '{fmt}')"
+        else:
+            expr = f"TRY_CAST({name} AS {SQL_TYPES.get(dtype, 'VARCHAR')})"
+        replaced.append(f"{expr} AS {name}")
+    if not replaced:
+        return "*"
+    return f"* REPLACE ({', '.join(replaced)})"
+
+
+# Condizioni SQL equivalenti a select_rows: intervallo di date con estremi
+# inclusi e valori ammessi per le colonne categoriche; filtri vuoti ignorati
+def where_clause(filters, columns):
+    conditions = []
+    params = []
+    for column, filter_value in (filters or {}).items():
+        if column not in columns:
+            continue
+        if column == "Date":
+            if filter_value is not None and len(filter_value) == 2:
+                conditions.append('"Date" >= ? AND "Date" <= ?')
+                params.extend(pd.to_datetime(value) for value in filter_value)
+            continue
+        if not filter_value:
+            continue
+        placeholders = ", ".join("?" for _ in filter_value)
+        conditions.append(f"{_quote(column)} IN ({placeholders})")
+        params.extend(str(value) for value in filter_value)
+    return " AND ".join(conditions) or "true", params
+
+
+# Dataset su file Parquet/CSV/JSON interrogato da DuckDB: i filtri e le
+# aggregazioni girano nel motore (fuori memoria se serve) e a pandas arrivano
+# solo i risultati aggregati, nello stesso formato di build_aggregates.
+#
+# Ogni query usa un proprio cursore, quindi un dataset si puo' interrogare da
+# piu' thread (rerun e download).
+class DuckDBDataset:
+    in_memory = False
+    backend = "duckdb"
+
+    def __init__(self, paths, dataset_id=None, date_format=DATE_FORMAT, stats=None):
+        if duckdb is None:
+            raise ValueError("The DuckDB backend requires the duckdb package")
+        self.paths = list(paths)
+        self.dataset_id = (dataset_id or files_id(self.paths)) + "-duckdb"
+        self.load_stats = stats
+        self._con = _connect()
+        self._lock = threading.Lock()
+        raw = self._con.execute(
+            f"DESCRIBE SELECT * FROM {_reader(self.paths)}"
+        ).fetchall()
+        self.columns = [row[0] for row in raw]
+        self._con.execute(
+            f"CREATE VIEW sales AS SELECT {_schema_select(self.columns, date_format)} "
+            f"FROM {_reader(self.paths)}"
+        )
+
+    def _cursor(self):
+        with self._lock:
+            return self._con.cursor()
+
+    def query(self, sql, params=None):
+        return self._cursor().execute(sql, params or []).df()
+
+    def _scalar_row(self, sql, params=None):
+        return self._cursor().execute(sql, params or []).fetchone()
+
+    # Condizione WHERE dei filtri (fase "filter_data" del pannello
+    # Performance, come select_rows con pandas). DuckDB la applica nella
+    # scansione delle query di aggregazione, il cui tempo resta in
+    # "aggregates".
+    def _where(self, filters):
+        with stage("filter_data", backend=self.backend):
+            return where_clause(filters, self.columns)
+
+    def head(self, n=5):
+        data = self.query(f"SELECT * FROM sales LIMIT {int(n)}")
+        return _normalize_dates(data, ["Date"])
+
+    def count(self, filters=None):
+        where, params = self._where(filters)
+        return self._scalar_row(f"SELECT count(*) FROM sales WHERE {where}", params)[0]
+
+    def date_range(self):
+        if "Date" not in self.columns:
+            return None
+        return tuple(
+            pd.Timestamp(value)
+            for value in self._scalar_row('SELECT min("Date"), max("Date") FROM sales')
+        )
+
+    def values(self, column):
+        name = _quote(column)
+        data = self.query(
+            f"SELECT DISTINCT {name} FROM sales WHERE {name} IS NOT NULL ORDER BY 1"
+        )
+        return data[column].tolist()
+
+    def aggregates(self, filters=None):
+        where, params = self._where(filters)
+        values = [col for col in VALUE_COLUMNS if col in self.columns]
+
+        # Totali, minimo e massimo per l'istogramma in una sola scansione
+        exprs = ["count(*)"]
+        for col in values:
+            exprs.append(
+                f"fsum({col}), count({col}), avg({col}), stddev_samp({col}), "
+                f"min({col}), max({col})"
+            )
+        row = self._scalar_row(
+            f"SELECT {', '.join(exprs)} FROM sales WHERE {where}", params
+        )
+        aggregates = {"rows": row[0], "totals": {}}
+        ranges = {}
+        for i, col in enumerate(values):
+            total, count, mean, std, low, high = row[1 + 6 * i : 7 + 6 * i]
+            name = col.lower()
+            # Scalari NumPy come in build_aggregates: con zero righe i
+            # rapporti delle metriche danno NaN invece di ZeroDivisionError
+            totals = aggregates["totals"]
+            totals[f"{name}_sum"] = np.float64(total if total is not None else 0.0)
+            totals[f"{name}_count"] = np.int64(count)
+            totals[f"{name}_mean"] = np.float64(mean if mean is not None else np.nan)
+            totals[f"{name}_std"] = np.float64(std if std is not None else np.nan)
+            ranges[col] = (low, high, count)
+
+        for key, name in DIMENSIONS.items():
+            if key in self.columns and values:
+                aggregates[name] = self._dimension(key, values, where, params)
+
+        if "Date" in self.columns and "Sales" in values:
+            aggregates["day_hour"] = self._day_hour(where, params)
+        if "Sales" in values:
+            aggregates["sales_histogram"] = self._histogram(
+                where, params, *ranges["Sales"]
+            )
+        return finish_aggregates(aggregates)
+
+    # Come _aggregate in aggregations: somme e conteggi per chiave, medie
+    # ricavate da quelli, primo e ultimo acquisto per cliente
+    def _dimension(self, key, values, where, params):
+        exprs = []
+        for col in values:
+            name = col.lower()
+            exprs.append(f"fsum({col}) AS {name}_sum, count({col}) AS {name}_count")
+        if key == "Customer" and "Date" in self.columns:
+            exprs.append('min("Date") AS first_date, max("Date") AS last_date')
+        grouped = self.query(
+            f"SELECT {_quote(key)}, {', '.join(exprs)} FROM sales "
+            f"WHERE {where} AND {_quote(key)} IS NOT NULL "
+            f"GROUP BY {_quote(key)} ORDER BY {_quote(key)}",
+            params,
+        )
+        if key == "Date":
+            grouped["Date"] = grouped["Date"].astype("datetime64[ns]")
+        grouped = grouped.set_index(key)
+
+        result = pd.DataFrame(index=grouped.index)
+        for col in values:
+            name = col.lower()
+            result[f"{name}_sum"] = grouped[f"{name}_sum"].fillna(0.0)
+            result[f"{name}_count"] = grouped[f"{name}_count"].astype("int64")
+            result[f"{name}_mean"] = result[f"{name}_sum"] / result[f"{name}_count"]
+        if "first_date" in grouped.columns:
+            result["first_date"] = grouped["first_date"].astype("datetime64[ns]")
+            result["last_date"] = grouped["last_date"].astype("datetime64[ns]")
+        return result
+
+    # Stesse celle di day_hour_stats (lunedi' = 0)
+    def _day_hour(self, where, params):
+        cells = self.query(
+            'SELECT (isodow("Date") - 1) * 24 + hour("Date") AS cell, '
+            "fsum(Sales) AS sales_sum, count(*) AS count FROM sales "
+            f'WHERE {where} AND "Date" IS NOT NULL AND Sales IS NOT NULL '
+            "GROUP BY cell",
+            params,
+        )
+        sums = np.zeros(7 * 24)
+        counts = np.zeros(7 * 24, dtype="int64")
+        positions = cells["cell"].to_numpy(dtype="int64")
+        sums[positions] = cells["sales_sum"].to_numpy(dtype="float64")
+        counts[positions] = cells["count"].to_numpy(dtype="int64")
+        return {"sales_sum": sums.reshape(7, 24), "count": counts.reshape(7, 24)}
+
+    # Stessi bin di np.histogram (bordi equidistanti tra minimo e massimo,
+    # ultimo bin chiuso a destra), contati nel motore
+    def _histogram(self, where, params, low, high, count, bins=HISTOGRAM_BINS):
+        if not count:
+            counts, edges = np.histogram(np.empty(0), bins=bins)
+            return {"counts": counts, "edges": edges}
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        edges = np.linspace(low, high, bins + 1)
+        norm = bins / (high - low)
+        # Indice calcolato come in numpy e corretto confrontando i bordi
+        bucket = (
+            f"least(CAST(floor((Sales - {low!r}) * {norm!r}) AS BIGINT), {bins - 1})"
+        )
+        edge_list = "[" + ", ".join(repr(float(edge)) for edge in edges) + "]"
+        cells = self.query(
+            f"WITH b AS (SELECT Sales AS v, {bucket} AS i, {edge_list} AS e "
+            f"FROM sales WHERE {where} AND Sales IS NOT NULL) "
+            "SELECT CASE WHEN v < e[i + 1] THEN i - 1 "
+            f"WHEN v >= e[i + 2] AND i != {bins - 1} THEN i + 1 ELSE i END AS bin, "
+            "count(*) AS count FROM b GROUP BY bin",
+            params,
+        )
+        counts = np.zeros(bins, dtype="int64")
+        counts[cells["bin"].to_numpy(dtype="int64")] = cells["count"].to_numpy()
+        return {"counts": counts, "edges": edges}
+
+    # Vendite giornaliere per gruppo (Date, gruppo, Sales): gia' sommate per
+    # giorno, group_daily_matrix le tratta come le righe originali
+    def daily_sales_by(self, group, values=None, filters=None):
+        where, params = self._where(filters)
+        name = _quote(group)
+        if values is not None:
+            placeholders = ", ".join("?" for _ in values) or "NULL"
+            where += f" AND {name} IN ({placeholders})"
+            params = params + [str(value) for value in values]
+        data = self.query(
+            f'SELECT date_trunc(\'day\', "Date") AS "Date", {name}, '
+            f"fsum(Sales) AS Sales FROM sales "
+            f'WHERE {where} AND "Date" IS NOT NULL AND {name} IS NOT NULL '
+            f'GROUP BY ALL ORDER BY "Date"',
+            params,
+        )
+        return _normalize_dates(data, ["Date"])
+
+    # Righe filtrate come DataFrame: solo per gli export che pandas deve
+    # scrivere (Excel, Arrow IPC), limitati dal formato stesso
+    def fetch(self, filters=None):
+        where, params = self._where(filters)
+        return _normalize_dates(
+            self.query(f"SELECT * FROM sales WHERE {where}", params), ["Date"]
+        )
+
+    def export(self, filters, fmt):
+        if fmt not in COPY_FORMATS:
+            return export_data(self.fetch(filters), fmt)
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        prune_exports()
+        handle, path = tempfile.mkstemp(suffix=EXPORT_FORMATS[fmt][0], dir=EXPORT_DIR)
+        os.close(handle)
+        where, params = self._where(filters)
+        target = path.replace("'", "''")
+        try:
+            self._cursor().execute(
+                f"COPY (SELECT * FROM sales WHERE {where}) TO '{target}' "
+                f"{COPY_FORMATS[fmt]}",
+                params,
+            )
+        except Exception:
+            os.remove(path)
+            raise
+        return path
+
+
+def _normalize_dates(data, columns):
+    for column in columns:
+        if column in data.columns:
+            data[column] = data[column].astype("datetime64[ns]")
+    return data
+
+
+def parquet_path(dataset_id):
+    return os.path.join(CACHE_DIR, dataset_id + PARQUET_SUFFIX)
+
+
+# Un upload viene convertito una volta in Parquet nella cache (CSV e JSON da
+# DuckDB in streaming, Excel tramite pandas); i rerun successivi aprono
+# direttamente il file
+def open_upload(source, dataset_id, name=None, date_format=DATE_FORMAT):
+    path, stats = parquet_copy(source, dataset_id, name, date_format)
+    return DuckDBDataset([path], dataset_id, date_format, stats)
+
+
+# Copia Parquet in cache di un file; le statistiche di caricamento sono None
+# se la copia esiste gia'
+def parquet_copy(source, dataset_id, name=None, date_format=DATE_FORMAT):
+    path = parquet_path(dataset_id)
+    if os.path.exists(path):
+        # Aggiorna mtime: l'eviction LRU usa l'ultimo accesso
+        os.utime(path)
+        return path, None
+
+    name = name or getattr(source, "name", "")
+    extension = os.path.splitext(name)[1].lower()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if extension in (".xlsx", ".xls"):
+        data, stats = load_data(source, name=name, date_format=date_format)
+        data.to_parquet(tmp_path, index=False)
+    else:
+        stats = _convert_upload(source, extension, tmp_path, date_format)
+    # Scrittura atomica come per la cache Arrow
+    os.replace(tmp_path, path)
+    evict_cache(keep=path)
+    return path, stats
+
+
+# source puo' essere un percorso: in quel caso DuckDB lo legge direttamente,
+# senza copiarlo in un file temporaneo
+def _convert_upload(source, extension, target, date_format):
+    start = time.perf_counter()
+    if isinstance(source, str):
+        rows = _write_parquet(source, target, date_format)
+        return make_load_stats(rows, time.perf_counter() - start, "duckdb")
+
+    handle, raw_path = tempfile.mkstemp(suffix=extension or ".csv", dir=CACHE_DIR)
+    try:
+        with os.fdopen(handle, "wb") as raw:
+            if isinstance(source, bytes):
+                raw.write(source)
+            else:
+                source.seek(0)
+                for block in iter(lambda: source.read(8 << 20), b""):
+                    raw.write(block)
+                source.seek(0)
+        rows = _write_parquet(raw_path, target, date_format)
+    finally:
+        os.remove(raw_path)
+    return make_load_stats(rows, time.perf_counter() - start, "duckdb")
+
+
+# Formato delle date del file: come _to_datetime in data_loader, se il
+# formato dichiarato lascerebbe NULL valori presenti (es. 01/17/2023 in un
+# JSON) lo si ricava da questi valori. Valori che non sono date restano NULL,
+# come i NaT di pandas.
+def _date_format(con, source, date_format):
+    if date_format == "ISO8601":
+        convert = 'TRY_CAST("Date" AS TIMESTAMP)'
+    else:
+        fmt = date_format.replace("'", "''")
+        convert = f"try_strptime(CAST(\"Date\" AS VARCHAR), '{fmt}')"
+    rows = con.execute(
+        f'SELECT CAST("Date" AS VARCHAR) FROM {source} '
+        f'WHERE "Date" IS NOT NULL AND {convert} IS NULL LIMIT 10'
+    ).fetchall()
+    for (value,) in rows:
+        guessed = guess_datetime_format(value)
+        if guessed is not None:
+            return guessed
+    return date_format
+
+
+def _write_parquet(raw_path, target, date_format):
+    con = _connect()
+    columns = [
+        row[0]
+        for row in con.execute(
+            f"DESCRIBE SELECT * FROM {_reader([raw_path])}"
+        ).fetchall()
+    ]
+    if "Date" in columns:
+        date_format = _date_format(con, _reader([raw_path]), date_format)
+    quoted = target.replace("'", "''")
+    con.execute(
+        f"COPY (SELECT {_schema_select(columns, date_format)} "
+        f"FROM {_reader([raw_path])}) TO '{quoted}' (FORMAT parquet)"
+    )
+    return con.execute(f"SELECT count(*) FROM read_parquet('{quoted}')").fetchone()[0]
@@ -0,0 +1,177 @@
+import gzip
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # senza pyarrow niente export Parquet/Arrow
+    pa = None
+
+
+# Righe scritte per blocco: il file cresce su disco e in memoria resta solo
+# la conversione di un blocco alla volta
+EXPORT_CHUNK_ROWS = 100_000
+
+# Limite di righe di un foglio Excel, intestazione compresa
+EXCEL_MAX_ROWS = 1_048_576
+
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "sales-dashboard-exports")
+# I file esportati piu' vecchi di cosi' vengono rimossi al successivo export
+EXPORT_MAX_AGE_SECONDS = 3600
+
+# Formato: (estensione, MIME type)
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+    "Excel": (
+        ".xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+    "JSON": (".jsonl", "application/x-ndjson"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "Arrow IPC": (".arrow", "application/vnd.apache.arrow.file"),
+}
+
+ARROW_FORMATS = {"Parquet", "Arrow IPC"}
+
+
+def available_formats():
+    return [fmt for fmt in EXPORT_FORMATS if pa is not None or fmt not in ARROW_FORMATS]
+
+
+def export_file_name(stem, fmt):
+    return stem + EXPORT_FORMATS[fmt][0]
+
+
+def export_mime(fmt):
+    return EXPORT_FORMATS[fmt][1]
+
+
+# Accetta il DataFrame o solo il numero di righe, per i backend che non
+# portano le righe in memoria
+def fits_excel(data):
+    rows = len(data) if hasattr(data, "__len__") else int(data)
+    return rows < EXCEL_MAX_ROWS
+
+
+def _chunks(data, rows=EXPORT_CHUNK_ROWS):
+    for start in range(0, max(len(data), 1), rows):
+        yield start, data.iloc[start : start + rows]
+
+
+def write_csv(data, path, compress=False):
+    opener = gzip.open if compress else open
+    with opener(path, "wt", newline="", encoding="utf-8") as handle:
+        for start, chunk in _chunks(data):
+            chunk.to_csv(handle, index=False, header=start == 0)
+
+
+# JSON lines, lo stesso formato letto da load_data
+def write_json(data, path):
+    with open(path, "w", encoding="utf-8") as handle:
+        for _, chunk in _chunks(data):
+            if len(chunk):
+                text = chunk.to_json(orient="records", lines=True, date_format="iso")
+                handle.write(text)
+                # Le versioni di pandas non concordano sull'a capo finale:
+                # una riga vuota tra i blocchi non e' JSON lines valido
+                if not text.endswith("\n"):
+                    handle.write("\n")
+
+
+def write_parquet(data, path):
+    writer = None
+    try:
+        for _, chunk in _chunks(data):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_arrow(data, path):
+    schema = pa.Schema.from_pandas(data.iloc[:0], preserve_index=False)
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for _, chunk in _chunks(data):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            writer.write_table(table.cast(schema))
+
+
+def write_excel(data, path, sheet_name="Filtered Data"):
+    if not fits_excel(data):
+        raise ValueError(
+            f"{len(data):,} rows exceed the Excel limit of "
+            f"{EXCEL_MAX_ROWS - 1:,}: export as CSV or Parquet instead"
+        )
+    # constant_memory: xlsxwriter scrive ogni riga su disco appena completata
+    with pd.ExcelWriter(
+        path, engine="xlsxwriter", engine_kwargs={"options": {"constant_memory": True}}
+    ) as writer:
+        for start, chunk in _chunks(data):
+            chunk.to_excel(
+                writer,
+                index=False,
+                header=start == 0,
+                startrow=start + 1 if start else 0,
+                sheet_name=sheet_name,
+            )
+
+
+def prune_exports(max_age=EXPORT_MAX_AGE_SECONDS):
+    cutoff = time.time() - max_age
+    for entry in os.scandir(EXPORT_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+# Scrive data nel formato richiesto in un file temporaneo e ne restituisce il
+# percorso
+def export_data(data, fmt):
+    if fmt not in available_formats():
+        raise ValueError(f"Unsupported export format: {fmt}")
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    prune_exports()
+    handle, path = tempfile.mkstemp(suffix=EXPORT_FORMATS[fmt][0], dir=EXPORT_DIR)
+    os.close(handle)
+    try:
+        if fmt == "CSV":
+            write_csv(data, path)
+        elif fmt == "CSV (gzip)":
+            write_csv(data, path, compress=True)
+        elif fmt == "Excel":
+            write_excel(data, path)
+        elif fmt == "JSON":
+            write_json(data, path)
+        elif fmt == "Parquet":
+            write_parquet(data, path)
+        else:
+            write_arrow(data, path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def read_export(path):
+    with open(path, "rb") as handle:
+        return handle.read()
+
+
+# Export completo in memoria per chi non usa l'esecutore: il file temporaneo
+# viene rimosso subito dopo la lettura
+def export_bytes(data, fmt):
+    path = export_data(data, fmt)
+    try:
+        return read_export(path)
+    finally:
+        os.remove(path)
@@ -0,0 +1,168 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import plotly
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.utils import PlotlyJSONEncoder
+
+from app.utils.data_cache import CACHE_DIR, evict_cache
+
+
+# Specifiche JSON dei grafici gia' costruiti, in memoria (LRU entro
+# FIGURE_MEMORY_BYTES) e su disco (entro FIGURE_DISK_BYTES): i rerun e i
+# riavvii con gli stessi dati, filtri e parametri non ricostruiscono i grafici
+FIGURE_DIR = os.path.join(CACHE_DIR, "figures")
+FIGURE_SUFFIX = ".json"
+
+# Versione delle specifiche: da incrementare quando cambia il modo in cui
+# app.utils.figures costruisce i grafici, cosi' le specifiche su disco
+# scritte dal codice precedente non vengono piu' usate. Anche la versione di
+# Plotly fa parte della chiave.
+FIGURE_VERSION = 1
+FIGURE_MEMORY_BYTES = int(os.environ.get("SALES_DASHBOARD_FIGURE_MB", "64")) << 20
+FIGURE_DISK_BYTES = int(os.environ.get("SALES_DASHBOARD_FIGURE_DISK_MB", "256")) << 20
+
+
+# Chiave di un grafico: sorgente dei dati (dataset e filtri, o job), tipo di
+# grafico e parametri che ne cambiano il contenuto, come le posizioni dei
+# punti visibili con lo zoom. Il tema non ne fa parte.
+def figure_key(source, figure, **params):
+    version = (FIGURE_VERSION, plotly.__version__)
+    digest = hashlib.blake2b(
+        repr((version, source, figure)).encode("utf-8"), digest_size=16
+    )
+    for name, value in sorted(params.items()):
+        digest.update(name.encode("utf-8"))
+        if isinstance(value, np.ndarray):
+            digest.update(value.tobytes())
+        else:
+            digest.update(repr(value).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# Specifica JSON di una figura senza template: il tema si applica quando la
+# figura viene mostrata
+def figure_spec(fig):
+    spec = fig.to_plotly_json()
+    spec["layout"].pop("template", None)
+    return json.dumps(spec, cls=PlotlyJSONEncoder)
+
+
+# Il template completo di un tema costa decine di millisecondi da convertire
+@functools.lru_cache(maxsize=None)
+def _template(theme):
+    return pio.templates[theme].to_plotly_json()
+
+
+# Figura da una specifica con il template del tema: cambiare tema sostituisce
+# solo il template. La specifica viene da una figura gia' validata, quindi
+# non si valida di nuovo (_validate=False, altrimenti 5-10 volte piu' lento).
+def themed_figure(spec, theme):
+    spec = json.loads(spec)
+    spec["layout"]["template"] = _template(theme)
+    return go.Figure(spec, _validate=False)
+
+
+class FigureCache:
+    def __init__(
+        self,
+        max_bytes=FIGURE_MEMORY_BYTES,
+        directory=FIGURE_DIR,
+        max_disk_bytes=FIGURE_DISK_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._specs = OrderedDict()
+        self._bytes = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + FIGURE_SUFFIX)
+
+    def _remember(self, key, spec):
+        with self._lock:
+            if key in self._specs:
+                self._specs.move_to_end(key)
+                return
+            self._specs[key] = spec
+            self._bytes += len(spec)
+            while self._bytes > self.max_bytes and len(self._specs) > 1:
+                _, old = self._specs.popitem(last=False)
+                self._bytes -= len(old)
+
+    def _read(self, key):
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                spec = f.read()
+            # Aggiorna mtime: l'eviction LRU usa l'ultimo accesso
+            os.utime(path)
+        except OSError:
+            return None
+        return spec
+
+    def _write(self, key, spec):
+        if self.directory is None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(spec)
+            # Scrittura atomica, come per la cache dei dati
+            os.replace(tmp_path, path)
+        except OSError:
+            # Senza disco scrivibile resta la cache in memoria
+            return
+        evict_cache(
+            self.max_disk_bytes,
+            keep=path,
+            directory=self.directory,
+            suffixes=(FIGURE_SUFFIX,),
+        )
+
+    # Specifica per la chiave: dalla memoria, dal disco o, se manca, da
+    # build(), che costruisce la figura
+    def spec(self, key, build):
+        with self._lock:
+            spec = self._specs.get(key)
+            if spec is not None:
+                self._specs.move_to_end(key)
+                self.hits += 1
+                return spec
+        spec = self._read(key)
+        if spec is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            spec = figure_spec(build())
+            self._write(key, spec)
+        self._remember(key, spec)
+        return spec
+
+    def figure(self, key, build, theme):
+        return themed_figure(self.spec(key, build), theme)
+
+    # Stato della cache per il pannello Performance
+    def stats(self):
+        with self._lock:
+            return {
+                "figures": len(self._specs),
+                "MB": self._bytes / (1 << 20),
+                "hits": self.hits,
+                "disk hits": self.disk_hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,259 @@
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from app.utils.aggregations import DAY_NAMES
+from app.utils.downsampling import minmax_envelope
+
+
+# Larghezza in pixel dei grafici a linee: una cella della griglia 2x2 e un
+# grafico a tutta larghezza nel layout "wide"
+OVERVIEW_CELL_WIDTH_PX = 700
+FULL_WIDTH_PX = 1400
+
+MAX_SEGMENT_PLOT_POINTS = 5000
+
+# Template Plotly selezionabili come tema dei grafici
+CHART_THEMES = ["plotly", "plotly_white", "plotly_dark"]
+
+# plotly.graph_objects e' gia' caricato da Streamlit; plotly.express no e
+# costa un quarto di secondo all'avvio, quindi si importa nei grafici che lo
+# usano, alla prima richiesta
+
+
+# Banda min/max della serie completa nell'intervallo visibile, cosi' i picchi
+# restano visibili anche quando la linea e' ridotta con LTTB
+def add_range_band(fig, series, positions, width_px, **subplot):
+    # Selezione senza righe: nessuna banda, il grafico resta vuoto
+    if len(positions) == 0:
+        return
+    visible = series.iloc[positions[0] : positions[-1] + 1]
+    if len(visible) <= len(positions):
+        return
+    band_x, band_min, band_max = minmax_envelope(
+        visible.index.to_numpy(), visible.to_numpy(), width_px // 2
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=band_x,
+            y=band_max,
+            mode="lines",
+            line=dict(width=0),
+            showlegend=False,
+            hoverinfo="skip",
+        ),
+        **subplot,
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=band_x,
+            y=band_min,
+            mode="lines",
+            line=dict(width=0),
+            fill="tonexty",
+            fillcolor="rgba(99, 110, 250, 0.15)",
+            name="Daily Range",
+            hoverinfo="skip",
+        ),
+        **subplot,
+    )
+
+
+# Griglia 2x2: andamento giornaliero con media mobile (posizioni gia' ridotte
+# alla larghezza del grafico), distribuzione, regioni e prodotti principali
+def overview_figure(aggregates, positions, histogram, width_px=OVERVIEW_CELL_WIDTH_PX):
+    fig1 = make_subplots(
+        rows=2,
+        cols=2,
+        subplot_titles=(
+            "Daily Sales Trend",
+            "Sales Distribution",
+            "Sales by Region",
+            "Top Products",
+        ),
+    )
+
+    # Daily Sales Trend with Moving Average
+    daily_sales = aggregates["by_date"]["sales_sum"]
+    ma_30 = aggregates["ma_30"]
+    add_range_band(fig1, daily_sales, positions, width_px, row=1, col=1)
+    fig1.add_trace(
+        go.Scatter(
+            x=daily_sales.index[positions],
+            y=daily_sales.values[positions],
+            name="Daily Sales",
+            mode="lines",
+        ),
+        row=1,
+        col=1,
+    )
+    fig1.add_trace(
+        go.Scatter(
+            x=daily_sales.index[positions],
+            y=ma_30.values[positions],
+            name="30-Day MA",
+            line=dict(dash="dash"),
+        ),
+        row=1,
+        col=1,
+    )
+
+    # Sales Distribution: bin calcolati lato server, al browser vanno 30 barre
+    edges = histogram["edges"]
+    fig1.add_trace(
+        go.Bar(
+            x=(edges[:-1] + edges[1:]) / 2,
+            y=histogram["counts"],
+            width=np.diff(edges),
+            name="Sales Distribution",
+        ),
+        row=1,
+        col=2,
+    )
+
+    # Regional Performance
+    regional_sales = aggregates["by_region"]["sales_sum"]
+    fig1.add_trace(
+        go.Bar(x=regional_sales.index, y=regional_sales.values, name="Regional Sales"),
+        row=2,
+        col=1,
+    )
+
+    # Top Products
+    product_sales = aggregates["by_product"]["sales_sum"].nlargest(10)
+    fig1.add_trace(
+        go.Bar(x=product_sales.index, y=product_sales.values, name="Product Sales"),
+        row=2,
+        col=2,
+    )
+
+    fig1.update_layout(height=800, showlegend=True)
+    return fig1
+
+
+# Sales Heatmap by Day and Hour (7x24 somme e conteggi dagli aggregati)
+def day_hour_heatmap(day_hour):
+    sums = day_hour["sales_sum"]
+    counts = day_hour["count"]
+    days = counts.sum(axis=1) > 0
+    hours = counts.sum(axis=0) > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_sales = np.where(counts > 0, sums / counts, np.nan)
+
+    fig_heatmap = go.Figure(
+        data=go.Heatmap(
+            z=mean_sales[days][:, hours],
+            x=np.flatnonzero(hours),
+            y=[name for name, used in zip(DAY_NAMES, days) if used],
+            colorscale="Viridis",
+        )
+    )
+    fig_heatmap.update_layout(
+        title="Sales Heatmap by Day and Hour",
+        xaxis_title="Hour of Day",
+        yaxis_title="Day of Week",
+    )
+    return fig_heatmap
+
+
+def product_scatter(by_product):
+    fig_scatter = go.Figure(
+        data=go.Scatter(
+            x=by_product["sales_mean"],
+            y=by_product.get("profit_mean"),
+            mode="markers+text",
+            text=by_product.index,
+            textposition="top center",
+        )
+    )
+    fig_scatter.update_layout(
+        title="Product Performance Analysis",
+        xaxis_title="Average Sales",
+        yaxis_title="Average Profit",
+    )
+    return fig_scatter
+
+
+def anomaly_figure(daily_sales, positions, anomalies, width_px=FULL_WIDTH_PX):
+    fig_anomalies = go.Figure()
+    add_range_band(fig_anomalies, daily_sales, positions, width_px)
+    fig_anomalies.add_trace(
+        go.Scatter(
+            x=daily_sales.index[positions],
+            y=daily_sales.values[positions],
+            mode="lines",
+            name="Daily Sales",
+        )
+    )
+    fig_anomalies.add_trace(
+        go.Scatter(
+            x=anomalies.index,
+            y=anomalies.values,
+            mode="markers",
+            name="Anomalies",
+            marker=dict(color="red", size=10),
+        )
+    )
+    return fig_anomalies
+
+
+def segments_figure(customer_segments, max_points=MAX_SEGMENT_PLOT_POINTS):
+    import plotly.express as px
+
+    # Al grafico basta un campione quando i clienti sono milioni
+    if len(customer_segments) > max_points:
+        customer_segments = customer_segments.sample(max_points, random_state=42)
+    return px.scatter(
+        customer_segments,
+        x="Total_Sales",
+        y="Avg_Sales",
+        color="Segment",
+        hover_data=["Customer"],
+        title="Customer Segmentation Analysis",
+    )
+
+
+def correlation_figure(product_corr):
+    import plotly.express as px
+
+    return px.imshow(
+        product_corr, zmin=-1, zmax=1, title="Product Sales Correlation Matrix"
+    )
+
+
+# Vendite e profitto per periodo, da una tabella delle rollup del calendario
+def period_trend_figure(rollup, level):
+    fig = go.Figure()
+    for column, name in [("sales_sum", "Sales"), ("profit_sum", "Profit")]:
+        if column in rollup.columns:
+            fig.add_trace(
+                go.Scatter(
+                    x=rollup.index, y=rollup[column], mode="lines+markers", name=name
+                )
+            )
+    fig.update_layout(title=f"Sales Trend by {level.capitalize()}")
+    return fig
+
+
+def monthly_figure(monthly_sales):
+    import plotly.express as px
+
+    return px.line(
+        monthly_sales,
+        x="Month",
+        y="Sales",
+        color="Year",
+        title="Monthly Sales Trends by Year",
+    )
+
+
+def quarterly_figure(quarterly_sales):
+    import plotly.express as px
+
+    return px.bar(
+        quarterly_sales,
+        x="Quarter",
+        y="Sales",
+        color="Year",
+        title="Quarterly Sales Analysis",
+    )
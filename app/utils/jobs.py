@@ -0,0 +1,181 @@
+import multiprocessing
+import os
+import sys
+import threading
+import types
+from collections import OrderedDict
+from concurrent.futures import InvalidStateError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+MAX_CACHED_JOBS = 64
+
+
+# Chiave di un job: nome dell'analisi, dataset e parametri (ordinati, cosi'
+# lo stesso calcolo richiesto da sessioni diverse produce la stessa chiave)
+def job_key(name, dataset_id, **params):
+    return (name, dataset_id, repr(sorted(params.items())))
+
+
+# Con "streamlit run" il modulo __main__ e' lo script della dashboard e i
+# processi avviati con spawn lo rieseguirebbero all'avvio: mentre si creano i
+# processi lo si sostituisce con un modulo vuoto.
+@contextmanager
+def _bare_main():
+    main = sys.modules.get("__main__")
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+# Avanzamento scritto dal processo worker in un dizionario condiviso
+class _ProgressReporter:
+    def __init__(self, shared, key):
+        self._shared = shared
+        self._key = key
+
+    def __call__(self, fraction):
+        self._shared[self._key] = fraction
+
+
+class Job:
+    def __init__(self, key, future, progress=None):
+        self.key = key
+        self.future = future
+        self._progress = progress
+
+    @property
+    def progress(self):
+        if self.done():
+            return 1.0
+        if self._progress is None:
+            return 0.0
+        return self._progress.get(self.key, 0.0)
+
+    def done(self):
+        return self.future.done()
+
+    def exception(self):
+        return self.future.exception()
+
+    def result(self):
+        return self.future.result()
+
+    # Annullato o fallito (anche per un worker terminato): una nuova
+    # richiesta con la stessa chiave lo riesegue
+    def failed(self):
+        return self.future.cancelled() or (
+            self.future.done() and self.future.exception() is not None
+        )
+
+
+# Esecutore condiviso tra le sessioni: i calcoli pesanti girano in un pool di
+# processi, fuori dal thread che esegue lo script Streamlit, e i risultati
+# restano in una cache LRU per chiave (job_key). Una sessione che chiede un
+# calcolo gia' fatto o in corso riceve lo stesso Job.
+#
+# Si usa "spawn": i worker non ereditano i thread del server Streamlit, ma le
+# funzioni inviate devono essere importabili (definite in un modulo).
+class JobExecutor:
+    def __init__(self, max_workers=MAX_WORKERS, max_cached=MAX_CACHED_JOBS):
+        self._context = multiprocessing.get_context("spawn")
+        self._max_workers = max_workers
+        self._pool = self._new_pool()
+        self._jobs = OrderedDict()
+        self._max_cached = max_cached
+        self._lock = threading.Lock()
+        self._manager = None
+        self._progress = None
+
+    # Con progress=True la funzione riceve un argomento progress(fraction)
+    def submit(self, key, func, *args, progress=False, **kwargs):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.failed():
+                self._jobs.move_to_end(key)
+                return job
+
+            shared = None
+            if progress:
+                shared = self._progress_dict()
+                kwargs["progress"] = _ProgressReporter(shared, key)
+            # submit avvia i processi del pool quando servono
+            with _bare_main():
+                try:
+                    future = self._pool.submit(func, *args, **kwargs)
+                except BrokenProcessPool:
+                    self._replace_pool()
+                    future = self._pool.submit(func, *args, **kwargs)
+            job = Job(key, future, shared)
+            self._jobs[key] = job
+            self._evict()
+            return job
+
+    # Job per la chiave, in corso o concluso con successo
+    def get(self, key):
+        with self._lock:
+            job = self._jobs.get(key)
+        return job if job is not None and not job.failed() else None
+
+    def discard(self, key):
+        with self._lock:
+            self._jobs.pop(key, None)
+
+    # Job completati con successo, dal piu' recente, che soddisfano match(key)
+    def completed(self, match):
+        with self._lock:
+            jobs = list(reversed(self._jobs.values()))
+        return [
+            job
+            for job in jobs
+            if match(job.key) and job.done() and job.exception() is None
+        ]
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self._max_workers, mp_context=self._context
+        )
+
+    # Un worker terminato (es. memoria esaurita o crash di una libreria)
+    # rompe il pool: i job non conclusi restano falliti con BrokenProcessPool
+    # e i successivi partono in un pool nuovo. Chiamata con _lock acquisito.
+    def _replace_pool(self):
+        self._pool.shutdown(wait=False)
+        error = BrokenProcessPool("A worker process terminated abruptly")
+        for job in self._jobs.values():
+            if not job.future.done():
+                try:
+                    job.future.set_exception(error)
+                except InvalidStateError:
+                    # Concluso nel frattempo dal pool
+                    pass
+        self._pool = self._new_pool()
+
+    def _progress_dict(self):
+        # Il manager (un processo in piu') parte solo al primo job con progress
+        if self._manager is None:
+            with _bare_main():
+                self._manager = self._context.Manager()
+            self._progress = self._manager.dict()
+        return self._progress
+
+    def _evict(self):
+        # Si scartano prima i job conclusi; quelli in corso restano
+        while len(self._jobs) > self._max_cached:
+            for key, job in self._jobs.items():
+                if job.done():
+                    del self._jobs[key]
+                    if self._progress is not None:
+                        self._progress.pop(key, None)
+                    break
+            else:
+                break
@@ -0,0 +1,45 @@
+from app.utils.aggregations import trend_from_stats
+
+
+def calculate_advanced_metrics(aggregates):
+    metrics = {}
+    totals = aggregates["totals"]
+    by_date = aggregates.get("by_date")
+    by_product = aggregates.get("by_product")
+
+    # Trend Analysis
+    trend = trend_from_stats(aggregates["trend"]) if "trend" in aggregates else None
+    if trend is not None:
+        slope, r_value = trend
+        metrics["sales_trend"] = "Positive" if slope > 0 else "Negative"
+        metrics["trend_strength"] = abs(r_value)
+
+    # Sales Performance
+    if "sales_sum" in totals:
+        if by_date is not None:
+            metrics["avg_daily_sales"] = by_date["sales_sum"].mean()
+        metrics["sales_volatility"] = totals["sales_std"] / totals["sales_mean"]
+
+    # Product Performance
+    if by_product is not None and "sales_sum" in by_product.columns:
+        metrics["top_products"] = by_product.nlargest(5, "sales_sum").index.tolist()
+        metrics["underperforming_products"] = by_product.nsmallest(
+            5, "sales_mean"
+        ).index.tolist()
+
+    # Calcolo metriche aggiuntive
+    if "sales_sum" in totals and "profit_sum" in totals:
+        metrics["profit_margin"] = (totals["profit_sum"] / totals["sales_sum"]) * 100
+        metrics["avg_transaction_value"] = totals["sales_mean"]
+
+    return metrics
+
+
+def calculate_kpi(aggregates):
+    kpis = {}
+    kpis["Total Rows"] = aggregates["rows"]
+    if "sales_sum" in aggregates["totals"]:
+        kpis["Total Sales"] = aggregates["totals"]["sales_sum"]
+    if "profit_sum" in aggregates["totals"]:
+        kpis["Total Profit"] = aggregates["totals"]["profit_sum"]
+    return kpis
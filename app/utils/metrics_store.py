@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+
+from app.utils.aggregations import (
+    DIMENSIONS,
+    MA_WINDOW,
+    VALUE_COLUMNS,
+    build_aggregates,
+    trend_stats,
+)
+from app.utils.rollups import merge_rollups
+
+
+# Stato delle metriche mantenuto in modo incrementale: ogni append aggrega
+# solo le righe nuove con build_aggregates e le fonde con lo stato esistente,
+# quindi il costo dipende dalle righe aggiunte e non dal dataset intero.
+# aggregates() restituisce lo stesso formato di build_aggregates.
+class MetricsStore:
+    def __init__(self, data=None):
+        self._aggregates = None
+        if data is not None:
+            self.append(data)
+
+    @property
+    def rows(self):
+        return self._aggregates["rows"] if self._aggregates else 0
+
+    def aggregates(self):
+        return self._aggregates
+
+    def append(self, rows):
+        if len(rows) == 0:
+            return self._aggregates
+        batch = build_aggregates(rows)
+        if self._aggregates is None:
+            self._aggregates = batch
+            return batch
+
+        current = self._aggregates
+        current["rows"] += batch["rows"]
+        _merge_totals(current["totals"], batch["totals"])
+        for name in DIMENSIONS.values():
+            if name == "by_date" or name not in batch:
+                continue
+            if name in current:
+                current[name], _, _ = _merge_dimension(current[name], batch[name])
+            else:
+                current[name] = batch[name]
+
+        if "by_date" in batch:
+            self._append_daily(batch["by_date"])
+        if "rollups" in batch:
+            if "rollups" in current:
+                current["rollups"] = merge_rollups(current["rollups"], batch["rollups"])
+            else:
+                current["rollups"] = batch["rollups"]
+        if "day_hour" in batch:
+            if "day_hour" in current:
+                for name, values in batch["day_hour"].items():
+                    current["day_hour"][name] = current["day_hour"][name] + values
+            else:
+                current["day_hour"] = batch["day_hour"]
+        return current
+
+    def _append_daily(self, new_daily):
+        current = self._aggregates
+        if "by_date" not in current:
+            current["by_date"] = new_daily
+            current["trend"] = trend_stats(new_daily["sales_sum"])
+            current["ma_30"] = new_daily["sales_sum"].rolling(window=MA_WINDOW).mean()
+            return
+
+        old_daily = current["by_date"]
+        n_old = len(old_daily)
+        old_sales = old_daily["sales_sum"].to_numpy(dtype="float64", copy=True)
+        merged, hit_positions, updates = _merge_dimension(old_daily, new_daily)
+        appended = len(merged) > n_old
+        daily_sales = merged["sales_sum"]
+
+        if not merged.index.is_monotonic_increasing:
+            # Giorni inseriti in mezzo alla serie: le posizioni x della
+            # regressione cambiano, si ricalcola dalla serie giornaliera
+            merged = merged.sort_index()
+            daily_sales = merged["sales_sum"]
+            current["by_date"] = merged
+            current["trend"] = trend_stats(daily_sales)
+            current["ma_30"] = daily_sales.rolling(window=MA_WINDOW).mean()
+            return
+
+        current["by_date"] = merged
+        trend = current["trend"]
+        if len(hit_positions):
+            deltas = updates["sales_sum"].to_numpy(dtype="float64")
+            _update_trend_values(trend, hit_positions, old_sales[hit_positions], deltas)
+        if appended:
+            tail = daily_sales.iloc[n_old:]
+            _append_trend_points(trend, tail.to_numpy(dtype="float64"))
+
+        # Media mobile: si ricalcolano solo le posizioni dalla prima modificata
+        changed = [n_old] if appended else []
+        if len(hit_positions):
+            changed.append(int(hit_positions.min()))
+        first = min(changed)
+        start = max(0, first - MA_WINDOW + 1)
+        tail_ma = daily_sales.iloc[start:].rolling(window=MA_WINDOW).mean()
+        current["ma_30"] = pd.concat(
+            [current["ma_30"].iloc[:first], tail_ma.iloc[first - start :]]
+        )
+
+
+def _merge_totals(totals, new_totals):
+    for col in VALUE_COLUMNS:
+        name = col.lower()
+        if f"{name}_sum" not in new_totals:
+            continue
+        if f"{name}_sum" not in totals:
+            totals.update({k: v for k, v in new_totals.items() if k.startswith(name)})
+            continue
+
+        # Combinazione di media e varianza di due gruppi (Chan et al.)
+        n_a, n_b = totals[f"{name}_count"], new_totals[f"{name}_count"]
+        n = n_a + n_b
+        if n_b == 0:
+            continue
+        if n_a == 0:
+            totals.update({k: v for k, v in new_totals.items() if k.startswith(name)})
+            continue
+        mean_a, mean_b = totals[f"{name}_mean"], new_totals[f"{name}_mean"]
+        m2_a = _m2(n_a, totals[f"{name}_std"])
+        m2_b = _m2(n_b, new_totals[f"{name}_std"])
+        delta = mean_b - mean_a
+        m2 = m2_a + m2_b + delta**2 * n_a * n_b / n
+
+        totals[f"{name}_sum"] += new_totals[f"{name}_sum"]
+        totals[f"{name}_count"] = n
+        totals[f"{name}_mean"] = mean_a + delta * n_b / n
+        totals[f"{name}_std"] = np.sqrt(m2 / (n - 1)) if n > 1 else np.nan
+
+
+def _m2(count, std):
+    if count < 2 or pd.isna(std):
+        return 0.0
+    return std**2 * (count - 1)
+
+
+# Fonde gli aggregati di una dimensione: le chiavi gia' presenti vengono
+# aggiornate sul posto, quelle nuove accodate. Restituisce anche le posizioni
+# aggiornate e le righe del batch che le hanno aggiornate.
+def _merge_dimension(old, new):
+    positions = old.index.get_indexer(new.index)
+    hit = positions >= 0
+    hit_positions = positions[hit]
+    updates = new[hit]
+
+    if len(hit_positions):
+        for col in old.columns:
+            loc = old.columns.get_loc(col)
+            current = old.iloc[hit_positions, loc].to_numpy()
+            incoming = updates[col].to_numpy()
+            if col.endswith("_sum") or col.endswith("_count"):
+                old.iloc[hit_positions, loc] = current + incoming
+            elif col == "first_date":
+                old.iloc[hit_positions, loc] = np.minimum(current, incoming)
+            elif col == "last_date":
+                old.iloc[hit_positions, loc] = np.maximum(current, incoming)
+        for col in VALUE_COLUMNS:
+            name = col.lower()
+            if f"{name}_mean" in old.columns:
+                loc = old.columns.get_loc(f"{name}_mean")
+                sums = old[f"{name}_sum"].to_numpy()[hit_positions]
+                counts = old[f"{name}_count"].to_numpy()[hit_positions]
+                old.iloc[hit_positions, loc] = sums / counts
+
+    if not hit.all():
+        old = pd.concat([old, new[~hit]])
+    return old, hit_positions, updates
+
+
+# Aggiornamento O(1) per giorno delle statistiche centrate della regressione
+# quando cambia il valore di giorni gia' presenti (nuove righe su date note).
+def _update_trend_values(trend, positions, old_values, deltas):
+    n = trend["n"]
+    total_delta = deltas.sum()
+    x_dev = positions - trend["mean_x"]
+    y_dev = old_values - trend["mean_y"]
+    trend["cxy"] += float(x_dev @ deltas)
+    trend["cyy"] += float(2 * (y_dev @ deltas) + deltas @ deltas - total_delta**2 / n)
+    trend["mean_y"] += total_delta / n
+
+
+# Aggiunta di nuovi giorni in coda: le statistiche del blocco nuovo si
+# combinano con quelle esistenti senza ripassare la serie.
+def _append_trend_points(trend, values):
+    n_a = trend["n"]
+    n_b = len(values)
+    n = n_a + n_b
+    x_b = np.arange(n_a, n, dtype="float64")
+    mean_xb, mean_yb = x_b.mean(), values.mean()
+    dx_b, dy_b = x_b - mean_xb, values - mean_yb
+
+    dx = mean_xb - trend["mean_x"]
+    dy = mean_yb - trend["mean_y"]
+    weight = n_a * n_b / n
+    trend["cxx"] += float(dx_b @ dx_b) + dx * dx * weight
+    trend["cxy"] += float(dx_b @ dy_b) + dx * dy * weight
+    trend["cyy"] += float(dy_b @ dy_b) + dy * dy * weight
+    trend["mean_x"] += dx * n_b / n
+    trend["mean_y"] += dy * n_b / n
+    trend["n"] = n
@@ -0,0 +1,304 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from app.utils.compact import DEFAULT_AMOUNT_FORMAT, compact_frame, compact_id
+from app.utils.data_cache import CACHE_DIR, files_id, load_with_cache
+from app.utils.data_loader import SUPPORTED_TYPES, concat_chunks, make_load_stats
+from app.utils.datasets import PandasDataset
+from app.utils.duckdb_backend import PARQUET_SUFFIX, DuckDBDataset, parquet_copy
+
+
+# Manifest con le statistiche di ogni partizione, uno per directory o glob
+MANIFEST_DIR = os.path.join(CACHE_DIR, "manifests")
+MANIFEST_VERSION = 1
+
+# Colonne di cui il manifest conserva l'insieme dei valori
+VALUE_SET_COLUMNS = ["Product", "Region"]
+
+PARTITION_WORKERS = min(8, os.cpu_count() or 1)
+
+
+# File di dati in una directory (anche nelle sottodirectory, es.
+# region=North/2024-01.csv) o che corrispondono a un glob
+def partition_files(pattern):
+    pattern = os.path.expanduser(pattern)
+    if os.path.isdir(pattern):
+        paths = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(pattern)
+            for name in names
+        ]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+    return sorted(
+        path
+        for path in paths
+        if os.path.isfile(path) and path.rsplit(".", 1)[-1].lower() in SUPPORTED_TYPES
+    )
+
+
+def manifest_path(pattern):
+    key = os.path.abspath(os.path.expanduser(pattern)).encode("utf-8")
+    name = hashlib.blake2b(key, digest_size=16).hexdigest()
+    return os.path.join(MANIFEST_DIR, name + ".json")
+
+
+# Con DuckDB le partizioni non Parquet vengono convertite una volta in
+# Parquet nella cache: interrogare i CSV rifarebbe il parsing a ogni query
+def _partition_file(path):
+    if path.endswith(PARQUET_SUFFIX):
+        return path
+    return parquet_copy(path, files_id([path]), name=path)[0]
+
+
+# Dataset di un file sul server, letto dalle copie in cache (Arrow per pandas,
+# Parquet per DuckDB) condivise con la dashboard e con app.batch
+def open_path(path, backend="pandas"):
+    if backend == "duckdb":
+        return DuckDBDataset([_partition_file(path)])
+    # La copia Arrow in cache e' indicizzata per percorso, dimensione e data
+    # di modifica: il file non viene riletto ne' hashato
+    dataset_id = files_id([path])
+    with open(path, "rb") as source:
+        data, _, _ = load_with_cache(source, name=path, dataset_id=dataset_id)
+    return PandasDataset(data, dataset_id)
+
+
+def _timestamp(value):
+    return None if pd.isna(value) else pd.Timestamp(value).isoformat()
+
+
+# Statistiche di una partizione, lette una volta sola con il backend scelto
+def partition_stats(path, backend="pandas"):
+    dataset = open_path(path, backend)
+    stat = os.stat(path)
+    entry = {
+        "path": path,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "rows": int(dataset.count()),
+        "columns": dataset.columns,
+        "date_min": None,
+        "date_max": None,
+        "values": {},
+    }
+    if "Date" in dataset.columns:
+        low, high = dataset.date_range()
+        entry["date_min"], entry["date_max"] = _timestamp(low), _timestamp(high)
+    for column in VALUE_SET_COLUMNS:
+        if column in dataset.columns:
+            entry["values"][column] = [str(value) for value in dataset.values(column)]
+    return entry
+
+
+def _read_manifest(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return {entry["path"]: entry for entry in manifest["partitions"]}
+
+
+# Manifest aggiornato: le partizioni con stessa dimensione e data di modifica
+# riusano le statistiche salvate, solo quelle nuove o cambiate vengono lette
+# (in parallelo)
+def build_manifest(pattern, backend="pandas", workers=PARTITION_WORKERS):
+    paths = partition_files(pattern)
+    if not paths:
+        raise ValueError(f"No data files match {pattern}")
+
+    path = manifest_path(pattern)
+    known = _read_manifest(path)
+    entries = {}
+    stale = []
+    for file_path in paths:
+        stat = os.stat(file_path)
+        entry = known.get(file_path)
+        if (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+        ):
+            entries[file_path] = entry
+        else:
+            stale.append(file_path)
+    if stale:
+        with ThreadPoolExecutor(min(workers, len(stale))) as pool:
+            for entry in pool.map(lambda p: partition_stats(p, backend), stale):
+                entries[entry["path"]] = entry
+
+    partitions = [entries[file_path] for file_path in paths]
+    columns = partitions[0]["columns"]
+    for entry in partitions[1:]:
+        if entry["columns"] != columns:
+            raise ValueError(
+                f"{entry['path']} has different columns from {partitions[0]['path']}"
+            )
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "pattern": pattern,
+        "columns": columns,
+        "partitions": partitions,
+    }
+    if stale or len(known) != len(partitions):
+        os.makedirs(MANIFEST_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+    return manifest
+
+
+def manifest_id(manifest):
+    digest = hashlib.blake2b(digest_size=16)
+    for entry in manifest["partitions"]:
+        digest.update(f"{entry['path']}:{entry['size']}:{entry['mtime_ns']}".encode())
+    return digest.hexdigest()
+
+
+# Una partizione puo' contenere righe selezionate dai filtri? Stessa logica
+# di select_rows: intervallo di date con estremi inclusi (le date mancanti
+# non passano mai), valori ammessi per le colonne categoriche, filtri vuoti
+# ignorati. Le colonne senza statistiche non escludono nulla.
+def may_match(entry, filters):
+    date_filter = (filters or {}).get("Date")
+    if date_filter is not None and len(date_filter) == 2 and "Date" in entry["columns"]:
+        if entry["date_min"] is None:
+            return False
+        start, end = (pd.to_datetime(value) for value in date_filter)
+        if pd.Timestamp(entry["date_max"]) < start:
+            return False
+        if pd.Timestamp(entry["date_min"]) > end:
+            return False
+    for column, filter_value in (filters or {}).items():
+        if column == "Date" or not filter_value or column not in entry["values"]:
+            continue
+        if not set(entry["values"][column]) & {str(value) for value in filter_value}:
+            return False
+    return True
+
+
+def prune(partitions, filters):
+    return [entry for entry in partitions if may_match(entry, filters)]
+
+
+def load_partitions(partitions, workers=PARTITION_WORKERS):
+    with ThreadPoolExecutor(min(workers, len(partitions))) as pool:
+        datasets = list(
+            pool.map(lambda entry: open_path(entry["path"], "pandas"), partitions)
+        )
+    return concat_chunks([dataset.data for dataset in datasets])
+
+
+def parquet_partitions(partitions, workers=PARTITION_WORKERS):
+    with ThreadPoolExecutor(min(workers, len(partitions))) as pool:
+        return list(pool.map(lambda entry: _partition_file(entry["path"]), partitions))
+
+
+# Dataset formato da piu' file. Date e valori per i filtri arrivano dal
+# manifest; ogni richiesta legge solo le partizioni che possono contenere
+# righe selezionate, con il backend scelto (pandas le carica in parallelo e
+# le concatena, DuckDB le interroga in Parquet). L'ultima selezione resta
+# aperta per le richieste successive con le stesse partizioni. amounts e' il
+# formato in memoria degli importi con il backend pandas (AMOUNT_FORMATS).
+class PartitionedDataset:
+    def __init__(self, manifest, backend="pandas", amounts=DEFAULT_AMOUNT_FORMAT):
+        self.manifest = manifest
+        self.partitions = manifest["partitions"]
+        self.columns = manifest["columns"]
+        self.backend = backend
+        self.amounts = amounts
+        self.in_memory = backend != "duckdb"
+        self.dataset_id = manifest_id(manifest) + "-parts"
+        if backend == "duckdb":
+            self.dataset_id += "-duckdb"
+        else:
+            self.dataset_id = compact_id(self.dataset_id, amounts)
+        self.load_stats = None
+        self._lock = threading.Lock()
+        self._selection = None
+        self._dataset = None
+        self._head = None
+
+    def _select(self, filters):
+        partitions = prune(self.partitions, filters)
+        if not partitions:
+            # Nessuna partizione compatibile: basta la prima, i filtri ne
+            # scartano tutte le righe e lo schema resta quello del dataset
+            partitions = self.partitions[:1]
+        selection = tuple(entry["path"] for entry in partitions)
+        with self._lock:
+            if selection != self._selection:
+                start = time.perf_counter()
+                if self.backend == "duckdb":
+                    dataset = DuckDBDataset(parquet_partitions(partitions))
+                else:
+                    data = compact_frame(load_partitions(partitions), self.amounts)
+                    dataset = PandasDataset(data, self.dataset_id)
+                self.load_stats = make_load_stats(
+                    sum(entry["rows"] for entry in partitions),
+                    time.perf_counter() - start,
+                    self.backend,
+                )
+                self._selection, self._dataset = selection, dataset
+            return self._dataset
+
+    def head(self, n=5):
+        if self._head is None or len(self._head) < n:
+            first = open_path(self.partitions[0]["path"], self.backend)
+            self._head = first.head(n)
+        return self._head.head(n)
+
+    def count(self, filters=None):
+        return self._select(filters).count(filters)
+
+    def rows(self):
+        return sum(entry["rows"] for entry in self.partitions)
+
+    def date_range(self):
+        if "Date" not in self.columns:
+            return None
+        lows = [entry["date_min"] for entry in self.partitions if entry["date_min"]]
+        highs = [entry["date_max"] for entry in self.partitions if entry["date_max"]]
+        if not lows:
+            return pd.NaT, pd.NaT
+        return pd.Timestamp(min(lows)), pd.Timestamp(max(highs))
+
+    def values(self, column):
+        if column not in VALUE_SET_COLUMNS:
+            return self._select(None).values(column)
+        found = set()
+        for entry in self.partitions:
+            found.update(entry["values"].get(column, []))
+        return sorted(found)
+
+    def filter(self, filters=None):
+        return self._select(filters).filter(filters)
+
+    def aggregates(self, filters=None):
+        return self._select(filters).aggregates(filters)
+
+    def daily_sales_by(self, group, values=None, filters=None):
+        return self._select(filters).daily_sales_by(group, values, filters)
+
+    def fetch(self, filters=None):
+        return self._select(filters).fetch(filters)
+
+    def export(self, filters, fmt):
+        return self._select(filters).export(filters, fmt)
+
+    # Memoria delle partizioni caricate per l'ultima selezione
+    def memory_report(self):
+        if not self.in_memory or self._dataset is None:
+            return None
+        return self._dataset.memory_report()
@@ -0,0 +1,228 @@
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # non disponibile su Windows
+    resource = None
+
+
+# File JSON-lines in cui scrivere le misure (vuoto: nessun log)
+PERF_LOG = os.environ.get("SALES_DASHBOARD_PERF_LOG", "")
+
+PROFILE_TOP_FUNCTIONS = 30
+PROFILE_TOP_ALLOCATIONS = 15
+TRACEMALLOC_FRAMES = 10
+
+_log_lock = threading.Lock()
+
+
+def peak_memory_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss e' in KB su Linux e in byte su macOS
+    if peak > 1 << 32:
+        return peak / (1 << 20)
+    return peak / (1 << 10)
+
+
+# Memoria residente attuale del processo; senza /proc (macOS, Windows) si
+# ripiega sul picco di getrusage
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return peak_memory_mb()
+
+
+# Tempi e memoria delle fasi di un rerun. Le fasi si possono annidare (load
+# contiene to_datetime); il picco di allocazioni viene misurato solo mentre
+# tracemalloc e' attivo, cioe' durante una cattura del profilo.
+class PerfRecorder:
+    def __init__(self, log_path=None, run_id=None):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.log_path = log_path
+        self.started = time.perf_counter()
+        self.records = []
+        self.log_error = None
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name, **info):
+        stack = self._stack()
+        tracing = tracemalloc.is_tracing()
+        entry = {"peak": 0, "current": 0}
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            entry["current"] = current
+        rss = current_rss_mb()
+        start = time.perf_counter()
+        stack.append(entry)
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            record = {
+                "stage": name,
+                "depth": len(stack),
+                "offset": start - self.started,
+                "seconds": seconds,
+                "rss_mb": current_rss_mb(),
+            }
+            if rss is not None and record["rss_mb"] is not None:
+                record["rss_delta_mb"] = record["rss_mb"] - rss
+            if tracing and tracemalloc.is_tracing():
+                peak = max(entry["peak"], tracemalloc.get_traced_memory()[1])
+                record["alloc_peak_mb"] = (peak - entry["current"]) / (1 << 20)
+                if stack:
+                    stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            record.update(info)
+            self.records.append(record)
+            self._log(record)
+
+    def _log(self, record):
+        if not self.log_path:
+            return
+        line = json.dumps(
+            {"run": self.run_id, "time": time.time(), **record}, default=str
+        )
+        # Un percorso non scrivibile non deve interrompere il rerun
+        try:
+            with _log_lock:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            self.log_error = str(e)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    # Nel log il rerun completo e' una riga a parte, con stage "rerun"
+    def finish(self):
+        self._log({"stage": "rerun", "depth": -1, "seconds": self.elapsed()})
+
+
+# Tabella per il pannello: fasi in ordine di inizio, le annidate indentate
+def stage_table(records, total_seconds=None):
+    rows = []
+    for record in sorted(records, key=lambda record: record["offset"]):
+        row = {
+            "Stage": "\u2003" * record["depth"] + record["stage"],
+            "Seconds": round(record["seconds"], 4),
+        }
+        if total_seconds:
+            row["% of rerun"] = round(100 * record["seconds"] / total_seconds, 1)
+        for column, key in [
+            ("RSS MB", "rss_mb"),
+            ("RSS delta MB", "rss_delta_mb"),
+            ("Alloc peak MB", "alloc_peak_mb"),
+        ]:
+            if record.get(key) is not None:
+                row[column] = round(record[key], 1)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+_current = ContextVar("perf_recorder", default=None)
+
+
+# Il recorder attivo vale per il thread dello script: le funzioni in
+# app.utils possono misurare le proprie fasi con stage() senza riceverlo
+# come argomento. Fuori da un rerun stage() non fa nulla.
+def activate(recorder):
+    return _current.set(recorder)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextmanager
+def stage(name, **info):
+    recorder = _current.get()
+    if recorder is None:
+        yield
+        return
+    with recorder.stage(name, **info):
+        yield
+
+
+# Cattura cProfile + tracemalloc di un singolo rerun, attivata su richiesta
+# perche' rallenta sensibilmente lo script
+class ProfileCapture:
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self._started_tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracing = True
+        self.profiler.enable()
+
+    # Rerun interrotto (st.rerun, st.stop): si ferma la cattura senza report
+    def cancel(self):
+        self.profiler.disable()
+        if self._started_tracing:
+            tracemalloc.stop()
+
+    def stop(self):
+        self.profiler.disable()
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        if self._started_tracing:
+            tracemalloc.stop()
+        return {
+            "functions": self._function_report(),
+            "allocations": self._allocation_report(snapshot),
+            "prof": self._prof_bytes(),
+        }
+
+    def _function_report(self):
+        out = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=out)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP_FUNCTIONS)
+        return out.getvalue()
+
+    def _allocation_report(self, snapshot):
+        if snapshot is None:
+            return ""
+        snapshot = snapshot.filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        lines = []
+        for stat in snapshot.statistics("lineno")[:PROFILE_TOP_ALLOCATIONS]:
+            frame = stat.traceback[0]
+            lines.append(
+                f"{stat.size / (1 << 20):9.2f} MB {stat.count:>9,} blocks  "
+                f"{frame.filename}:{frame.lineno}"
+            )
+        return "\n".join(lines)
+
+    # Stesso formato di dump_stats: il file si apre con pstats o snakeviz
+    def _prof_bytes(self):
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)
@@ -0,0 +1,121 @@
+import threading
+import time
+
+
+# Una sessione che non fa rerun da questo tempo non tiene piu' aperti i suoi
+# dataset: Streamlit non segnala la chiusura di una scheda del browser
+SESSION_LEASE_SECONDS = 30 * 60
+
+# Un dataset non usato da nessuna sessione resta aperto per questo tempo, cosi'
+# chi riapre lo stesso file poco dopo non lo ricarica
+DATASET_IDLE_SECONDS = 5 * 60
+
+# Dataset non usati tenuti aperti al massimo, i piu' recenti
+MAX_IDLE_DATASETS = 2
+
+
+class _Entry:
+    def __init__(self, now):
+        self.dataset = None
+        self.sessions = {}  # sessione -> ultimo rerun
+        self.last_used = now
+        self.lock = threading.Lock()
+
+
+# Registro dei dataset aperti nel processo, condiviso da tutte le sessioni:
+# chi apre un file gia' aperto da un'altra sessione riceve lo stesso oggetto.
+# Ogni sessione tiene al massimo un dataset (quello mostrato); un dataset
+# senza sessioni viene chiuso dopo DATASET_IDLE_SECONDS o quando i dataset
+# inutilizzati superano max_idle.
+class DatasetRegistry:
+    def __init__(
+        self,
+        lease_seconds=SESSION_LEASE_SECONDS,
+        idle_seconds=DATASET_IDLE_SECONDS,
+        max_idle=MAX_IDLE_DATASETS,
+        clock=time.monotonic,
+    ):
+        self.lease_seconds = lease_seconds
+        self.idle_seconds = idle_seconds
+        self.max_idle = max_idle
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._sessions = {}  # sessione -> chiave del dataset
+
+    def _release_locked(self, session, now):
+        key = self._sessions.pop(session, None)
+        entry = self._entries.get(key)
+        if entry is not None and entry.sessions.pop(session, None) is not None:
+            entry.last_used = now
+
+    # Dataset per la chiave, aperto con opener() solo se nessuna sessione lo
+    # ha gia' aperto; il dataset tenuto prima dalla sessione viene rilasciato.
+    # Due sessioni che aprono insieme lo stesso file lo caricano una volta.
+    def acquire(self, session, key, opener):
+        now = self._clock()
+        with self._lock:
+            if self._sessions.get(session) != key:
+                self._release_locked(session, now)
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(now)
+            entry.sessions[session] = now
+            entry.last_used = now
+            self._sessions[session] = key
+
+        try:
+            with entry.lock:
+                if entry.dataset is None:
+                    entry.dataset = opener()
+                dataset = entry.dataset
+        except Exception:
+            with self._lock:
+                self._release_locked(session, now)
+                if entry.dataset is None and not entry.sessions:
+                    self._entries.pop(key, None)
+            raise
+        self.evict()
+        return dataset
+
+    def release(self, session):
+        with self._lock:
+            self._release_locked(session, self._clock())
+        self.evict()
+
+    # Scadenza delle sessioni inattive e chiusura dei dataset inutilizzati;
+    # restituisce le chiavi chiuse. La memoria viene liberata quando anche i
+    # rerun in corso hanno finito di usare il dataset.
+    def evict(self):
+        now = self._clock()
+        removed = []
+        with self._lock:
+            for session, key in list(self._sessions.items()):
+                seen = self._entries[key].sessions[session]
+                if now - seen > self.lease_seconds:
+                    self._release_locked(session, seen)
+
+            idle = sorted(
+                (entry.last_used, key)
+                for key, entry in self._entries.items()
+                if not entry.sessions and entry.dataset is not None
+            )
+            for position, (last_used, key) in enumerate(reversed(idle)):
+                if position >= self.max_idle or now - last_used > self.idle_seconds:
+                    del self._entries[key]
+                    removed.append(key)
+        return removed
+
+    # Stato del registro per il pannello Performance
+    def stats(self):
+        now = self._clock()
+        with self._lock:
+            return [
+                {
+                    "dataset": entry.dataset.dataset_id,
+                    "sessions": len(entry.sessions),
+                    "idle_seconds": 0.0 if entry.sessions else now - entry.last_used,
+                }
+                for key, entry in self._entries.items()
+                if entry.dataset is not None
+            ]
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+from app.utils.jobs import job_key
+
+# scikit-learn (e scipy, che importa) costa piu' di un secondo all'avvio: si
+# importa solo nelle funzioni che addestrano i modelli, eseguite nei processi
+# del JobExecutor
+
+
+FEATURE_COLUMNS = ["Sales_Count", "Total_Sales", "Avg_Sales", "Active_Days"]
+
+# Oltre questa soglia di clienti si passa a MiniBatchKMeans addestrato su un
+# campione, poi tutti i clienti vengono assegnati al centro piu' vicino
+FULL_KMEANS_MAX_CUSTOMERS = 50_000
+SAMPLE_SIZE = 200_000
+BATCH_SIZE = 4096
+EPOCHS = 5
+
+
+# Feature per cliente dagli aggregati condivisi (nessuna groupby/lambda qui)
+def customer_features(aggregates):
+    by_customer = aggregates.get("by_customer")
+    if by_customer is None or "first_date" not in by_customer.columns:
+        return None
+    features = pd.DataFrame(
+        {
+            "Sales_Count": by_customer["sales_count"],
+            "Total_Sales": by_customer["sales_sum"],
+            "Avg_Sales": by_customer["sales_mean"],
+            "Active_Days": (
+                by_customer["last_date"] - by_customer["first_date"]
+            ).dt.days,
+        }
+    )
+    return features.rename_axis("Customer").reset_index()
+
+
+def _scale(features):
+    from sklearn.preprocessing import StandardScaler
+
+    values = features[FEATURE_COLUMNS].to_numpy(dtype="float64")
+    values = np.nan_to_num(values)
+    return StandardScaler().fit_transform(values)
+
+
+# Centri iniziali per k a partire da un modello gia' addestrato con un altro
+# k: se servono meno centri si raggruppano quelli esistenti (pesati per
+# dimensione del cluster), se ne servono di piu' si aggiungono con il
+# campionamento D^2 di k-means++.
+def warm_start_centers(centers, sizes, X, k, random_state=42):
+    if k == len(centers):
+        return centers
+    if k < len(centers):
+        from sklearn.cluster import KMeans
+
+        reducer = KMeans(n_clusters=k, n_init=1, random_state=random_state)
+        reducer.fit(centers, sample_weight=np.maximum(sizes, 1))
+        return reducer.cluster_centers_
+
+    rng = np.random.default_rng(random_state)
+    sample = X[rng.choice(len(X), size=min(len(X), SAMPLE_SIZE), replace=False)]
+    chosen = list(centers)
+    for _ in range(k - len(centers)):
+        distances = ((sample[:, None, :] - np.array(chosen)[None]) ** 2).sum(axis=2)
+        weights = distances.min(axis=1)
+        total = weights.sum()
+        if total == 0:
+            chosen.append(sample[rng.integers(len(sample))])
+        else:
+            chosen.append(sample[rng.choice(len(sample), p=weights / total)])
+    return np.array(chosen)
+
+
+def fit_segments(X, k, init=None, progress=None, random_state=42):
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+
+    progress = progress or (lambda fraction: None)
+    n_init = 1 if init is not None else "auto"
+    init = init if init is not None else "k-means++"
+
+    if len(X) <= FULL_KMEANS_MAX_CUSTOMERS:
+        model = KMeans(
+            n_clusters=k, init=init, n_init=n_init, random_state=random_state
+        )
+        model.fit(X)
+        progress(1.0)
+        return model
+
+    rng = np.random.default_rng(random_state)
+    sample = X[rng.choice(len(X), size=min(len(X), SAMPLE_SIZE), replace=False)]
+    # partial_fit inizializza i centri una sola volta, n_init non serve
+    model = MiniBatchKMeans(
+        n_clusters=k,
+        init=init,
+        n_init=1,
+        batch_size=BATCH_SIZE,
+        random_state=random_state,
+    )
+    steps = EPOCHS * int(np.ceil(len(sample) / BATCH_SIZE))
+    step = 0
+    for _ in range(EPOCHS):
+        order = rng.permutation(len(sample))
+        for start in range(0, len(sample), BATCH_SIZE):
+            model.partial_fit(sample[order[start : start + BATCH_SIZE]])
+            step += 1
+            progress(step / steps)
+    return model
+
+
+# Scaling, clustering e assegnazione dei segmenti; warm e' un modello gia'
+# addestrato sugli stessi clienti (centri e dimensioni dei cluster)
+def segment_customers(features, k, warm=None, progress=None):
+    X = _scale(features)
+    init = None
+    if warm is not None:
+        init = warm_start_centers(warm["centers"], warm["sizes"], X, k)
+    model = fit_segments(X, k, init=init, progress=progress)
+
+    segments = features.copy()
+    segments["Segment"] = model.predict(X)
+    return segments, model
+
+
+def perform_customer_segmentation(aggregates, n_segments=3):
+    features = customer_features(aggregates)
+    if features is None:
+        return None
+    segments, _ = segment_customers(features, n_segments)
+    return segments
+
+
+# Eseguita in un processo worker del JobExecutor: restituisce i segmenti e
+# il modello (centri e dimensioni dei cluster) per i warm start successivi
+def run_segmentation(features, k, warm=None, progress=None):
+    segments, model = segment_customers(features, k, warm=warm, progress=progress)
+    sizes = np.bincount(segments["Segment"], minlength=k)
+    return {"segments": segments, "centers": model.cluster_centers_, "sizes": sizes}
+
+
+# Segmentazione sopra l'esecutore condiviso: i job sono memorizzati per
+# (dataset, k) e un job per un nuovo k parte dai centri dell'ultimo modello
+# addestrato sullo stesso dataset.
+class SegmentationEngine:
+    def __init__(self, executor):
+        self._executor = executor
+
+    def submit(self, dataset_id, features, k):
+        key = job_key("segmentation", dataset_id, k=k)
+        job = self._executor.get(key)
+        if job is not None:
+            return job
+        warm = self._latest_model(dataset_id)
+        return self._executor.submit(
+            key, run_segmentation, features, k, warm, progress=True
+        )
+
+    def _latest_model(self, dataset_id):
+        jobs = self._executor.completed(
+            lambda key: key[0] == "segmentation" and key[1] == dataset_id
+        )
+        if not jobs:
+            return None
+        # Solo centri e dimensioni: i segmenti per cliente non servono al
+        # warm start e verrebbero serializzati nel nuovo job
+        result = jobs[0].result()
+        return {"centers": result["centers"], "sizes": result["sizes"]}
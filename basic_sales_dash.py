@@ -5,6 +5,9 @@ import plotly.graph_objects as go
 import io
 from datetime import datetime
 
+from app.utils.data_cache import content_hash, load_with_cache
+from app.utils.data_loader import format_load_stats
+
 # Configurazione della pagina
 st.set_page_config(page_title="Sales Dashboard", layout="wide")
 
@@ -34,13 +37,15 @@ def create_basic_visualizations(data):
 
     # Regional Performance
     st.subheader("Sales by Region")
-    regional_sales = data.groupby("Region")["Sales"].sum().reset_index()
+    regional_sales = data.groupby("Region", observed=True)["Sales"].sum().reset_index()
     fig_regions = px.bar(regional_sales, x="Region", y="Sales", title="Sales by Region")
     st.plotly_chart(fig_regions, use_container_width=True)
 
     # Top Products
     st.subheader("Top Products")
-    product_sales = data.groupby("Product")["Sales"].sum().nlargest(5).reset_index()
+    product_sales = (
+        data.groupby("Product", observed=True)["Sales"].sum().nlargest(5).reset_index()
+    )
     fig_products = px.bar(product_sales, x="Product", y="Sales", title="Top 5 Products")
     st.plotly_chart(fig_products, use_container_width=True)
 
@@ -50,18 +55,19 @@ st.subheader("Upload Data")
 uploaded_file = st.file_uploader("Upload a file (CSV, Excel)", type=["csv", "xlsx"])
 
 if uploaded_file:
-    # Load data
+    # Load data: nei rerun lo stesso upload riusa l'hash gia' calcolato
     try:
-        if uploaded_file.name.endswith(".csv"):
-            data = pd.read_csv(uploaded_file)
-        else:
-            data = pd.read_excel(uploaded_file)
-
-        if "Date" in data.columns:
-            data["Date"] = pd.to_datetime(data["Date"])
+        upload_ids = st.session_state.setdefault("upload_ids", {})
+        upload_key = getattr(uploaded_file, "file_id", uploaded_file.name)
+        if upload_key not in upload_ids:
+            upload_ids[upload_key] = content_hash(uploaded_file)
+        data, _, load_stats = load_with_cache(
+            uploaded_file, dataset_id=upload_ids[upload_key]
+        )
 
         # Data Preview
         st.write("Data Preview:")
+        st.caption(format_load_stats(load_stats))
         st.dataframe(data.head())
 
         # Base Filters
@@ -0,0 +1,70 @@
+"""Benchmark dei rilevatori di anomalie.
+
+Uso: python -m benchmarks.bench_anomaly [--series 2000] [--days 730]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.utils.anomaly import METHODS, StreamingDetector, anomaly_scores
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run(series=2000, days=730, stream_points=100_000, seed=42):
+    rng = np.random.default_rng(seed)
+    weekly = np.tile([0, 5, 10, 0, -5, 20, 30], days // 7 + 1)[:days]
+    matrix = rng.normal(100, 10, (series, days)) + weekly
+
+    results = []
+    for method in METHODS:
+        scores, seconds = _timed(anomaly_scores, matrix, method)
+        results.append(
+            {
+                "method": method,
+                "mode": "vectorized",
+                "points": matrix.size,
+                "seconds": seconds,
+                "points_per_second": matrix.size / seconds,
+                "anomalies": int((np.abs(np.nan_to_num(scores)) > 2).sum()),
+            }
+        )
+
+        detector = StreamingDetector(method)
+        values = rng.normal(100, 10, stream_points)
+        _, seconds = _timed(detector.update_many, values)
+        results.append(
+            {
+                "method": method,
+                "mode": "streaming",
+                "points": stream_points,
+                "seconds": seconds,
+                "points_per_second": stream_points / seconds,
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--series", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--stream-points", type=int, default=100_000)
+    args = parser.parse_args()
+
+    for row in run(args.series, args.days, args.stream_points):
+        print(
+            f"{row['method']:>15} {row['mode']:>10} "
+            f"{row['points']:>12,} points {row['seconds']:8.3f}s "
+            f"{row['points_per_second']:>14,.0f} points/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
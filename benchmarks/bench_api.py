@@ -0,0 +1,61 @@
+"""Benchmark del client API contro il server stub locale.
+
+Uso: python -m benchmarks.bench_api [--records 200000] [--fail-rate 0.05]
+"""
+
+import argparse
+import time
+
+import pandas as pd
+import requests
+
+from app.utils.api_client import fetch_sales
+from benchmarks.stub_sales_api import serve
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+# Il vecchio fetch_api_data: una sola richiesta e DataFrame da response.json()
+def _single_request(url):
+    return pd.DataFrame(requests.get(url).json())
+
+
+def run(records=200_000, fail_rate=0.0, delay=0.0):
+    server, base_url = serve(fail_rate=fail_rate, delay=delay)
+    url = f"{base_url}/generate-sales?num_records={records}"
+    try:
+        results = []
+        if not fail_rate:
+            data, seconds = _timed(_single_request, url)
+            results.append(
+                {"client": "single request", "rows": len(data), "seconds": seconds}
+            )
+        data, seconds = _timed(fetch_sales, url)
+        results.append(
+            {"client": "paged + streamed", "rows": len(data), "seconds": seconds}
+        )
+        return results
+    finally:
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    for row in run(args.records, args.fail_rate, args.delay):
+        print(
+            f"{row['client']:>18} {row['rows']:>10,} rows {row['seconds']:8.3f}s "
+            f"{row['rows'] / row['seconds']:>12,.0f} rows/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Memoria per colonna del dataset in memoria nei diversi formati.
+
+Uso: python -m benchmarks.bench_memory [--rows 1m] [--seed 42]
+                                       [--min-ratio 2.0]
+
+Genera i dati con benchmarks.synthetic e riporta la memoria di ogni colonna
+con testo come stringhe e importi float64 (il formato senza compact_frame),
+poi nel formato compatto con importi float64 e float32. Il formato float32
+deve occupare almeno --min-ratio volte meno memoria del primo: altrimenti
+il comando esce con codice 1.
+"""
+
+import argparse
+import sys
+
+from app.utils.compact import AMOUNT_FORMATS, compact_frame, memory_report
+from app.utils.data_loader import CATEGORICAL_COLUMNS
+from benchmarks.synthetic import DEFAULT_SEED, generate_sales, parse_rows
+
+
+DEFAULT_ROWS = "1m"
+DEFAULT_MIN_RATIO = 2.0
+
+
+def _print_report(label, report):
+    total = report["MB"].sum()
+    print(f"{label}: {total:,.1f} MB")
+    print(report.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+    print()
+    return total
+
+
+def run(rows, seed=DEFAULT_SEED):
+    data = generate_sales(rows, seed=seed)
+    text = data.astype({col: "str" for col in CATEGORICAL_COLUMNS})
+    totals = {"text": _print_report("text + float64", memory_report(text))}
+    for amounts in AMOUNT_FORMATS:
+        report = memory_report(compact_frame(text, amounts))
+        totals[amounts] = _print_report(f"compact, {amounts}", report)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default=DEFAULT_ROWS)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--min-ratio", type=float, default=DEFAULT_MIN_RATIO)
+    args = parser.parse_args()
+
+    totals = run(parse_rows(args.rows), args.seed)
+    ratio = totals["text"] / totals["float32"]
+    print(f"float32 compact format: {ratio:.1f}x less memory")
+    sys.exit(1 if ratio < args.min_ratio else 0)
+
+
+if __name__ == "__main__":
+    main()
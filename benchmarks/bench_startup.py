@@ -0,0 +1,135 @@
+"""Tempo di avvio a freddo degli import della dashboard.
+
+Uso: python -m benchmarks.bench_startup [--script main.py] [--runs 5]
+                                        [--budget 0.25] [--output startup.json]
+
+Esegue in un interprete nuovo (--runs volte) solo gli import di primo
+livello dello script, letti dal sorgente, e li confronta con il solo import
+di streamlit e pandas, il minimo che ogni processo paga comunque. Il costo
+aggiuntivo della dashboard deve restare entro --budget secondi e le
+dipendenze pesanti caricate su richiesta (scikit-learn, scipy, requests,
+plotly.express) non devono comparire all'avvio: altrimenti il comando
+esce con codice 1. Con -X importtime riporta anche i moduli piu' lenti.
+"""
+
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+# Secondi di import oltre a streamlit + pandas ammessi all'avvio
+STARTUP_BUDGET_SECONDS = 0.25
+
+# Moduli che si caricano solo quando serve la funzione che li usa
+DEFERRED_MODULES = [
+    "sklearn",
+    "scipy",
+    "requests",
+    "plotly.express",
+    "plotly.figure_factory",
+]
+
+BASELINE_IMPORTS = "import streamlit\nimport pandas\n"
+
+TOP_MODULES = 10
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+exec({code!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": seconds,
+    "loaded": [name for name in {deferred!r} if name in sys.modules],
+}}))
+"""
+
+
+# Solo gli import di primo livello: lo script non viene eseguito
+def script_imports(path):
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    nodes = [
+        node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))
+    ]
+    return "\n".join(ast.unparse(node) for node in nodes) + "\n"
+
+
+def _probe(code, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", _PROBE.format(code=code, deferred=DEFERRED_MODULES)]
+    result = subprocess.run(
+        command, capture_output=True, text=True, check=True, cwd=os.getcwd()
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+# Moduli di primo livello con il tempo cumulativo piu' alto (-X importtime)
+def slowest_modules(stderr, top=TOP_MODULES):
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit() or name.startswith("  "):
+            continue
+        modules.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+def run(script="main.py", runs=5):
+    code = script_imports(script)
+    baseline = [_probe(BASELINE_IMPORTS)[0]["seconds"] for _ in range(runs)]
+    probes = [_probe(code)[0] for _ in range(runs)]
+    full = [probe["seconds"] for probe in probes]
+    _, stderr = _probe(code, importtime=True)
+    return {
+        "script": script,
+        "runs": runs,
+        "baseline_seconds": statistics.median(baseline),
+        "startup_seconds": statistics.median(full),
+        "app_seconds": statistics.median(full) - statistics.median(baseline),
+        "deferred_loaded": probes[-1]["loaded"],
+        "slowest_modules": slowest_modules(stderr),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--script", default="main.py")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_SECONDS)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    report = run(args.script, args.runs)
+    report["budget_seconds"] = args.budget
+    print(
+        f"{report['script']}: imports {report['startup_seconds']:.3f}s "
+        f"(streamlit + pandas {report['baseline_seconds']:.3f}s, "
+        f"dashboard {report['app_seconds']:.3f}s, budget {args.budget:.3f}s)"
+    )
+    for seconds, name in report["slowest_modules"]:
+        print(f"{seconds:9.3f}s {name}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    if report["deferred_loaded"]:
+        print(f"Loaded at startup: {', '.join(report['deferred_loaded'])}")
+        failed = True
+    if report["app_seconds"] > args.budget:
+        print("Startup budget exceeded")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Confronto tra il backend pandas e il backend DuckDB sugli stessi dati.
+
+Uso: python -m benchmarks.compare_backends [--rows 1m] [--seed 42]
+                                           [--repeat 3]
+
+Genera i dati con benchmarks.synthetic, li scrive in Parquet e calcola gli
+aggregati con entrambi i backend, senza filtri e con un filtro tipico della
+sidebar. KPI e metriche avanzate devono coincidere (a meno di RTOL per i
+valori in virgola mobile): altrimenti il comando esce con codice 1. Riporta
+anche il tempo minimo di --repeat esecuzioni per ciascun backend.
+"""
+
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+from app.utils.datasets import PandasDataset
+from app.utils.duckdb_backend import DuckDBDataset, duckdb
+from app.utils.kpi import calculate_advanced_metrics, calculate_kpi
+from benchmarks.run_benchmarks import typical_filters
+from benchmarks.synthetic import DEFAULT_SEED, generate_sales, parse_rows
+
+
+DEFAULT_ROWS = "1m"
+DEFAULT_REPEAT = 3
+
+# Le somme sono esatte in entrambi i backend; medie e deviazioni standard
+# possono differire nelle ultime cifre
+RTOL = 1e-9
+
+
+def _same(a, b):
+    if isinstance(a, float) and isinstance(b, float):
+        if math.isnan(a) and math.isnan(b):
+            return True
+        return math.isclose(a, b, rel_tol=RTOL)
+    return a == b
+
+
+# Chiavi di KPI e metriche con valori diversi tra i due backend
+def differences(expected, actual):
+    diffs = []
+    for compute in (calculate_kpi, calculate_advanced_metrics):
+        left, right = compute(expected), compute(actual)
+        for key in sorted(set(left) | set(right)):
+            a, b = left.get(key), right.get(key)
+            if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+                a, b = float(a), float(b)
+            if not _same(a, b):
+                diffs.append((key, a, b))
+    return diffs
+
+
+def _best_time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def run(rows, seed=DEFAULT_SEED, repeat=DEFAULT_REPEAT):
+    data = generate_sales(rows, seed=seed)
+    cases = [("all rows", None), ("typical filters", typical_filters(data))]
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.parquet")
+        data.to_parquet(path, index=False)
+        backends = [
+            PandasDataset(data, "compare"),
+            DuckDBDataset([path], "compare"),
+        ]
+        for case, filters in cases:
+            results = []
+            for dataset in backends:
+                seconds, aggregates = _best_time(
+                    lambda: dataset.aggregates(filters), repeat
+                )
+                results.append(aggregates)
+                print(f"{case:>16} {dataset.backend:>7} {seconds:9.4f}s")
+            diffs = differences(*results)
+            for key, expected, actual in diffs:
+                print(f"{case:>16} MISMATCH {key}: {expected!r} != {actual!r}")
+            failed = failed or bool(diffs)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default=DEFAULT_ROWS)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    args = parser.parse_args()
+
+    if duckdb is None:
+        sys.exit("The DuckDB backend requires the duckdb package")
+    failed = run(parse_rows(args.rows), args.seed, args.repeat)
+    print("Backends differ" if failed else "KPIs and metrics match")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
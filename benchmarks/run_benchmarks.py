@@ -0,0 +1,302 @@
+"""Benchmark delle funzioni analitiche della dashboard su dati sintetici.
+
+Uso: python -m benchmarks.run_benchmarks [--tiers 10k,1m] [--repeat 3]
+                                         [--seed 42] [--products 50]
+                                         [--regions 4] [--customers 10000]
+                                         [--days 730] [--output bench.json]
+     python -m benchmarks.run_benchmarks --compare old.json new.json
+                                         [--tolerance 0.2]
+
+Per ogni livello di scala (10k, 1m, 10m, 50m) genera i dati con
+benchmarks.synthetic e misura aggregati, KPI, metriche avanzate, filtro,
+segmentazione clienti, anomalie, rollup del calendario e costruzione dei
+grafici. Il tempo e' il minimo e la mediana di --repeat esecuzioni; il picco
+di memoria viene misurato in un'esecuzione separata con tracemalloc, che
+altrimenti rallenterebbe i tempi.
+
+Il risultato JSON contiene anche commit, versioni e parametri dei dati, per
+confrontare due esecuzioni con --compare: i casi piu' lenti di --tolerance
+vengono segnalati e il comando esce con codice 1.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from app.utils.aggregations import build_aggregates, sales_histogram
+from app.utils.anomaly import (
+    DEFAULT_METHOD,
+    DEFAULT_THRESHOLD,
+    detect_anomalies,
+    detect_group_anomalies,
+)
+from app.utils.data_filter import build_filter_index, select_rows
+from app.utils.downsampling import build_line_pyramid, view_positions
+from app.utils.figures import (
+    FULL_WIDTH_PX,
+    OVERVIEW_CELL_WIDTH_PX,
+    anomaly_figure,
+    day_hour_heatmap,
+    overview_figure,
+    product_scatter,
+)
+from app.utils.kpi import calculate_advanced_metrics, calculate_kpi
+from app.utils.rollups import build_rollups
+from app.utils.segmentation import perform_customer_segmentation
+from benchmarks.synthetic import (
+    DEFAULT_CUSTOMERS,
+    DEFAULT_DAYS,
+    DEFAULT_PRODUCTS,
+    DEFAULT_REGIONS,
+    DEFAULT_SEED,
+    TIERS,
+    generate_sales,
+    parse_rows,
+)
+
+
+DEFAULT_TIERS = "10k,1m"
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.2
+
+# Differenze sotto queste soglie sono rumore di misura, non regressioni
+MIN_SECONDS_DELTA = 0.001
+MIN_MB_DELTA = 1.0
+
+
+# Gli aggregati come li prepara get_aggregates in main.py
+def dashboard_aggregates(data):
+    aggregates = build_aggregates(data)
+    daily_sales = aggregates["by_date"]["sales_sum"]
+    aggregates["daily_pyramid"] = build_line_pyramid(daily_sales)
+    aggregates["sales_histogram"] = sales_histogram(data["Sales"])
+    return aggregates
+
+
+# Un filtro tipico della sidebar: meta' centrale del periodo, un terzo dei
+# prodotti e meta' delle regioni
+def typical_filters(data):
+    dates = data["Date"]
+    start, end = dates.min(), dates.max()
+    span = end - start
+    products = data["Product"].cat.categories
+    regions = data["Region"].cat.categories
+    return {
+        "Date": (start + span / 4, end - span / 4),
+        "Product": list(products[: max(1, len(products) // 3)]),
+        "Region": list(regions[: max(1, len(regions) // 2)]),
+    }
+
+
+# Grafici della tab Dashboard e della tab Advanced Analytics, serializzati
+# come li invia st.plotly_chart
+def build_figures(aggregates, anomalies):
+    daily_sales = aggregates["by_date"]["sales_sum"]
+    pyramid = aggregates["daily_pyramid"]
+    figures = [
+        overview_figure(
+            aggregates,
+            view_positions(pyramid, OVERVIEW_CELL_WIDTH_PX),
+            aggregates["sales_histogram"],
+        ),
+        day_hour_heatmap(aggregates["day_hour"]),
+        product_scatter(aggregates["by_product"]),
+        anomaly_figure(daily_sales, view_positions(pyramid, FULL_WIDTH_PX), anomalies),
+    ]
+    return sum(len(figure.to_json()) for figure in figures)
+
+
+# Casi misurati: nome e funzione senza argomenti. Gli input di ogni caso
+# (aggregati, indice, anomalie) vengono preparati una volta sola.
+def benchmark_cases(data):
+    aggregates = dashboard_aggregates(data)
+    index = build_filter_index(data)
+    filters = typical_filters(data)
+    daily_sales = aggregates["by_date"]["sales_sum"]
+    anomalies = detect_anomalies(daily_sales, DEFAULT_METHOD, DEFAULT_THRESHOLD)
+    return [
+        ("build_aggregates", lambda: dashboard_aggregates(data)),
+        ("calculate_kpi", lambda: calculate_kpi(aggregates)),
+        ("calculate_advanced_metrics", lambda: calculate_advanced_metrics(aggregates)),
+        ("build_rollups", lambda: build_rollups(aggregates["by_date"])),
+        ("build_filter_index", lambda: build_filter_index(data)),
+        ("filter_data", lambda: data.take(select_rows(index, filters))),
+        (
+            "perform_customer_segmentation",
+            lambda: perform_customer_segmentation(aggregates, 3),
+        ),
+        (
+            "detect_anomalies",
+            lambda: detect_anomalies(daily_sales, DEFAULT_METHOD, DEFAULT_THRESHOLD),
+        ),
+        (
+            "detect_group_anomalies",
+            lambda: detect_group_anomalies(
+                data, "Product", DEFAULT_METHOD, DEFAULT_THRESHOLD
+            ),
+        ),
+        ("build_figures", lambda: build_figures(aggregates, anomalies)),
+    ]
+
+
+def _time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run_tier(tier, rows, repeat, data_options):
+    start = time.perf_counter()
+    data = generate_sales(rows, **data_options)
+    generate_seconds = time.perf_counter() - start
+    results = []
+    for case, func in benchmark_cases(data):
+        timings = _time(func, repeat)
+        results.append(
+            {
+                "tier": tier,
+                "rows": rows,
+                "case": case,
+                "seconds_min": min(timings),
+                "seconds_median": statistics.median(timings),
+                "peak_mb": _peak_memory(func) / 2**20,
+            }
+        )
+    dataset = {
+        "tier": tier,
+        "rows": rows,
+        "generate_seconds": generate_seconds,
+        "memory_mb": data.memory_usage(deep=True).sum() / 2**20,
+    }
+    return dataset, results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(tiers, repeat=DEFAULT_REPEAT, **data_options):
+    meta = {
+        "commit": _git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "repeat": repeat,
+        "data": data_options,
+    }
+    datasets, results = [], []
+    for tier in tiers:
+        dataset, tier_results = run_tier(tier, parse_rows(tier), repeat, data_options)
+        datasets.append(dataset)
+        results.extend(tier_results)
+        for row in tier_results:
+            print(
+                f"{tier:>5} {row['case']:>30} {row['seconds_min']:9.4f}s "
+                f"(median {row['seconds_median']:.4f}s) "
+                f"peak {row['peak_mb']:9.1f} MB",
+                flush=True,
+            )
+    return {"meta": meta, "datasets": datasets, "results": results}
+
+
+# Confronto tra due file di risultati sui casi presenti in entrambi, per
+# tempo minimo e picco di memoria
+def compare(old, new, tolerance=DEFAULT_TOLERANCE):
+    baseline = {(row["tier"], row["case"]): row for row in old["results"]}
+    regressions = []
+    for row in new["results"]:
+        before = baseline.get((row["tier"], row["case"]))
+        if before is None:
+            continue
+        time_ratio = row["seconds_min"] / max(before["seconds_min"], 1e-9)
+        memory_ratio = row["peak_mb"] / max(before["peak_mb"], 1e-9)
+        slower = (
+            time_ratio > 1 + tolerance
+            and row["seconds_min"] - before["seconds_min"] > MIN_SECONDS_DELTA
+        )
+        larger = (
+            memory_ratio > 1 + tolerance
+            and row["peak_mb"] - before["peak_mb"] > MIN_MB_DELTA
+        )
+        flag = ""
+        if slower or larger:
+            flag = "  REGRESSION"
+            regressions.append(row)
+        print(
+            f"{row['tier']:>5} {row['case']:>30} "
+            f"time x{time_ratio:6.2f}  memory x{memory_ratio:6.2f}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--tiers",
+        default=DEFAULT_TIERS,
+        help=f"comma separated: {', '.join(TIERS)} or row counts",
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--products", type=int, default=DEFAULT_PRODUCTS)
+    parser.add_argument("--regions", type=int, default=DEFAULT_REGIONS)
+    parser.add_argument("--customers", type=int, default=DEFAULT_CUSTOMERS)
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    if args.compare:
+        old, new = (json.load(open(path)) for path in args.compare)
+        regressions = compare(old, new, args.tolerance)
+        sys.exit(1 if regressions else 0)
+
+    report = run(
+        [tier.strip() for tier in args.tiers.split(",") if tier.strip()],
+        args.repeat,
+        seed=args.seed,
+        products=args.products,
+        regions=args.regions,
+        customers=args.customers,
+        days=args.days,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
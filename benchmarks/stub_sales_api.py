@@ -0,0 +1,178 @@
+"""Server locale che imita l'endpoint /generate-sales della sales-data-api.
+
+Uso: python -m benchmarks.stub_sales_api [--port 8765] [--fail-rate 0.1]
+                                         [--delay 0.2] [--rate 5]
+
+GET /generate-sales?num_records=N&page=P restituisce un array JSON di N
+record (Date, Sales, Profit, Product, Region, Customer), deterministici per
+pagina. Con --fail-rate una frazione delle richieste risponde 503, per
+provare retry e backoff del client; --delay aggiunge una latenza in secondi
+ogni 10.000 record.
+
+Con --rate il server accoda record "live" (rate al secondo, un giorno ogni
+RECORDS_PER_DAY record dopo lo storico). Ogni risposta porta ETag,
+Last-Modified e X-Cursor; GET con since=<cursore> restituisce solo i record
+live successivi e If-None-Match / If-Modified-Since rispondono 304 se non ce
+ne sono di nuovi.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+PRODUCTS = [f"Product {i}" for i in range(1, 21)]
+REGIONS = ["North", "South", "East", "West"]
+START_DATE = date(2023, 1, 1)
+LIVE_START_DATE = START_DATE + timedelta(days=365)
+RECORDS_PER_DAY = 50
+
+
+def _record(rng, day):
+    sales = round(rng.gammavariate(2, 50), 2)
+    return {
+        "Date": day.isoformat(),
+        "Sales": sales,
+        "Profit": round(sales * rng.uniform(-0.1, 0.3), 2),
+        "Product": rng.choice(PRODUCTS),
+        "Region": rng.choice(REGIONS),
+        "Customer": f"Customer {rng.randrange(1, 2001)}",
+    }
+
+
+def generate_records(num_records, page=1):
+    rng = random.Random(page)
+    return [
+        _record(rng, START_DATE + timedelta(days=rng.randrange(365)))
+        for _ in range(num_records)
+    ]
+
+
+def live_records(start, stop):
+    return [
+        _record(
+            random.Random(-1 - i),
+            LIVE_START_DATE + timedelta(days=i // RECORDS_PER_DAY),
+        )
+        for i in range(start, stop)
+    ]
+
+
+# Record live disponibili: rate al secondo dall'avvio piu' quelli aggiunti
+# a mano con add()
+class LiveFeed:
+    def __init__(self, rate=0.0):
+        self.rate = rate
+        self.started = time.time()
+        self.extra = 0
+        self.modified = self.started
+
+    def add(self, count):
+        self.extra += count
+        self.modified = time.time()
+
+    def count(self):
+        return int((time.time() - self.started) * self.rate) + self.extra
+
+    def last_modified(self):
+        if self.rate:
+            return max(self.modified, self.started + self.count() / self.rate)
+        return self.modified
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    fail_rate = 0.0
+    delay = 0.0
+    feed = None
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path != "/generate-sales":
+            self.send_error(404)
+            return
+        if random.random() < self.fail_rate:
+            self.send_error(503)
+            return
+        query = parse_qs(parts.query)
+        num_records = int(query.get("num_records", ["100"])[0])
+        page = int(query.get("page", ["1"])[0])
+        current = self.feed.count()
+        modified = self.feed.last_modified()
+        etag = f'"{current}"'
+        if self._not_modified(etag, modified):
+            self.send_response(304)
+            self._send_validators(etag, modified, current)
+            self.end_headers()
+            return
+
+        if "since" in query:
+            records = live_records(int(query["since"][0]), current)
+        else:
+            records = generate_records(num_records, page)
+        # Latenza proporzionale ai record, come una generazione remota
+        time.sleep(self.delay * len(records) / 10_000)
+
+        body = json.dumps(records).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self._send_validators(etag, modified, current)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_modified(self, etag, modified):
+        if "If-None-Match" in self.headers:
+            return self.headers["If-None-Match"] == etag
+        if "If-Modified-Since" in self.headers:
+            since = parsedate_to_datetime(self.headers["If-Modified-Since"])
+            return int(modified) <= since.timestamp()
+        return False
+
+    def _send_validators(self, etag, modified, current):
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(modified, usegmt=True))
+        self.send_header("X-Cursor", str(current))
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Avvia il server in un thread; restituisce il server (server.shutdown() per
+# fermarlo, server.feed per aggiungere record live) e l'URL base
+def serve(port=0, fail_rate=0.0, delay=0.0, rate=0.0):
+    feed = LiveFeed(rate)
+    handler = type(
+        "Handler",
+        (StubHandler,),
+        {"fail_rate": fail_rate, "delay": delay, "feed": feed},
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.feed = feed
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, url = serve(args.port, args.fail_rate, args.delay, args.rate)
+    print(f"Serving {url}/generate-sales (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
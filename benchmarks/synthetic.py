@@ -0,0 +1,142 @@
+"""Generatore di dati di vendita sintetici e riproducibili per i benchmark.
+
+Uso: python -m benchmarks.synthetic --rows 1m [--seed 42] [--products 50]
+                                    [--regions 4] [--customers 10000]
+                                    [--days 730] [--output sales.csv]
+
+Le righe hanno lo schema di load_data (Date, Sales, Profit, Product, Region,
+Customer) con prodotti e clienti a popolarita' non uniforme, un trend
+leggero e una stagionalita' settimanale. Lo stesso seed produce sempre gli
+stessi dati, indipendentemente dalla dimensione dei blocchi generati.
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from app.utils.data_loader import apply_schema, concat_chunks
+
+
+# Livelli di scala dei benchmark
+TIERS = {
+    "10k": 10_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+    "50m": 50_000_000,
+}
+
+DEFAULT_SEED = 42
+DEFAULT_PRODUCTS = 50
+DEFAULT_REGIONS = 4
+DEFAULT_CUSTOMERS = 10_000
+DEFAULT_DAYS = 730
+START_DATE = "2023-01-01"
+
+# Righe generate per blocco: ogni blocco ha il proprio generatore derivato
+# dal seed, cosi' la memoria temporanea resta limitata anche a 50M righe
+BLOCK_ROWS = 1_000_000
+
+WEEKLY_FACTORS = np.array([1.0, 1.05, 1.1, 1.0, 0.95, 1.2, 1.3])
+
+
+def parse_rows(value):
+    value = str(value).lower()
+    if value in TIERS:
+        return TIERS[value]
+    return int(float(value.replace("_", "")))
+
+
+# Pesi di popolarita' tipo Zipf: pochi prodotti (o clienti) fanno gran parte
+# delle vendite, come nei dati reali
+def _popularity(count, exponent=1.1):
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _block(rng, rows, products, regions, customers, days, start):
+    day = rng.integers(0, days, rows)
+    factor = WEEKLY_FACTORS[(day + start.dayofweek) % 7] * (1 + 0.2 * day / days)
+    sales = rng.gamma(2.0, 50.0, rows) * factor
+    profit = sales * rng.uniform(-0.1, 0.3, rows)
+    return pd.DataFrame(
+        {
+            "Date": start + pd.to_timedelta(day, unit="D"),
+            "Sales": sales.round(2),
+            "Profit": profit.round(2),
+            "Product": pd.Categorical.from_codes(
+                rng.choice(len(products), rows, p=_popularity(len(products))),
+                categories=products,
+            ),
+            "Region": pd.Categorical.from_codes(
+                rng.integers(0, len(regions), rows), categories=regions
+            ),
+            "Customer": pd.Categorical.from_codes(
+                rng.choice(len(customers), rows, p=_popularity(len(customers), 0.8)),
+                categories=customers,
+            ),
+        }
+    )
+
+
+def generate_sales(
+    rows,
+    seed=DEFAULT_SEED,
+    products=DEFAULT_PRODUCTS,
+    regions=DEFAULT_REGIONS,
+    customers=DEFAULT_CUSTOMERS,
+    days=DEFAULT_DAYS,
+    start=START_DATE,
+):
+    start = pd.Timestamp(start)
+    product_names = [f"Product {i}" for i in range(1, products + 1)]
+    region_names = [f"Region {i}" for i in range(1, regions + 1)]
+    customer_names = [f"Customer {i}" for i in range(1, customers + 1)]
+
+    chunks = []
+    for block, offset in enumerate(range(0, max(rows, 1), BLOCK_ROWS)):
+        rng = np.random.default_rng([seed, block])
+        chunks.append(
+            _block(
+                rng,
+                min(BLOCK_ROWS, rows - offset),
+                product_names,
+                region_names,
+                customer_names,
+                days,
+                start,
+            )
+        )
+    data = concat_chunks(chunks)
+    # Stessi tipi dello schema del loader
+    return apply_schema(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="10k", help="row count or tier name")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--products", type=int, default=DEFAULT_PRODUCTS)
+    parser.add_argument("--regions", type=int, default=DEFAULT_REGIONS)
+    parser.add_argument("--customers", type=int, default=DEFAULT_CUSTOMERS)
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    parser.add_argument("--output", default="sales.csv")
+    args = parser.parse_args()
+
+    data = generate_sales(
+        parse_rows(args.rows),
+        args.seed,
+        args.products,
+        args.regions,
+        args.customers,
+        args.days,
+    )
+    if args.output.endswith(".parquet"):
+        data.to_parquet(args.output, index=False)
+    else:
+        data.to_csv(args.output, index=False, date_format="%Y-%m-%d")
+    print(f"{len(data):,} rows written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,116 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import plotly.figure_factory as ff
-from plotly.subplots import make_subplots
 import numpy as np
-from scipy import stats
-import io
-import requests
+import os
+import uuid
+from functools import partial
 from datetime import datetime
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
 import warnings
 
+from app.utils.anomaly import (
+    DEFAULT_METHOD,
+    DEFAULT_THRESHOLD,
+    METHODS,
+    StreamingDetector,
+    detect_anomalies,
+    detect_group_anomalies,
+)
+from app.utils.api_client import error_status, fetch_sales
+from app.utils.api_feed import ApiFeed
+from app.utils.correlation import (
+    DEFAULT_NEIGHBORS,
+    DEFAULT_TOP_N,
+    MAX_DENSE_PRODUCTS,
+    product_correlation,
+    product_neighbors,
+    select_products,
+)
+from app.utils.compact import (
+    AMOUNT_FORMATS,
+    DEFAULT_AMOUNT_FORMAT,
+    compact_frame,
+    compact_id,
+)
+from app.utils.data_cache import content_hash, load_with_cache
+from app.utils.data_loader import format_load_stats
+from app.utils.datasets import (
+    BACKENDS,
+    DEFAULT_BACKEND,
+    PandasDataset,
+    available_backends,
+)
+from app.utils.downsampling import build_line_pyramid, view_positions
+from app.utils.duckdb_backend import open_upload
+from app.utils.figure_cache import (
+    FigureCache,
+    figure_key,
+    figure_spec,
+    themed_figure,
+)
+from app.utils.exports import (
+    EXCEL_MAX_ROWS,
+    available_formats,
+    export_data,
+    export_file_name,
+    export_mime,
+    fits_excel,
+    read_export,
+)
+from app.utils.figures import (
+    CHART_THEMES,
+    FULL_WIDTH_PX,
+    OVERVIEW_CELL_WIDTH_PX,
+    anomaly_figure,
+    correlation_figure,
+    day_hour_heatmap,
+    monthly_figure,
+    overview_figure,
+    period_trend_figure,
+    product_scatter,
+    quarterly_figure,
+    segments_figure,
+)
+from app.utils.jobs import JobExecutor, job_key
+from app.utils.kpi import calculate_advanced_metrics, calculate_kpi
+from app.utils.partitions import (
+    PartitionedDataset,
+    build_manifest,
+    manifest_id,
+    prune,
+)
+from app.utils.perf import (
+    PERF_LOG,
+    PerfRecorder,
+    ProfileCapture,
+    activate,
+    current_rss_mb,
+    deactivate,
+    stage,
+    stage_table,
+)
+from app.utils.registry import DatasetRegistry
+from app.utils.rollups import ROLLUP_LEVELS, seasonal_table
+from app.utils.segmentation import SegmentationEngine, customer_features
+
 warnings.filterwarnings("ignore")
 
 # Configurazione della pagina
 st.set_page_config(page_title="Advanced Data Dashboard", layout="wide")
 
+# Tempi e memoria delle fasi di questo rerun, mostrati nel pannello
+# Performance in fondo alla sidebar. Una cattura rimasta attiva da un rerun
+# interrotto viene annullata; quella richiesta dal pannello parte qui.
+perf_recorder = PerfRecorder(st.session_state.get("perf_log_path", PERF_LOG))
+perf_token = activate(perf_recorder)
+stale_capture = st.session_state.pop("perf_capture", None)
+if stale_capture is not None:
+    stale_capture.cancel()
+profile_capture = None
+if st.session_state.pop("perf_profile_next", False):
+    profile_capture = ProfileCapture()
+    st.session_state["perf_capture"] = profile_capture
+    profile_capture.start()
+
 # Sidebar per il tema
 theme = st.sidebar.radio("Select Theme:", ["Light", "Dark"])
 
@@ -57,243 +150,354 @@ else:
 st.title("Advanced Sales Analytics Dashboard")
 
 
-# Funzioni Analitiche Avanzate
-def calculate_advanced_metrics(data):
-    metrics = {}
+# Pool di processi condiviso tra le sessioni per le analisi pesanti
+@st.cache_resource
+def get_job_executor():
+    return JobExecutor()
+
+
+@st.cache_resource
+def get_segmentation_engine():
+    return SegmentationEngine(get_job_executor())
+
+
+# Specifiche dei grafici gia' costruiti, condivise tra rerun e sessioni
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+
+# Grafico dalla cache delle figure: build() gira solo se per la sorgente
+# (dataset e filtri, job o versione del feed API) e i parametri non c'e'
+# gia' una specifica, e il tema scelto nei Settings si applica senza
+# ricostruire la figura. Senza sorgente la figura si costruisce sempre.
+def show_figure(container, source, name, build, **params):
+    theme = st.session_state.get("chart_theme", CHART_THEMES[0])
+    if source is None:
+        fig = themed_figure(figure_spec(build()), theme)
+    else:
+        key = figure_key(source, name, **params)
+        fig = get_figure_cache().figure(key, build, theme)
+    # theme=None: colori dal template Plotly del tema, non da Streamlit
+    container.plotly_chart(fig, use_container_width=True, theme=None)
+
+
+# Mostra il risultato di un job: finche' gira nel pool il frammento si
+# aggiorna ogni secondo con un segnaposto, senza rieseguire tutta la pagina.
+# render riceve il risultato quando e' pronto.
+def show_job(job, label, render):
+    running = not job.done()
+
+    @st.fragment(run_every=1 if running else None)
+    def job_view():
+        if not job.done():
+            st.progress(job.progress, text=label)
+        elif running and job.exception() is None:
+            # Job appena concluso: rerun completo per fermare il polling. Un
+            # job fallito non lo fa: il rerun lo rieseguirebbe subito, in
+            # ciclo; viene rieseguito al rerun successivo dell'utente.
+            st.rerun()
+        elif job.exception() is not None:
+            st.error(f"{label.rstrip('.')} failed: {job.exception()}")
+        else:
+            render(job.result())
+
+    job_view()
+
 
-    # Trend Analysis
-    if "Sales" in data.columns and "Date" in data.columns:
-        sales_by_date = data.groupby("Date")["Sales"].sum()
-        slope, _, r_value, _, _ = stats.linregress(
-            range(len(sales_by_date)), sales_by_date
+# I grafici dei job sono in cache per chiave del job
+def show_customer_segments(source, result):
+    with stage("figure: segments"):
+        show_figure(
+            st, source, "segments", partial(segments_figure, result["segments"])
         )
-        metrics["sales_trend"] = "Positive" if slope > 0 else "Negative"
-        metrics["trend_strength"] = abs(r_value)
-
-    # Sales Performance
-    if "Sales" in data.columns:
-        metrics["avg_daily_sales"] = data.groupby("Date")["Sales"].sum().mean()
-        metrics["sales_volatility"] = data["Sales"].std() / data["Sales"].mean()
-
-    # Product Performance
-    if "Product" in data.columns and "Sales" in data.columns:
-        product_performance = data.groupby("Product")["Sales"].agg(
-            ["sum", "count", "mean"]
+
+
+def show_product_correlation(source, product_corr):
+    with stage("figure: correlation"):
+        show_figure(
+            st, source, "correlation", partial(correlation_figure, product_corr)
         )
-        metrics["top_products"] = product_performance.nlargest(5, "sum").index.tolist()
-        metrics["underperforming_products"] = product_performance.nsmallest(
-            5, "mean"
-        ).index.tolist()
 
-    # Calcolo metriche aggiuntive
-    if "Sales" in data.columns and "Profit" in data.columns:
-        metrics["profit_margin"] = (data["Profit"].sum() / data["Sales"].sum()) * 100
-        metrics["avg_transaction_value"] = data["Sales"].mean()
 
-    return metrics
+def show_product_neighbors(neighbors):
+    st.dataframe(neighbors.round(3), use_container_width=True)
 
 
-def perform_customer_segmentation(data):
-    if "Customer" not in data.columns:
-        return None
+# Chiamata da download_button al click, in un thread separato: l'export
+# gira nel pool ed e' condiviso tra le sessioni con gli stessi filtri.
+# DuckDB scrive invece il file direttamente dalla query.
+def prepare_export(executor, dataset, filters, fmt, recorder):
+    if not dataset.in_memory:
+        with recorder.stage("export", format=fmt, backend=dataset.backend):
+            return read_export(dataset.export(filters, fmt))
+    data = dataset.filter(filters)
+    key = job_key("export", dataset.dataset_id, filters=filters, fmt=fmt)
+    with recorder.stage("export", format=fmt, rows=len(data)):
+        path = executor.submit(key, export_data, data, fmt).result()
+        if not os.path.exists(path):
+            # File gia' rimosso dalla pulizia degli export vecchi
+            executor.discard(key)
+            path = executor.submit(key, export_data, data, fmt).result()
+        return read_export(path)
 
-    # Preparazione dei dati per clustering
-    customer_metrics = (
-        data.groupby("Customer")
-        .agg(
-            {
-                "Sales": ["count", "sum", "mean"],
-                "Date": lambda x: (x.max() - x.min()).days,
-            }
-        )
-        .reset_index()
-    )
 
-    # Standardizzazione
-    scaler = StandardScaler()
-    features_scaled = scaler.fit_transform(customer_metrics.iloc[:, 1:])
+# Gli export partono al click, dopo la fine del rerun: le loro misure vanno
+# in un recorder della sessione, mostrato nel rerun successivo
+def get_export_recorder():
+    recorder = st.session_state.setdefault("perf_exports", PerfRecorder())
+    recorder.log_path = st.session_state.get("perf_log_path", PERF_LOG)
+    return recorder
 
-    # Clustering
-    kmeans = KMeans(n_clusters=3, random_state=42)
-    customer_metrics["Segment"] = kmeans.fit_predict(features_scaled)
 
-    return customer_metrics
+# Metodo e soglia arrivano dalla tab Settings, disegnata dopo questa tab
+def anomaly_settings():
+    method = st.session_state.get("anomaly_method", DEFAULT_METHOD)
+    threshold = st.session_state.get("anomaly_threshold", DEFAULT_THRESHOLD)
+    return method, threshold
 
 
-def detect_anomalies(data):
-    if "Sales" not in data.columns:
-        return None
+# Vendite giornaliere per gruppo, cosi' i rerun non rileggono i dati
+@st.cache_data(show_spinner=False, max_entries=32)
+def get_daily_sales(dataset_id, group, values, _dataset):
+    return _dataset.daily_sales_by(group, values)
 
-    daily_sales = data.groupby("Date")["Sales"].sum()
-    sales_mean = daily_sales.mean()
-    sales_std = daily_sales.std()
 
-    anomalies = daily_sales[abs(daily_sales - sales_mean) > 2 * sales_std]
-    return anomalies
+@st.cache_data(show_spinner=False, max_entries=32)
+def get_group_anomalies(dataset_id, group, method, threshold, _dataset):
+    daily = _dataset.daily_sales_by(group)
+    return detect_group_anomalies(daily, group, method, threshold)
 
 
-def create_advanced_visualizations(data, container):
-    # 1. Sales Performance Overview
-    fig1 = make_subplots(
-        rows=2,
-        cols=2,
-        subplot_titles=(
-            "Daily Sales Trend",
-            "Sales Distribution",
-            "Sales by Region",
-            "Top Products",
-        ),
-    )
+API_CACHE_TTL_SECONDS = 60
+API_POLL_SECONDS = 10
 
-    # Daily Sales Trend with Moving Average
-    daily_sales = data.groupby("Date")["Sales"].sum().reset_index()
-    ma_30 = daily_sales["Sales"].rolling(window=30).mean()
-
-    fig1.add_trace(
-        go.Scatter(
-            x=daily_sales["Date"],
-            y=daily_sales["Sales"],
-            name="Daily Sales",
-            mode="lines",
-        ),
-        row=1,
-        col=1,
-    )
-    fig1.add_trace(
-        go.Scatter(
-            x=daily_sales["Date"], y=ma_30, name="30-Day MA", line=dict(dash="dash")
-        ),
-        row=1,
-        col=1,
-    )
 
-    # Sales Distribution
-    fig1.add_trace(
-        go.Histogram(x=data["Sales"], nbinsx=30, name="Sales Distribution"),
-        row=1,
-        col=2,
-    )
+# Posizioni della serie da disegnare, ridotte alla larghezza del grafico.
+# Lo slider di zoom compare solo se la serie non entra nei pixel disponibili
+# e sceglie il livello piu' fine della piramide per l'intervallo selezionato.
+def zoom_positions(series, pyramid, width_px, container, key):
+    start = end = None
+    if len(series) > width_px:
+        first = series.index[0].to_pydatetime()
+        last = series.index[-1].to_pydatetime()
+        start, end = container.slider(
+            "Zoom", min_value=first, max_value=last, value=(first, last), key=key
+        )
+        start, end = np.datetime64(start), np.datetime64(end)
+    return view_positions(pyramid, width_px, start, end)
 
-    # Regional Performance
-    regional_sales = data.groupby("Region")["Sales"].sum().reset_index()
-    fig1.add_trace(
-        go.Bar(
-            x=regional_sales["Region"], y=regional_sales["Sales"], name="Regional Sales"
-        ),
-        row=2,
-        col=1,
-    )
 
-    # Top Products
-    product_sales = data.groupby("Product")["Sales"].sum().nlargest(10).reset_index()
-    fig1.add_trace(
-        go.Bar(
-            x=product_sales["Product"], y=product_sales["Sales"], name="Product Sales"
-        ),
-        row=2,
-        col=2,
+# I grafici sono costruiti da app.utils.figures; qui restano zoom e layout
+# source (dataset e filtri) identifica gli aggregati nella cache delle figure
+def create_advanced_visualizations(container, aggregates, key="main", source=None):
+    # 1. Sales Performance Overview
+    daily_sales = aggregates["by_date"]["sales_sum"]
+    pyramid = aggregates.get("daily_pyramid") or build_line_pyramid(daily_sales)
+    positions = zoom_positions(
+        daily_sales, pyramid, OVERVIEW_CELL_WIDTH_PX, container, f"{key}_trend_zoom"
     )
-
-    fig1.update_layout(height=800, showlegend=True)
-    container.plotly_chart(fig1, use_container_width=True)
+    # Bin calcolati lato server, al browser vanno 30 barre
+    with stage("figure: overview"):
+        show_figure(
+            container,
+            source,
+            "overview",
+            partial(
+                overview_figure, aggregates, positions, aggregates["sales_histogram"]
+            ),
+            positions=positions,
+        )
 
     # 2. Advanced Analysis Section
     col1, col2 = container.columns(2)
-
-    # Sales Heatmap by Day and Hour
-    if "Date" in data.columns:
-        data["Hour"] = data["Date"].dt.hour
-        data["Day"] = data["Date"].dt.day_name()
-        sales_pivot = data.pivot_table(
-            values="Sales", index="Day", columns="Hour", aggfunc="mean"
-        )
-
-        fig_heatmap = go.Figure(
-            data=go.Heatmap(
-                z=sales_pivot.values,
-                x=sales_pivot.columns,
-                y=sales_pivot.index,
-                colorscale="Viridis",
+    if "day_hour" in aggregates:
+        with stage("figure: day/hour heatmap"):
+            show_figure(
+                col1,
+                source,
+                "heatmap",
+                partial(day_hour_heatmap, aggregates["day_hour"]),
             )
-        )
-        fig_heatmap.update_layout(
-            title="Sales Heatmap by Day and Hour",
-            xaxis_title="Hour of Day",
-            yaxis_title="Day of Week",
-        )
-        col1.plotly_chart(fig_heatmap, use_container_width=True)
 
     # Product Performance Scatter
-    if "Product" in data.columns:
-        product_metrics = (
-            data.groupby("Product")
-            .agg({"Sales": ["count", "mean"], "Profit": "mean"})
-            .reset_index()
-        )
-        product_metrics.columns = ["Product", "Sales_Count", "Avg_Sales", "Avg_Profit"]
-
-        fig_scatter = go.Figure(
-            data=go.Scatter(
-                x=product_metrics["Avg_Sales"],
-                y=product_metrics["Avg_Profit"],
-                mode="markers+text",
-                text=product_metrics["Product"],
-                textposition="top center",
-            )
-        )
-        fig_scatter.update_layout(
-            title="Product Performance Analysis",
-            xaxis_title="Average Sales",
-            yaxis_title="Average Profit",
-        )
-        col2.plotly_chart(fig_scatter, use_container_width=True)
+    by_product = aggregates.get("by_product")
+    if by_product is not None:
+        with stage("figure: product scatter"):
+            show_figure(col2, source, "scatter", partial(product_scatter, by_product))
 
 
 # Funzione per caricare dati dall'API
-@st.cache_data
+# I dati dell'API cambiano: la cache scade dopo API_CACHE_TTL_SECONDS e gli
+# errori non vengono memorizzati
+@st.cache_data(ttl=API_CACHE_TTL_SECONDS, show_spinner=False)
+def load_api_data(api_url):
+    # num_records oltre una pagina viene scaricato in pagine parallele
+    validators = {}
+    data = fetch_sales(api_url, validators=validators)
+    return data, validators
+
+
 def fetch_api_data(api_url):
     try:
-        response = requests.get(api_url)
-        if response.status_code == 200:
-            data = pd.DataFrame(response.json())
-            if "Date" in data.columns:
-                data["Date"] = pd.to_datetime(
-                    data["Date"], format="%Y-%m-%d", errors="coerce"
-                )
-            return data
-        else:
-            st.error(f"API returned an error: {response.status_code}")
-            return None
+        return load_api_data(api_url)
     except Exception as e:
-        st.error(f"Failed to fetch data from API: {e}")
+        status = error_status(e)
+        if status is not None:
+            st.error(f"API returned an error: {status}")
+        else:
+            st.error(f"Failed to fetch data from API: {e}")
         return None
 
 
-# Funzione per filtrare i dati
-@st.cache_data
-def filter_data(data, filters):
-    filtered_data = data.copy()
-    for column, filter_value in filters.items():
-        if column == "Date" and len(filter_value) == 2:
-            start_date, end_date = filter_value
-            filtered_data = filtered_data[
-                (filtered_data[column] >= pd.to_datetime(start_date))
-                & (filtered_data[column] <= pd.to_datetime(end_date))
-            ]
-        elif filter_value:
-            filtered_data = filtered_data[filtered_data[column].isin(filter_value)]
-    return filtered_data
-
-
-# Funzione per calcolare KPI base
-def calculate_kpi(data):
-    kpis = {}
-    kpis["Total Rows"] = len(data)
-    if "Sales" in data.columns:
-        kpis["Total Sales"] = data["Sales"].sum()
-    if "Profit" in data.columns:
-        kpis["Total Profit"] = data["Profit"].sum()
-    return kpis
+# Vista dei dati dell'API: con l'auto-refresh attivo il frammento rilegge il
+# feed ogni API_POLL_SECONDS, senza rieseguire il resto della pagina
+def show_api_feed(feed, live):
+    @st.fragment(run_every=API_POLL_SECONDS if live else None)
+    def feed_view():
+        feed.touch()
+        with feed.lock:
+            api_data = feed.data()
+            status = f"{feed.rows:,} rows"
+            if feed.last_refresh is not None:
+                refreshed = datetime.fromtimestamp(feed.last_refresh)
+                status += f" | last refresh {refreshed:%H:%M:%S}: {feed.last_status}"
+            st.caption(status)
+            st.dataframe(api_data)
+
+            # Show API data analytics
+            st.write("### API Data Analytics")
+            # Istogramma aggiornato dal feed con le sole righe nuove; i
+            # grafici si ricostruiscono solo quando cambia la versione del feed
+            aggregates = dict(feed.store.aggregates())
+            if feed.histogram is not None:
+                aggregates["sales_histogram"] = feed.histogram
+            create_advanced_visualizations(
+                st,
+                aggregates,
+                key="api",
+                source=("api", feed.feed_id, feed.version),
+            )
+            if feed.anomalies:
+                st.write("#### Anomalous Days Since Loading")
+                st.dataframe(
+                    pd.DataFrame(feed.anomalies, columns=["Date", "Sales", "Score"])
+                )
+
+            # Export API data
+            st.download_button(
+                "Download API Data",
+                partial(api_data.to_csv, index=False),
+                "api_data.csv",
+                "text/csv",
+            )
+
+    feed_view()
+
+
+# Dataset aperti, condivisi tra rerun e sessioni con conteggio delle sessioni
+# che li usano: i dataset non piu' usati vengono chiusi
+@st.cache_resource
+def get_dataset_registry():
+    return DatasetRegistry()
+
+
+# Un upload con pandas passa dalla cache Arrow su disco, mappata in memoria,
+# ed e' tenuto in formato compatto insieme al suo indice per i filtri. Con
+# DuckDB viene convertito una volta in Parquet e si apre solo una vista sul
+# file, senza caricarlo in memoria.
+def open_dataset(backend, source, dataset_id, amounts=DEFAULT_AMOUNT_FORMAT):
+    if backend == "duckdb":
+        return open_upload(source, dataset_id)
+    data, dataset_id, load_stats = load_with_cache(source, dataset_id=dataset_id)
+    return PandasDataset(
+        compact_frame(data, amounts), compact_id(dataset_id, amounts), load_stats
+    )
+
+
+# Valori per i filtri della sidebar, letti una volta per dataset
+@st.cache_data(show_spinner=False)
+def get_filter_options(dataset_id, _dataset):
+    options = {}
+    if "Date" in _dataset.columns:
+        options["Date"] = _dataset.date_range()
+    for column in ["Product", "Region"]:
+        if column in _dataset.columns:
+            options[column] = list(_dataset.values(column))
+    return options
+
+
+# Aggregati condivisi da KPI, metriche e grafici, calcolati una volta per
+# dataset e filtri (al massimo 32 combinazioni, le meno recenti escono).
+# Filtri e group by girano nel backend del dataset.
+@st.cache_data(max_entries=32)
+def get_aggregates(dataset_id, filters, _dataset):
+    aggregates = _dataset.aggregates(filters)
+    if "by_date" in aggregates and "sales_sum" in aggregates["by_date"]:
+        daily_sales = aggregates["by_date"]["sales_sum"]
+        aggregates["daily_pyramid"] = build_line_pyramid(daily_sales)
+    return aggregates
+
+
+# Pannello "Performance": fasi di questo rerun (figli indentati sotto la
+# fase che li contiene), memoria per colonna del dataset in memoria, cache
+# dei grafici e dataset aperti da tutte le sessioni, export recenti, log JSON-lines e cattura del
+# profilo cProfile/tracemalloc del rerun successivo
+def show_performance_panel(recorder, capture, dataset=None):
+    if capture is not None:
+        st.session_state.pop("perf_capture", None)
+        st.session_state["perf_profile"] = capture.stop()
+    recorder.finish()
+
+    with st.sidebar.expander("Performance"):
+        rss = current_rss_mb()
+        st.caption(
+            f"Rerun {recorder.run_id}: {recorder.elapsed():.2f}s"
+            + (f", RSS {rss:,.0f} MB" if rss is not None else "")
+        )
+        if recorder.records:
+            st.dataframe(
+                stage_table(recorder.records, recorder.elapsed()),
+                hide_index=True,
+                use_container_width=True,
+            )
+        memory = None
+        if dataset is not None and dataset.in_memory:
+            memory = dataset.memory_report()
+        if memory is not None:
+            st.write(f"Dataset memory: {memory['MB'].sum():,.1f} MB")
+            st.dataframe(memory, hide_index=True, use_container_width=True)
+        st.write("Figure cache (all sessions)")
+        st.dataframe(pd.DataFrame([get_figure_cache().stats()]), hide_index=True)
+        shared = get_dataset_registry().stats()
+        if shared:
+            st.write("Open datasets (all sessions)")
+            st.dataframe(pd.DataFrame(shared), hide_index=True)
+        exports = get_export_recorder().records
+        if exports:
+            st.write("Recent exports")
+            st.dataframe(stage_table(exports[-5:]), hide_index=True)
+
+        st.text_input("JSON-lines log file", value=PERF_LOG, key="perf_log_path")
+        if recorder.log_error:
+            st.warning(f"Cannot write the performance log: {recorder.log_error}")
+        if st.button("Profile next rerun", help="cProfile + tracemalloc, slower"):
+            st.session_state["perf_profile_next"] = True
+            st.rerun()
+
+        report = st.session_state.get("perf_profile")
+        if report is not None:
+            st.write("Profile (cumulative time)")
+            st.code(report["functions"], language=None)
+            if report["allocations"]:
+                st.write("Top allocations")
+                st.code(report["allocations"], language=None)
+            st.download_button(
+                "Download profile (.prof)",
+                data=report["prof"],
+                file_name="rerun.prof",
+                mime="application/octet-stream",
+            )
 
 
 # Tabs
@@ -308,204 +512,341 @@ with tab1:
         "Upload a file (CSV, JSON, or Excel)", type=["csv", "json", "xlsx", "xls"]
     )
 
-    if uploaded_file:
-        # Load data based on file type
-        file_type = uploaded_file.name.split(".")[-1]
-        if file_type == "csv":
-            data = pd.read_csv(uploaded_file)
-        elif file_type == "json":
-            data = pd.read_json(uploaded_file)
-        elif file_type in ["xlsx", "xls"]:
-            data = pd.read_excel(uploaded_file)
-        else:
-            st.error("Unsupported file format!")
-            data = None
-
-        if data is not None:
-            # Conversione colonna Date
-            if "Date" in data.columns:
-                data["Date"] = pd.to_datetime(data["Date"], errors="coerce")
-
-            # Anteprima file
-            st.write("File loaded successfully! Here's a preview:")
-            st.dataframe(data.head())
-
-            # Filtri nella sidebar
-            st.sidebar.header("Filters")
-            filters = {}
-
-            if "Date" in data.columns:
-                min_date, max_date = data["Date"].min(), data["Date"].max()
-                filters["Date"] = st.sidebar.date_input(
-                    "Select Date Range", [min_date, max_date]
-                )
+    # Il backend si sceglie nella tab Settings, disegnata dopo questa tab
+    backend = st.session_state.get("data_backend", DEFAULT_BACKEND)
+    if backend not in available_backends():
+        backend = DEFAULT_BACKEND
+    amounts = st.session_state.get("amount_format", DEFAULT_AMOUNT_FORMAT)
+    data_path = st.text_input(
+        "Or open files on the server (directory or glob, e.g. one file per month)",
+        key="data_path",
+    )
 
-            if "Product" in data.columns:
-                products = data["Product"].unique()
-                filters["Product"] = st.sidebar.multiselect(
-                    "Select Products", options=products, default=products
+    # Ogni sessione tiene nel registro il dataset che sta mostrando
+    registry = get_dataset_registry()
+    session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+    dataset = None
+    if uploaded_file:
+        # Load data based on file type (schema, Date e categorie in data_loader).
+        # Nei rerun lo stesso upload riusa l'hash gia' calcolato e legge la
+        # copia in cache (Arrow o Parquet) invece di rifare il parsing
+        upload_ids = st.session_state.setdefault("upload_ids", {})
+        upload_key = getattr(uploaded_file, "file_id", uploaded_file.name)
+        try:
+            with stage("load", file=uploaded_file.name, backend=backend):
+                if upload_key not in upload_ids:
+                    upload_ids[upload_key] = content_hash(uploaded_file)
+                upload_id = upload_ids[upload_key]
+                dataset = registry.acquire(
+                    session_id,
+                    ("upload", upload_id, backend, amounts),
+                    partial(open_dataset, backend, uploaded_file, upload_id, amounts),
                 )
-
-            if "Region" in data.columns:
-                regions = data["Region"].unique()
-                filters["Region"] = st.sidebar.multiselect(
-                    "Select Regions", options=regions, default=regions
+        except ValueError as e:
+            st.error(f"Failed to load file: {e}")
+    elif data_path:
+        # Ogni rerun aggiorna il manifest: si leggono solo i file nuovi o
+        # modificati, le altre partizioni non vengono aperte
+        try:
+            with stage("load", path=data_path, backend=backend):
+                manifest = build_manifest(data_path, backend)
+                dataset = registry.acquire(
+                    session_id,
+                    ("files", manifest_id(manifest), backend, amounts),
+                    partial(PartitionedDataset, manifest, backend, amounts),
                 )
+        except Exception as e:
+            # Errori di lettura di pandas o DuckDB (file non valido, colonne
+            # diverse tra le partizioni)
+            st.error(f"Failed to open files: {e}")
+
+    if dataset is None:
+        registry.release(session_id)
+    else:
+        dataset_id = dataset.dataset_id
+        # Anteprima file
+        st.write("File loaded successfully! Here's a preview:")
+        partitions = getattr(dataset, "partitions", None)
+        if partitions is not None:
+            st.caption(f"{len(partitions):,} files, {dataset.rows():,} rows")
+        elif dataset.load_stats is not None:
+            st.caption(format_load_stats(dataset.load_stats))
+        st.dataframe(dataset.head())
+
+        # Filtri nella sidebar
+        st.sidebar.header("Filters")
+        filters = {}
+        options = get_filter_options(dataset_id, dataset)
+
+        if "Date" in options:
+            min_date, max_date = options["Date"]
+            filters["Date"] = st.sidebar.date_input(
+                "Select Date Range", [min_date, max_date]
+            )
 
-            filtered_data = filter_data(data, filters)
-
-            # Basic Metrics
-            st.header("Key Metrics")
-            kpis = calculate_kpi(filtered_data)
-            col1, col2, col3 = st.columns(3)
-            col1.metric("Total Rows", kpis.get("Total Rows", 0))
-            col2.metric("Total Sales", f"${kpis.get('Total Sales', 0):,.2f}")
-            col3.metric("Total Profit", f"${kpis.get('Total Profit', 0):,.2f}")
-
-            # Advanced Metrics
-            advanced_metrics = calculate_advanced_metrics(filtered_data)
-            st.header("Advanced Metrics")
-            col1, col2, col3, col4 = st.columns(4)
-            col1.metric("Sales Trend", advanced_metrics.get("sales_trend", "N/A"))
-            col2.metric(
-                "Trend Strength", f"{advanced_metrics.get('trend_strength', 0):,.2f}"
+        if "Product" in options:
+            products = options["Product"]
+            filters["Product"] = st.sidebar.multiselect(
+                "Select Products", options=products, default=products
             )
-            col3.metric(
-                "Sales Volatility",
-                f"{advanced_metrics.get('sales_volatility', 0):,.2%}",
+
+        if "Region" in options:
+            regions = options["Region"]
+            filters["Region"] = st.sidebar.multiselect(
+                "Select Regions", options=regions, default=regions
             )
-            col4.metric(
-                "Profit Margin", f"{advanced_metrics.get('profit_margin', 0):,.2f}%"
+
+        if partitions is not None:
+            st.sidebar.caption(
+                f"{len(prune(partitions, filters)):,} of {len(partitions):,} "
+                "files match the filters"
             )
 
-            # Visualizations
-            create_advanced_visualizations(filtered_data, st)
-
-            # Export Options
-            st.subheader("Export Data")
-            col1, col2 = st.columns(2)
-            with col1:
-                st.download_button(
-                    "Download Filtered Data (CSV)",
-                    filtered_data.to_csv(index=False).encode("utf-8"),
-                    "filtered_data.csv",
-                    "text/csv",
-                )
-            with col2:
-                excel_buffer = io.BytesIO()
-                with pd.ExcelWriter(excel_buffer, engine="xlsxwriter") as writer:
-                    filtered_data.to_excel(
-                        writer, index=False, sheet_name="Filtered Data"
-                    )
-                st.download_button(
-                    "Download Filtered Data (Excel)",
-                    data=excel_buffer.getvalue(),
-                    file_name="filtered_data.xlsx",
-                    mime="application/vnd.ms-excel",
-                )
+        with stage("aggregates", backend=dataset.backend):
+            aggregates = get_aggregates(dataset_id, filters, dataset)
+
+        # Basic Metrics
+        st.header("Key Metrics")
+        with stage("metrics"):
+            kpis = calculate_kpi(aggregates)
+            advanced_metrics = calculate_advanced_metrics(aggregates)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Total Rows", kpis.get("Total Rows", 0))
+        col2.metric("Total Sales", f"${kpis.get('Total Sales', 0):,.2f}")
+        col3.metric("Total Profit", f"${kpis.get('Total Profit', 0):,.2f}")
+
+        # Advanced Metrics
+        st.header("Advanced Metrics")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Sales Trend", advanced_metrics.get("sales_trend", "N/A"))
+        col2.metric(
+            "Trend Strength", f"{advanced_metrics.get('trend_strength', 0):,.2f}"
+        )
+        col3.metric(
+            "Sales Volatility",
+            f"{advanced_metrics.get('sales_volatility', 0):,.2%}",
+        )
+        col4.metric(
+            "Profit Margin", f"{advanced_metrics.get('profit_margin', 0):,.2f}%"
+        )
+
+        # Visualizations
+        create_advanced_visualizations(st, aggregates, source=(dataset_id, filters))
+
+        # Export Options: il file viene scritto solo al click sul download
+        st.subheader("Export Data")
+        formats = available_formats()
+        default_format = st.session_state.get("export_format", "CSV")
+        export_format = st.selectbox(
+            "Export Format",
+            formats,
+            index=formats.index(default_format) if default_format in formats else 0,
+        )
+        too_large = export_format == "Excel" and not fits_excel(aggregates["rows"])
+        if too_large:
+            st.warning(
+                f"Excel sheets are limited to {EXCEL_MAX_ROWS - 1:,} rows: "
+                "choose CSV or Parquet for this selection"
+            )
+        st.download_button(
+            f"Download Filtered Data ({export_format})",
+            data=partial(
+                prepare_export,
+                get_job_executor(),
+                dataset,
+                filters,
+                export_format,
+                get_export_recorder(),
+            ),
+            file_name=export_file_name("filtered_data", export_format),
+            mime=export_mime(export_format),
+            disabled=too_large,
+        )
 
 # Tab 2: Advanced Analytics
 with tab2:
     st.subheader("Advanced Analytics")
-    if "data" in locals():
+    if dataset is not None:
+        with stage("aggregates", backend=dataset.backend):
+            full_aggregates = get_aggregates(dataset_id, None, dataset)
+        full_source = (dataset_id, None)
+
         # Anomaly Detection
         st.write("### Sales Anomalies")
-        anomalies = detect_anomalies(data)
-        if anomalies is not None:
-            fig_anomalies = go.Figure()
-            daily_sales = data.groupby("Date")["Sales"].sum()
-            fig_anomalies.add_trace(
-                go.Scatter(
-                    x=daily_sales.index,
-                    y=daily_sales.values,
-                    mode="lines",
-                    name="Daily Sales",
+        anomaly_method, anomaly_threshold = anomaly_settings()
+        if "by_date" in full_aggregates:
+            daily_sales = full_aggregates["by_date"]["sales_sum"]
+            with stage("anomalies"):
+                anomalies = detect_anomalies(
+                    daily_sales, anomaly_method, anomaly_threshold
                 )
+            st.caption(
+                f"{METHODS[anomaly_method]}, threshold {anomaly_threshold:.1f}: "
+                f"{len(anomalies):,} anomalous days"
             )
-            fig_anomalies.add_trace(
-                go.Scatter(
-                    x=anomalies.index,
-                    y=anomalies.values,
-                    mode="markers",
-                    name="Anomalies",
-                    marker=dict(color="red", size=10),
-                )
+            positions = zoom_positions(
+                daily_sales,
+                full_aggregates["daily_pyramid"],
+                FULL_WIDTH_PX,
+                st,
+                "anomaly_zoom",
             )
-            st.plotly_chart(fig_anomalies, use_container_width=True)
+            with stage("figure: anomalies"):
+                show_figure(
+                    st,
+                    full_source,
+                    "anomalies",
+                    partial(anomaly_figure, daily_sales, positions, anomalies),
+                    method=anomaly_method,
+                    threshold=anomaly_threshold,
+                    positions=positions,
+                )
+
+        columns = dataset.columns
+        groups = [col for col in ["Product", "Region"] if col in columns]
+        if groups and "Date" in columns and "Sales" in columns:
+            anomaly_group = st.selectbox("Anomalies by", groups, key="anomaly_group")
+            with stage("group anomalies", group=anomaly_group):
+                group_anomalies = get_group_anomalies(
+                    dataset_id,
+                    anomaly_group,
+                    anomaly_method,
+                    anomaly_threshold,
+                    dataset,
+                )
+            st.dataframe(group_anomalies.head(100), use_container_width=True)
 
         # Customer Segmentation
         st.write("### Customer Segmentation")
-        customer_segments = perform_customer_segmentation(data)
-        if customer_segments is not None:
-            # Continua da customer_segments
-            fig_segments = px.scatter(
-                customer_segments,
-                x="Sales",
-                y=("Sales", "mean"),
-                color="Segment",
-                hover_data=["Customer"],
-                title="Customer Segmentation Analysis",
+        features = customer_features(full_aggregates)
+        if features is not None:
+            # Il numero di segmenti arriva dallo slider della tab Settings
+            segment_count = st.session_state.get("segment_count", 3)
+            job = get_segmentation_engine().submit(dataset_id, features, segment_count)
+            show_job(
+                job,
+                f"Segmenting customers into {segment_count} groups...",
+                partial(show_customer_segments, job.key),
             )
-            st.plotly_chart(fig_segments, use_container_width=True)
 
-        # Seasonal Analysis
-        if "Date" in data.columns and "Sales" in data.columns:
+        # Seasonal Analysis: grafici letti dalle rollup del calendario, una
+        # riga per periodo qualunque sia il numero di transazioni
+        if "rollups" in full_aggregates:
             st.write("### Seasonal Analysis")
-            data["Month"] = data["Date"].dt.month
-            data["Quarter"] = data["Date"].dt.quarter
-            data["Year"] = data["Date"].dt.year
+            rollups = full_aggregates["rollups"]
+
+            # Trend per periodo
+            level = st.radio(
+                "Trend granularity",
+                ROLLUP_LEVELS,
+                index=ROLLUP_LEVELS.index("month"),
+                format_func=str.capitalize,
+                horizontal=True,
+                key="trend_level",
+            )
+            with stage("figure: period trend", level=level):
+                show_figure(
+                    st,
+                    full_source,
+                    "period trend",
+                    partial(period_trend_figure, rollups[level], level),
+                    level=level,
+                )
 
             # Monthly Trends
-            monthly_sales = data.groupby(["Year", "Month"])["Sales"].sum().reset_index()
-            fig_monthly = px.line(
-                monthly_sales,
-                x="Month",
-                y="Sales",
-                color="Year",
-                title="Monthly Sales Trends by Year",
-            )
-            st.plotly_chart(fig_monthly, use_container_width=True)
+            with stage("figure: monthly"):
+                show_figure(
+                    st,
+                    full_source,
+                    "monthly",
+                    lambda: monthly_figure(seasonal_table(rollups, "month")),
+                )
 
             # Quarterly Analysis
-            quarterly_sales = (
-                data.groupby(["Year", "Quarter"])["Sales"].sum().reset_index()
-            )
-            fig_quarterly = px.bar(
-                quarterly_sales,
-                x="Quarter",
-                y="Sales",
-                color="Year",
-                title="Quarterly Sales Analysis",
-            )
-            st.plotly_chart(fig_quarterly, use_container_width=True)
+            with stage("figure: quarterly"):
+                show_figure(
+                    st,
+                    full_source,
+                    "quarterly",
+                    lambda: quarterly_figure(seasonal_table(rollups, "quarter")),
+                )
 
         # Product Analysis
-        if "Product" in data.columns and "Sales" in data.columns:
+        if "Product" in columns and "Sales" in columns:
             st.write("### Product Analysis")
 
             # Product Performance Matrix
             product_matrix = (
-                data.groupby("Product")
-                .agg({"Sales": ["sum", "count", "mean"], "Profit": ["sum", "mean"]})
+                full_aggregates["by_product"][
+                    [
+                        "sales_sum",
+                        "sales_count",
+                        "sales_mean",
+                        "profit_sum",
+                        "profit_mean",
+                    ]
+                ]
+                .rename(
+                    columns={
+                        "sales_sum": "Total Sales",
+                        "sales_count": "Number of Sales",
+                        "sales_mean": "Avg Sale Value",
+                        "profit_sum": "Total Profit",
+                        "profit_mean": "Avg Profit",
+                    }
+                )
                 .round(2)
             )
-            product_matrix.columns = [
-                "Total Sales",
-                "Number of Sales",
-                "Avg Sale Value",
-                "Total Profit",
-                "Avg Profit",
-            ]
             st.dataframe(product_matrix)
 
-            # Product Correlation Analysis
-            product_pivot = data.pivot_table(
-                index="Date", columns="Product", values="Sales", aggfunc="sum"
-            ).fillna(0)
-            product_corr = product_pivot.corr()
-
-            fig_corr = px.imshow(product_corr, title="Product Sales Correlation Matrix")
-            st.plotly_chart(fig_corr, use_container_width=True)
+            # Product Correlation Analysis: solo sui prodotti principali o su
+            # quelli scelti, con i soli vicini piu' correlati oltre
+            # MAX_DENSE_PRODUCTS prodotti
+            by_product = full_aggregates["by_product"]
+            col1, col2, col3 = st.columns(3)
+            top_n = col1.number_input(
+                "Top products by sales",
+                min_value=2,
+                max_value=max(2, len(by_product)),
+                value=min(DEFAULT_TOP_N, max(2, len(by_product))),
+            )
+            chosen = col2.multiselect("Or choose products", by_product.index.tolist())
+            neighbors_only = col3.checkbox("Nearest neighbors only")
+            products = select_products(by_product, top_n, chosen)
+            if len(products) > MAX_DENSE_PRODUCTS:
+                neighbors_only = True
+            corr_data = get_daily_sales(dataset_id, "Product", products, dataset)
+
+            if neighbors_only:
+                k = col3.slider("Neighbors per product", 1, 20, DEFAULT_NEIGHBORS)
+                neighbors_job = get_job_executor().submit(
+                    job_key(
+                        "product_neighbors", dataset_id, products=tuple(products), k=k
+                    ),
+                    product_neighbors,
+                    corr_data,
+                    products,
+                    k,
+                )
+                show_job(
+                    neighbors_job,
+                    "Finding correlated products...",
+                    show_product_neighbors,
+                )
+            else:
+                corr_job = get_job_executor().submit(
+                    job_key(
+                        "product_correlation", dataset_id, products=tuple(products)
+                    ),
+                    product_correlation,
+                    corr_data,
+                    products,
+                )
+                show_job(
+                    corr_job,
+                    "Computing product correlations...",
+                    partial(show_product_correlation, corr_job.key),
+                )
 
 # Tab 3: Settings
 with tab3:
@@ -513,17 +854,41 @@ with tab3:
 
     # Visual Settings
     st.write("### Visual Settings")
-    chart_theme = st.selectbox("Chart Theme", ["plotly", "plotly_white", "plotly_dark"])
+    chart_theme = st.selectbox("Chart Theme", CHART_THEMES, key="chart_theme")
     show_animations = st.checkbox("Enable Chart Animations", value=True)
 
     # Data Processing Settings
     st.write("### Data Processing Settings")
-    anomaly_threshold = st.slider("Anomaly Detection Threshold", 1.0, 4.0, 2.0, 0.1)
-    customer_segments = st.slider("Number of Customer Segments", 2, 10, 3)
+    st.selectbox(
+        "Data Backend",
+        available_backends(),
+        format_func=BACKENDS.get,
+        key="data_backend",
+        help="DuckDB queries the data on disk, for files larger than memory",
+    )
+    st.selectbox(
+        "Amount Storage",
+        list(AMOUNT_FORMATS),
+        format_func=AMOUNT_FORMATS.get,
+        key="amount_format",
+        help="float32 halves the memory of Sales and Profit (about 7 digits)",
+    )
+    st.selectbox(
+        "Anomaly Detection Method",
+        list(METHODS),
+        format_func=METHODS.get,
+        key="anomaly_method",
+    )
+    anomaly_threshold = st.slider(
+        "Anomaly Detection Threshold", 1.0, 4.0, 2.0, 0.1, key="anomaly_threshold"
+    )
+    customer_segments = st.slider(
+        "Number of Customer Segments", 2, 10, 3, key="segment_count"
+    )
 
     # Export Settings
     st.write("### Export Settings")
-    export_format = st.radio("Default Export Format", ["CSV", "Excel", "JSON"])
+    st.radio("Default Export Format", available_formats(), key="export_format")
     include_metadata = st.checkbox("Include Analysis Metadata in Export", value=True)
 
     # Save Settings
@@ -552,34 +917,40 @@ with tab4:
 
     # Fetch Data
     if st.button("Fetch Data from API"):
-        with st.spinner("Fetching data..."):
-            api_data = fetch_api_data(api_url)
-            if api_data is not None:
-                st.success("API Data Loaded Successfully!")
-                st.dataframe(api_data)
-
-                # Process API data
-                if "Date" in api_data.columns:
-                    api_data["Date"] = pd.to_datetime(api_data["Date"])
-
-                # Show API data analytics
-                st.write("### API Data Analytics")
-                create_advanced_visualizations(api_data, st)
-
-                # Export API data
-                st.download_button(
-                    "Download API Data",
-                    api_data.to_csv(index=False).encode("utf-8"),
-                    "api_data.csv",
-                    "text/csv",
-                )
+        with st.spinner("Fetching data..."), stage("api fetch"):
+            fetched = fetch_api_data(api_url)
+        if fetched is not None:
+            api_data, validators = fetched
+            previous = st.session_state.get("api_feed")
+            if previous is not None:
+                previous.stop()
+            # Stato per sessione: i refresh aggiungono solo le righe nuove
+            # alle metriche e il rilevatore valuta i nuovi giorni in O(1)
+            st.session_state["api_feed"] = ApiFeed(
+                api_url, api_data, validators, StreamingDetector(*anomaly_settings())
+            )
+            st.success("API Data Loaded Successfully!")
+
+    # Le impostazioni di refresh sono disegnate sotto: si leggono dallo stato
+    api_feed = st.session_state.get("api_feed")
+    if api_feed is not None:
+        auto_refresh = st.session_state.get("api_auto_refresh", False)
+        if auto_refresh:
+            api_feed.start(60 * st.session_state.get("api_refresh_minutes", 5))
+        else:
+            api_feed.stop()
+        show_api_feed(api_feed, auto_refresh)
 
     # API Data Refresh Settings
     st.write("### Auto-Refresh Settings")
-    auto_refresh = st.checkbox("Enable Auto-Refresh")
+    auto_refresh = st.checkbox("Enable Auto-Refresh", key="api_auto_refresh")
     if auto_refresh:
         refresh_interval = st.number_input(
-            "Refresh Interval (minutes)", min_value=1, max_value=60, value=5
+            "Refresh Interval (minutes)",
+            min_value=1,
+            max_value=60,
+            value=5,
+            key="api_refresh_minutes",
         )
 
 # Footer
@@ -591,3 +962,7 @@ Created with ❤️ using Streamlit | Last updated: {}
         datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     )
 )
+
+# In fondo allo script, cosi' il pannello vede tutte le fasi del rerun
+show_performance_panel(perf_recorder, profile_capture, dataset)
+deactivate(perf_token)
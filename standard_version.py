@@ -3,10 +3,17 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import io
-import requests
+from functools import partial
 from datetime import datetime
 import warnings
+
+from app.utils.data_cache import content_hash, load_with_cache
+from app.utils.data_filter import build_filter_index, select_rows
+from app.utils.data_loader import format_load_stats
+from app.utils.exports import (EXCEL_MAX_ROWS, available_formats, export_bytes,
+                               export_file_name, export_mime, fits_excel)
+from app.utils.rollups import build_rollups
+
 warnings.filterwarnings('ignore')
 
 # Configurazione della pagina
@@ -60,7 +67,7 @@ def calculate_metrics(data):
         
     if "Product" in data.columns:
         # Performance prodotti
-        product_sales = data.groupby('Product')['Sales'].sum()
+        product_sales = data.groupby('Product', observed=True)['Sales'].sum()
         metrics['top_products'] = product_sales.nlargest(5).index.tolist()
         
     return metrics
@@ -73,7 +80,8 @@ def create_visualizations(data, container):
     )
     
     # Sales Trend
-    daily_sales = data.groupby('Date')['Sales'].sum().reset_index()
+    daily_totals = data.groupby('Date')['Sales'].sum()
+    daily_sales = daily_totals.reset_index()
     fig1.add_trace(
         go.Scatter(x=daily_sales['Date'], y=daily_sales['Sales'], 
                   name='Daily Sales', mode='lines'),
@@ -81,7 +89,7 @@ def create_visualizations(data, container):
     )
     
     # Regional Performance
-    regional_sales = data.groupby('Region')['Sales'].sum().reset_index()
+    regional_sales = data.groupby('Region', observed=True)['Sales'].sum().reset_index()
     fig1.add_trace(
         go.Bar(x=regional_sales['Region'], y=regional_sales['Sales'], 
                name='Regional Sales'),
@@ -89,16 +97,15 @@ def create_visualizations(data, container):
     )
     
     # Top Products
-    product_sales = data.groupby('Product')['Sales'].sum().nlargest(10).reset_index()
+    product_sales = data.groupby('Product', observed=True)['Sales'].sum().nlargest(10).reset_index()
     fig1.add_trace(
         go.Bar(x=product_sales['Product'], y=product_sales['Sales'], 
                name='Product Sales'),
         row=2, col=1
     )
     
-    # Monthly Sales
-    data['Month'] = data['Date'].dt.strftime('%Y-%m')
-    monthly_sales = data.groupby('Month')['Sales'].sum().reset_index()
+    # Monthly Sales: dalle rollup, strftime solo sulle etichette dei mesi
+    monthly_sales = monthly_totals(build_rollups(daily_totals.to_frame('sales_sum')))
     fig1.add_trace(
         go.Scatter(x=monthly_sales['Month'], y=monthly_sales['Sales'],
                   name='Monthly Sales', mode='lines+markers'),
@@ -108,20 +115,31 @@ def create_visualizations(data, container):
     fig1.update_layout(height=800, showlegend=True)
     container.plotly_chart(fig1, use_container_width=True)
 
-# Funzione per filtrare i dati
+# Vendite per mese ("YYYY-MM") dalle rollup del calendario
+def monthly_totals(rollups):
+    months = rollups['month']
+    return pd.DataFrame({'Month': months.index.strftime('%Y-%m'),
+                         'Sales': months['sales_sum'].to_numpy()})
+
+# Rollup del dataset completo, calcolate una volta per dataset
 @st.cache_data
-def filter_data(data, filters):
-    filtered_data = data.copy()
-    for column, filter_value in filters.items():
-        if column == "Date" and len(filter_value) == 2:
-            start_date, end_date = filter_value
-            filtered_data = filtered_data[
-                (filtered_data[column] >= pd.to_datetime(start_date)) & 
-                (filtered_data[column] <= pd.to_datetime(end_date))
-            ]
-        elif filter_value:
-            filtered_data = filtered_data[filtered_data[column].isin(filter_value)]
-    return filtered_data
+def get_rollups(dataset_id, _data):
+    daily_sales = _data.groupby('Date')['Sales'].sum().to_frame('sales_sum')
+    return build_rollups(daily_sales)
+
+# Indici per il filtro, costruiti una sola volta per dataset
+@st.cache_resource
+def get_filter_index(dataset_id, _data):
+    return build_filter_index(_data)
+
+# Righe selezionate: chiave di cache = ID del dataset + filtri
+@st.cache_data
+def filter_rows(dataset_id, _data, filters):
+    return select_rows(get_filter_index(dataset_id, _data), filters)
+
+# Funzione per filtrare i dati
+def filter_data(dataset_id, data, filters):
+    return data.take(filter_rows(dataset_id, data, filters))
 
 # Tabs
 tab1, tab2, tab3 = st.tabs(["📊 Dashboard", "📈 Analytics", "⚙️ Settings"])
@@ -132,18 +150,18 @@ with tab1:
     uploaded_file = st.file_uploader("Upload a file (CSV, Excel)", type=["csv", "xlsx", "xls"])
 
     if uploaded_file:
-        # Load data
-        file_type = uploaded_file.name.split(".")[-1]
-        if file_type == "csv":
-            data = pd.read_csv(uploaded_file)
-        elif file_type in ["xlsx", "xls"]:
-            data = pd.read_excel(uploaded_file)
-        
-        if "Date" in data.columns:
-            data["Date"] = pd.to_datetime(data["Date"], errors="coerce")
+        # Load data: nei rerun lo stesso upload riusa l'hash gia' calcolato
+        upload_ids = st.session_state.setdefault("upload_ids", {})
+        upload_key = getattr(uploaded_file, "file_id", uploaded_file.name)
+        if upload_key not in upload_ids:
+            upload_ids[upload_key] = content_hash(uploaded_file)
+        data, dataset_id, load_stats = load_with_cache(
+            uploaded_file, dataset_id=upload_ids[upload_key]
+        )
 
         # Preview
         st.write("Data Preview:")
+        st.caption(format_load_stats(load_stats))
         st.dataframe(data.head())
 
         # Filters
@@ -163,7 +181,7 @@ with tab1:
             filters["Region"] = st.sidebar.multiselect("Regions", options=regions, default=regions)
 
         # Apply filters
-        filtered_data = filter_data(data, filters)
+        filtered_data = filter_data(dataset_id, data, filters)
 
         # Key Metrics
         st.header("Key Metrics")
@@ -179,22 +197,18 @@ with tab1:
         st.header("Sales Analytics")
         create_visualizations(filtered_data, st)
 
-        # Export
+        # Export: il file viene generato solo al click sul download
         st.subheader("Export Data")
-        col1, col2 = st.columns(2)
-        with col1:
-            st.download_button("Download CSV", 
-                             filtered_data.to_csv(index=False).encode('utf-8'),
-                             "sales_data.csv", 
-                             "text/csv")
-        with col2:
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                filtered_data.to_excel(writer, sheet_name='Sales Data', index=False)
-            st.download_button("Download Excel",
-                             buffer.getvalue(),
-                             "sales_data.xlsx",
-                             "application/vnd.ms-excel")
+        export_format = st.selectbox("Export Format", available_formats())
+        too_large = export_format == "Excel" and not fits_excel(filtered_data)
+        if too_large:
+            st.warning(f"Excel sheets are limited to {EXCEL_MAX_ROWS - 1:,} rows: "
+                       "choose CSV or Parquet for this selection")
+        st.download_button(f"Download {export_format}",
+                         partial(export_bytes, filtered_data, export_format),
+                         export_file_name("sales_data", export_format),
+                         export_mime(export_format),
+                         disabled=too_large)
 
 # Tab 2: Analytics
 with tab2:
@@ -203,9 +217,7 @@ with tab2:
         
         # Monthly Trends
         st.write("### Monthly Trends")
-        # Creiamo monthly_sales qui
-        data['Month'] = data['Date'].dt.strftime('%Y-%m')
-        monthly_sales = data.groupby('Month')['Sales'].sum().reset_index()
+        monthly_sales = monthly_totals(get_rollups(dataset_id, data))
         monthly_fig = px.line(monthly_sales, 
                             x='Month', 
                             y='Sales',
@@ -0,0 +1,18 @@
+import numpy as np
+
+from app.utils.anomaly import _RollingWindow
+
+
+# Importi grandi con poca variazione su un flusso lungo: media e deviazione
+# della finestra restano quelle calcolate direttamente sui valori
+def test_rolling_window_is_stable():
+    rng = np.random.default_rng(0)
+    values = 1e9 + rng.normal(0, 0.5, 100_000)
+    window = _RollingWindow(30)
+    for value in values:
+        window.push(float(value))
+
+    mean, std = window.mean_std()
+    tail = values[-30:]
+    assert np.isclose(mean, tail.mean(), rtol=0, atol=1e-6)
+    assert np.isclose(std, tail.std(ddof=1), rtol=1e-6)
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from app.utils import api_feed
+from app.utils.aggregations import sales_histogram
+from app.utils.api_feed import ApiFeed
+
+
+class _Counter:
+    def __init__(self):
+        self.count = 0
+        self.values = []
+
+    def update(self, value):
+        self.count += 1
+        self.values.append(value)
+        return 0.0, False
+
+
+def _sales(days, sales=1.0):
+    return pd.DataFrame(
+        {
+            "Date": pd.to_datetime(days),
+            "Sales": [sales] * len(days),
+            "Profit": [0.1] * len(days),
+        }
+    )
+
+
+# Server senza ETag/Last-Modified: ogni risposta contiene tutti i record e
+# solo quelli nuovi entrano nel feed
+def test_full_payload_without_validators(monkeypatch):
+    first = _sales(["2023-01-01", "2023-01-02"])
+    feed = ApiFeed("http://api", first)
+    payload = pd.concat([first, _sales(["2023-01-03"])], ignore_index=True)
+    monkeypatch.setattr(api_feed, "fetch_updates", lambda url, v: (payload, {}))
+
+    assert feed.poll() == 1
+    assert feed.poll() == 0
+    assert feed.rows == 3
+    assert len(feed.data()) == 3
+
+
+# ETag senza cursore: le risposte 200 contengono ancora tutti i record
+def test_full_payload_with_etag_only(monkeypatch):
+    first = _sales(["2023-01-01", "2023-01-02"])
+    feed = ApiFeed("http://api", first, {"etag": '"v1"'})
+    payload = pd.concat([first, _sales(["2023-01-03"])], ignore_index=True)
+    monkeypatch.setattr(
+        api_feed, "fetch_updates", lambda url, v: (payload, {"etag": '"v2"'})
+    )
+
+    assert feed.poll() == 1
+    assert feed.rows == 3
+    assert feed.store.aggregates()["totals"]["sales_sum"] == 3.0
+
+
+# Istogramma aggiornato con le righe nuove, uguale a quello su tutte le
+# righe, anche quando un refresh allarga l'intervallo delle vendite
+def test_histogram_matches_full_data(monkeypatch):
+    feed = ApiFeed("http://api", _sales(["2023-01-01", "2023-01-02"], sales=5.0))
+    updates = [
+        _sales(["2023-01-03", "2023-01-04"], sales=5.0),
+        _sales(["2023-01-05"], sales=50.0),
+        _sales(["2023-01-06", "2023-01-07"], sales=20.0),
+    ]
+    for update in updates:
+        monkeypatch.setattr(
+            api_feed, "fetch_updates", lambda url, v, u=update: (u, {"cursor": "c"})
+        )
+        feed.poll()
+        expected = sales_histogram(feed.data()["Sales"])
+        np.testing.assert_array_equal(feed.histogram["counts"], expected["counts"])
+        np.testing.assert_array_equal(feed.histogram["edges"], expected["edges"])
+
+
+# Giorni inseriti in mezzo alla serie non fanno rivalutare quelli gia' visti
+def test_days_scored_once(monkeypatch):
+    detector = _Counter()
+    feed = ApiFeed(
+        "http://api",
+        _sales(["2023-01-01", "2023-01-03", "2023-01-05"]),
+        detector=detector,
+    )
+    assert detector.count == 2
+
+    update = _sales(["2023-01-02", "2023-01-06", "2023-01-07"], sales=2.0)
+    monkeypatch.setattr(
+        api_feed, "fetch_updates", lambda url, v: (update, {"cursor": "c"})
+    )
+    feed.poll()
+    # Valutati 01-01, 01-03, poi 01-05 e 01-06; 01-07 e' ancora aperto
+    assert detector.count == 4
+    assert detector.values == [1.0, 1.0, 1.0, 2.0]
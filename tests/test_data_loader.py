@@ -0,0 +1,50 @@
+import io
+
+import pandas as pd
+import pytest
+
+from app.utils.data_loader import DATE_FORMAT, load_data
+
+US_CSV = b"""Date,Sales,Profit,Product,Region
+01/17/2023,10.5,1.0,A,North
+02/03/2023,20.0,2.0,B,South
+12/31/2023,5.0,0.5,A,North
+"""
+
+
+# Date non ISO (mese/giorno/anno): inferite come prima dello schema, non NaT
+def test_non_iso_dates():
+    data, stats = load_data(io.BytesIO(US_CSV), name="sales.csv")
+    assert stats["rows"] == 3
+    assert data["Date"].notna().all()
+    assert list(data["Date"]) == list(
+        pd.to_datetime(["2023-01-17", "2023-02-03", "2023-12-31"])
+    )
+
+
+def test_iso_dates_keep_invalid_values_as_nat():
+    csv = b"Date,Sales\n2023-01-17,1.0\nnot a date,2.0\n"
+    data, _ = load_data(io.BytesIO(csv), name="sales.csv")
+    assert data["Date"].iloc[0] == pd.Timestamp("2023-01-17")
+    assert pd.isna(data["Date"].iloc[1])
+
+
+# Stesse date con DuckDB: la copia Parquet di un JSON con date non ISO non
+# perde le date
+def test_non_iso_json_dates_with_duckdb(tmp_path):
+    pytest.importorskip("duckdb")
+    from app.utils.duckdb_backend import _write_parquet
+
+    records = (
+        b'[{"Date": "01/17/2023", "Sales": 10.5}, '
+        b'{"Date": "02/03/2023", "Sales": 20.0}, '
+        b'{"Date": "12/31/2023", "Sales": 5.0}]'
+    )
+    source = tmp_path / "sales.json"
+    source.write_bytes(records)
+    target = tmp_path / "sales.parquet"
+    assert _write_parquet(str(source), str(target), DATE_FORMAT) == 3
+
+    expected, _ = load_data(io.BytesIO(records), name="sales.json")
+    dates = pd.read_parquet(target)["Date"].astype("datetime64[ns]")
+    assert list(dates) == list(expected["Date"])
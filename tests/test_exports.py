@@ -0,0 +1,30 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+from app.utils import exports
+from app.utils.exports import write_json
+
+
+# Export JSON lines su piu' blocchi: nessuna riga vuota tra un blocco e
+# l'altro, e il file si rilegge con le stesse righe
+def test_json_lines_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, "_chunks", functools.partial(exports._chunks, rows=2))
+    data = pd.DataFrame(
+        {
+            "Date": pd.date_range("2023-01-01", periods=5, freq="D"),
+            "Sales": np.arange(5, dtype="float64"),
+            "Region": ["North", "South", "East", "West", "North"],
+        }
+    )
+    path = tmp_path / "export.jsonl"
+    write_json(data, path)
+
+    lines = path.read_text(encoding="utf-8").split("\n")
+    assert lines[-1] == ""
+    assert all(lines[:-1])
+
+    loaded = pd.read_json(path, lines=True, convert_dates=["Date"])
+    loaded["Date"] = loaded["Date"].astype("datetime64[ns]")
+    pd.testing.assert_frame_equal(loaded, data, check_dtype=False)
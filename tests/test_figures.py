@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from app.utils.anomaly import detect_anomalies
+from app.utils.datasets import PandasDataset
+from app.utils.downsampling import build_line_pyramid, view_positions
+from app.utils.figures import FULL_WIDTH_PX, anomaly_figure, overview_figure
+
+
+def _sales():
+    return pd.DataFrame(
+        {
+            "Date": pd.date_range("2023-01-01", periods=40, freq="D"),
+            "Sales": np.arange(40, dtype="float64"),
+            "Profit": np.ones(40),
+            "Product": ["A", "B"] * 20,
+            "Region": ["North"] * 40,
+        }
+    )
+
+
+# Filtri che non selezionano righe: grafici vuoti, senza eccezioni
+def test_figures_with_empty_selection():
+    dataset = PandasDataset(_sales(), "empty-selection")
+    aggregates = dataset.aggregates({"Region": ["South"]})
+    assert aggregates["rows"] == 0
+
+    daily_sales = aggregates["by_date"]["sales_sum"]
+    positions = view_positions(build_line_pyramid(daily_sales), FULL_WIDTH_PX)
+    assert len(positions) == 0
+
+    overview = overview_figure(aggregates, positions, aggregates["sales_histogram"])
+    assert len(overview.data[0].x) == 0
+
+    anomalies = detect_anomalies(daily_sales)
+    fig = anomaly_figure(daily_sales, positions, anomalies)
+    assert len(fig.data[0].x) == 0
@@ -0,0 +1,40 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.utils.jobs import JobExecutor
+
+
+# Un worker che termina rompe il pool: il job fallisce e i successivi partono
+# in un pool nuovo
+def test_executor_recovers_from_dead_worker():
+    executor = JobExecutor(max_workers=1)
+    try:
+        crashed = executor.submit("crash", os._exit, 1)
+        with pytest.raises(BrokenProcessPool):
+            crashed.future.result(timeout=60)
+
+        job = executor.submit("sum", sum, [1, 2, 3])
+        assert job.future.result(timeout=60) == 6
+        assert crashed.failed()
+        assert executor.get("crash") is None
+    finally:
+        executor.shutdown()
+
+
+# La stessa chiave, richiesta dopo il crash, riesegue la funzione invece di
+# restituire il job fallito
+def test_resubmit_after_crash_runs_again():
+    executor = JobExecutor(max_workers=1)
+    try:
+        crashed = executor.submit("job", os._exit, 1)
+        with pytest.raises(BrokenProcessPool):
+            crashed.future.result(timeout=60)
+
+        retried = executor.submit("job", sum, [1, 2, 3])
+        assert retried is not crashed
+        assert retried.future.result(timeout=60) == 6
+        assert executor.get("job") is retried
+    finally:
+        executor.shutdown()